@@ -1,28 +1,52 @@
+from __future__ import annotations
+
 from time import perf_counter
+from typing import TYPE_CHECKING
+
+from instrument import profile
+from lazy_import import lazy_import
 
-from arcpy.da import SearchCursor, InsertCursor
-from arcpy.management import Append, GetCount
+if TYPE_CHECKING:
+    import arcpy
+else:
+    arcpy = lazy_import('arcpy')
 
+@profile
 def test_cursor(source: str, target: str) -> None:
-    with SearchCursor(source, 'OID@') as cur:
+    with arcpy.da.SearchCursor(source, 'OID@') as cur:
         source_fields = cur.fields
-    with SearchCursor(target, 'OID@') as cur:
+    with arcpy.da.SearchCursor(target, 'OID@') as cur:
         target_fields = cur.fields
         
     field_map = ['OID@', 'SHAPE@'] + list(set(source_fields) & set(target_fields))
-    with InsertCursor(target, field_map) as cur:
-        for row in SearchCursor(source, field_map):
+    with profile.cursor(arcpy.da.InsertCursor(target, field_map), 'insert') as cur, \
+         profile.cursor(arcpy.da.SearchCursor(source, field_map), 'search') as rows:
+        for row in rows:
             cur.insertRow(row)
             
+@profile
 def test_append(source: str, target: str) -> None:
-    Append(source, target, 'NO_TEST')
+    arcpy.management.Append(source, target, 'NO_TEST')
+
+@profile
+def test_sync(source: str, target: str, key_field: str) -> dict[str, int]:
+    """Only write the rows that differ, `key_field` must match between the copies (not OID or GlobalID)"""
+    from row_diff import apply_diff, diff_tables, read_table
+    
+    def editable(table: str) -> set[str]:
+        return {f.name for f in arcpy.ListFields(table) if f.editable and f.type not in ('OID', 'Geometry', 'GlobalID')}
+    
+    fields = [key_field, 'SHAPE@'] + sorted(editable(source) & editable(target) - {key_field})
+    diff = diff_tables(read_table(source, fields), read_table(target, fields), geometry_index=1)
+    print(f'Sync: {diff}')
+    return apply_diff(diff, source, target, fields)
 
 if __name__ == '__main__':
     source = r'<Path to Feature Class>'
     target1 = r'<Path to Cursor Target>'
     target2 = r'<Path to Append Target>'
     
-    feature_count = int(GetCount(source).getOutput(0))
+    feature_count = int(arcpy.management.GetCount(source).getOutput(0))
     
     start = perf_counter()
     test_cursor(source, target1)
@@ -36,4 +60,14 @@ if __name__ == '__main__':
     append_per_row = (end - start)/feature_count
     print(f'Append: {append_per_row:.6f} seconds/row')
     
-    print(f'Cursor is {append_per_row/cursor_per_row:.2f} times faster than Append')
\ No newline at end of file
+    print(f'Cursor is {append_per_row/cursor_per_row:.2f} times faster than Append')
+    
+    # Copying again writes every row, a diff only writes what changed
+    start = perf_counter()
+    test_sync(source, target2, key_field='<Key Field>')
+    end = perf_counter()
+    print(f'Sync: {(end - start)/feature_count:.6f} seconds/row')
+    
+    # Run with SNIPPETS_PROFILE=1 to see time spent reading and inserting
+    if profile.enabled:
+        print(profile.report())
\ No newline at end of file
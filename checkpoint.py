@@ -0,0 +1,223 @@
+"""Append only journals of finished work units for resumable jobs
+
+A job splits its work into units (record keys, FID ranges, edit batches) and marks each
+unit in the journal when it's done. Every mark is one JSON line, flushed and fsynced,
+so it survives a crash or a killed process. When the job is run again with the same
+journal the finished units are skipped. A torn last line (the process died while
+writing it) is dropped when the journal is opened.
+
+A unit that was begun but not marked (see `each(begin=True)`) may have been partly
+applied, those are listed in `uncertain` so the job can clean up or check them. Work
+units should be idempotent where possible, the journal makes the rerun short, not the
+work atomic.
+
+Usage:
+    >>> with Journal('parcels.journal', job='parcels to city.gdb') as journal:
+    ...     for batch in journal.each(batches, key=lambda batch: (batch[0].fid, batch[-1].fid)):
+    ...         insert(batch)  # marked done when the loop moves to the next batch
+    ...     journal.finish()   # removes the journal, the next run starts from zero
+
+    Run this module to kill and restart a job at random points until it finishes.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+def unit_key(unit: Any) -> str:
+    """Canonical text of a unit (tuples and lists are the same key)"""
+    return unit if isinstance(unit, str) else json.dumps(unit, sort_keys=True, separators=(',', ':'), default=str)
+
+class Journal:
+    def __init__(self, path: str | Path | None, job: str = '', *, fsync: bool = True) -> None:
+        """
+        Args:
+            path: The journal file, None keeps the journal in memory (nothing is resumable)
+            job: Identifies the job, a journal written for another job raises a ValueError
+            fsync: Sync every mark to disk (turn off for many tiny units)
+        """
+        self.path = Path(path) if path else None
+        self.job = job
+        self.fsync = fsync
+        self.done: dict[str, Any] = {}
+        self.begun: set[str] = set()
+        self.skipped = 0
+        self._file = None
+        if self.path and self.path.exists():
+            self._read()
+        if self.path:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if not self.path.stat().st_size:
+                self._write({'job': job, 'started': time.time()})
+
+    def _read(self) -> None:
+        text = self.path.read_bytes()
+        # Drop a torn last line so new records start on a line of their own
+        if text and not text.endswith(b'\n'):
+            with open(self.path, 'r+b') as file:
+                file.truncate(text.rfind(b'\n') + 1)
+            text = text[:text.rfind(b'\n') + 1]
+        for line in text.decode('utf-8').splitlines():
+            record = json.loads(line)
+            if 'job' in record:
+                if record['job'] != self.job:
+                    raise ValueError(f"{self.path} is the journal of job {record['job']!r}, not {self.job!r}")
+            elif 'begin' in record:
+                self.begun.add(record['begin'])
+            elif 'done' in record:
+                self.done[record['done']] = record.get('data')
+
+    def _write(self, *records: dict) -> None:
+        if self._file is None:
+            return
+        self._file.write(''.join(json.dumps(record, default=str) + '\n' for record in records))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def __contains__(self, unit: Any) -> bool:
+        return unit_key(unit) in self.done
+
+    def __len__(self) -> int:
+        return len(self.done)
+
+    @property
+    def uncertain(self) -> list[str]:
+        """Keys of units that were begun and never marked done"""
+        return sorted(self.begun - self.done.keys())
+
+    def data(self, unit: Any) -> Any:
+        """The data stored when a unit was marked"""
+        return self.done[unit_key(unit)]
+
+    def begin(self, unit: Any) -> None:
+        key = unit_key(unit)
+        self.begun.add(key)
+        self._write({'begin': key})
+
+    def mark(self, unit: Any, data: Any = None) -> None:
+        """Record a finished unit (with optional JSON data such as the ObjectIDs it created)"""
+        key = unit_key(unit)
+        self.done[key] = data
+        self._write({'done': key, 'data': data} if data is not None else {'done': key})
+
+    def mark_many(self, units: Iterable[Any]) -> None:
+        """Record finished units with a single write and sync"""
+        keys = [unit_key(unit) for unit in units]
+        self.done.update(dict.fromkeys(keys))
+        self._write(*({'done': key} for key in keys))
+
+    def each(self, units: Iterable[T], *, key: Callable[[T], Any] | None = None, begin: bool = False) -> Iterator[T]:
+        """Yield the units that aren't done, a unit is marked when the loop asks for the next one
+
+        A unit whose loop body raises (or breaks out of the loop) isn't marked.
+
+        Args:
+            units: The work units
+            key: The journal key of a unit (default is the unit itself)
+            begin: Record the start of every unit so interrupted units show up in `uncertain`
+        """
+        for unit in units:
+            unit_id = key(unit) if key else unit
+            if unit_id in self:
+                self.skipped += 1
+                continue
+            if begin:
+                self.begin(unit_id)
+            yield unit
+            self.mark(unit_id)
+
+    def finish(self) -> None:
+        """The job is complete, remove the journal"""
+        self.close()
+        if self.path:
+            self.path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> Journal:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# Failure injection
+# The worker does units of a fake job and kills itself at a random point: before the
+# work, between the work and the mark, or halfway through writing a journal line
+
+def _worker(journal_path: str, output_path: str, units: int, fail_rate: float, seed: int) -> None:
+    import random
+    rng = random.Random(seed)
+
+    def crash(point: str) -> None:
+        if rng.random() < fail_rate:
+            print(point, flush=True)
+            os._exit(1)
+
+    journal = Journal(journal_path, job='failure-injection')
+    for unit in journal.each(range(units), begin=True):
+        crash('before work')
+        with open(output_path, 'a') as output:
+            output.write(f"{unit}\n")
+        crash('before mark')
+        if rng.random() < fail_rate:
+            print('torn line', flush=True)
+            journal._file.write('{"done": ')
+            journal._file.flush()
+            os._exit(1)
+    journal.close()
+
+def failure_injection(units: int = 500, fail_rate: float = 0.01, seed: int = 1) -> None:
+    """Run the worker until it completes and check every unit was done once (or repeated after a crash)"""
+    import subprocess
+    import sys
+    import tempfile
+    from collections import Counter
+
+    with tempfile.TemporaryDirectory() as folder:
+        journal_path, output_path = Path(folder, 'job.journal'), Path(folder, 'output.txt')
+        crashes: Counter[str] = Counter()
+        runs = 0
+        start = time.perf_counter()
+        while True:
+            runs += 1
+            process = subprocess.run(
+                [sys.executable, __file__, '--worker', str(journal_path), str(output_path), str(units), str(fail_rate), str(seed * 10_000 + runs)],
+                capture_output=True, text=True,
+            )
+            if process.returncode == 0:
+                break
+            crashes[process.stdout.strip()] += 1
+        elapsed = time.perf_counter() - start
+
+        work = Counter(int(line) for line in output_path.read_text().split())
+        repeated = sum(count - 1 for count in work.values())
+        journal = Journal(journal_path, job='failure-injection')
+        assert set(work) == set(range(units)), "every unit is done"
+        assert len(journal) == units and not journal.uncertain
+        # Only a crash after the work and before its mark repeats a unit
+        assert repeated <= crashes['before mark'] + crashes['torn line']
+        journal.finish()
+
+    print(
+        f"{units} units in {runs} runs ({elapsed:.1f} seconds), crashes: {dict(crashes)}, "
+        f"{repeated} units repeated, {units + repeated} units of work"
+    )
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:2] == ['--worker']:
+        journal_path, output_path, units, fail_rate, seed = sys.argv[2:]
+        _worker(journal_path, output_path, int(units), float(fail_rate), int(seed))
+    else:
+        for seed in range(1, 6):
+            failure_injection(seed=seed)
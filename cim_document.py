@@ -0,0 +1,371 @@
+"""Edit CIM JSON in .lyrx and .aprx files without arcpy.mp
+
+A .lyrx is a CIMLayerDocument JSON file, a Pro 3.x .aprx is a zip of JSON parts
+(one per map, layer, layout...). `CIMDocument` reads the parts lazily, edits them as
+plain dictionaries and writes back only when something changed (unchanged .aprx parts
+are copied as is). No licensed runtime is needed, so bulk edits can run on any worker.
+
+Usage:
+    >>> with CIMDocument.open('Roads.lyrx') as doc:
+    ...     set_use_source_metadata(doc)
+    ...     set_field_visibility(doc, {'NAME', 'CLASS'})
+
+    >>> doc = CIMDocument.open('Project.aprx')
+    >>> doc.get('GISProject.json', 'mapDefinitions/0')
+    'CIMPATH=map/map.json'
+
+    >>> bulk_edit(glob('projects/*.aprx'), partial(set_field_visibility, visible_fields={'NAME'}))
+    {'projects/a.aprx': 12, 'projects/b.aprx': 0, ...}
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import zipfile
+from copy import deepcopy
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any, Callable, Iterable, Iterator
+
+JSON = dict[str, Any]
+# A unique value is one string per renderer field
+UniqueValue = tuple[str, ...]
+
+def unique_value_key(value: str | int | float | Iterable[Any]) -> UniqueValue:
+    """The CIM fieldValues of a unique value (a value or one value per field), as strings"""
+    return (str(value),) if isinstance(value, str | int | float) else tuple(map(str, value))
+
+class CIMDocument:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.is_project = zipfile.is_zipfile(self.path)
+        self._parts: dict[str, JSON] = {}
+        self._dirty: set[str] = set()
+
+        if self.is_project:
+            with zipfile.ZipFile(self.path) as archive:
+                self._names = [name for name in archive.namelist() if name.endswith('.json')]
+            if not self._names:
+                raise ValueError(f"{self.path} has no JSON parts (projects from Pro 2.x are binary)")
+        else:
+            self._names = [self.path.name]
+
+    @classmethod
+    def open(cls, path: str | Path) -> CIMDocument:
+        return cls(path)
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._names)
+
+    def part(self, name: str) -> JSON:
+        """The parsed JSON of a part (parsed on first access)"""
+        if name not in self._parts:
+            if self.is_project:
+                with zipfile.ZipFile(self.path) as archive:
+                    raw = archive.read(name)
+            else:
+                raw = self.path.read_bytes()
+            self._parts[name] = json.loads(raw.decode('utf-8-sig'))
+        return self._parts[name]
+
+    def parts(self) -> Iterator[tuple[str, JSON]]:
+        """Yield (name, JSON) for every part, parsing each one as it is reached"""
+        if not self.is_project:
+            yield self._names[0], self.part(self._names[0])
+            return
+        with zipfile.ZipFile(self.path) as archive:
+            for name in self._names:
+                if name not in self._parts:
+                    self._parts[name] = json.loads(archive.read(name).decode('utf-8-sig'))
+                yield name, self._parts[name]
+
+    @staticmethod
+    def _walk(node: Any, path: str) -> tuple[Any, str | int]:
+        keys: list[str | int] = [int(key) if key.isdigit() else key for key in path.strip('/').split('/')]
+        for key in keys[:-1]:
+            node = node[key]
+        return node, keys[-1]
+
+    def get(self, name: str, path: str, default: Any = None) -> Any:
+        """Read a value by '/' separated path (list indexes are numbers)"""
+        try:
+            node, key = self._walk(self.part(name), path)
+            return node[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+
+    def set(self, name: str, path: str, value: Any) -> bool:
+        """Set a value by path, returns True if the value changed"""
+        node, key = self._walk(self.part(name), path)
+        if (key in node if isinstance(node, dict) else key < len(node)) and node[key] == value:
+            return False
+        node[key] = value
+        self.mark(name)
+        return True
+
+    def mark(self, name: str) -> None:
+        """Flag a part as changed after editing its dictionaries directly"""
+        self._dirty.add(name)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self._dirty)
+
+    def layers(self) -> Iterator[tuple[str, JSON]]:
+        """Yield (part name, layer definition) for every layer in the document"""
+        for name, part in self.parts():
+            if part.get('type', '').endswith('Layer'):
+                yield name, part
+            for definition in part.get('layerDefinitions', []):
+                yield name, definition
+
+    def save(self, path: str | Path | None = None) -> bool:
+        """Write changed parts back (or to `path`), returns False if there was nothing to write"""
+        target = Path(path) if path else self.path
+        if not self._dirty and target == self.path:
+            return False
+
+        # Write a temporary file next to the target and swap it in with os.replace, which is
+        # atomic on one volume: a crash leaves the old file, never a partly written one
+        with NamedTemporaryFile(dir=target.parent, suffix=target.suffix, delete=False) as temp:
+            temp_path = temp.name
+        try:
+            if self.is_project:
+                # Zip members can't be replaced in place, copy unchanged members into a new archive
+                with zipfile.ZipFile(self.path) as source, zipfile.ZipFile(temp_path, 'w') as output:
+                    for info in source.infolist():
+                        if info.filename in self._dirty:
+                            output.writestr(info, json.dumps(self._parts[info.filename]), info.compress_type)
+                        else:
+                            output.writestr(info, source.read(info), info.compress_type)
+            else:
+                Path(temp_path).write_text(json.dumps(self.part(self._names[0])), encoding='utf-8')
+            # Temporary files are private (0600), keep the permissions of the file being replaced
+            shutil.copymode(target if target.exists() else self.path, temp_path)
+            os.replace(temp_path, target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._dirty.clear()
+        return True
+
+    def __enter__(self) -> CIMDocument:
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        if exc_type is None:
+            self.save()
+
+# Edits
+# Each edit takes a document and returns the number of changes, so they can be
+# passed to `bulk_edit`
+
+def set_use_source_metadata(doc: CIMDocument, value: bool = True) -> int:
+    changes = 0
+    for name, layer in doc.layers():
+        if layer.get('useSourceMetadata', False) != value:
+            layer['useSourceMetadata'] = value
+            doc.mark(name)
+            changes += 1
+    return changes
+
+def set_field_visibility(doc: CIMDocument, visible_fields: Iterable[str], use_alias: bool = False) -> int:
+    """Show only `visible_fields` on every feature layer, like `update_visibility.update_field_visibility`"""
+    visible_fields = set(visible_fields)
+    changes = 0
+    for name, layer in doc.layers():
+        for field in (layer.get('featureTable') or {}).get('fieldDescriptions', []):
+            field_name = (use_alias and field.get('alias')) or field.get('fieldName')
+            visible = field_name in visible_fields
+            # CIM JSON leaves out false booleans
+            if field.get('visible', False) != visible:
+                field['visible'] = visible
+                doc.mark(name)
+                changes += 1
+    return changes
+
+def set_unique_values(doc: CIMDocument, values: dict[str, Iterable[str | Iterable[str]]], layer_name: str | None = None) -> int:
+    """Sync unique value renderer groups with `values`, like `update_renderer_values.sync_cim_renderer`
+
+    New classes copy the first existing class (symbol included). Values are normalised
+    like `sync_cim_renderer`, numbers match the strings the CIM stores.
+    """
+    changes = 0
+    for name, layer in doc.layers():
+        renderer = layer.get('renderer') or {}
+        if renderer.get('type') != 'CIMUniqueValueRenderer' or (layer_name and layer.get('name') != layer_name):
+            continue
+
+        desired = {heading: set(map(unique_value_key, group_values)) for heading, group_values in values.items()}
+        groups = renderer.setdefault('groups', [])
+        template = next((c for group in groups for c in group.get('classes', [])), None)
+        before = changes
+
+        for group in groups:
+            keep = desired.get(group.get('heading'), set())
+            classes = []
+            for value_class in group.get('classes', []):
+                remaining = [v for v in value_class.get('values', []) if tuple(v.get('fieldValues', [])) in keep]
+                changes += len(value_class.get('values', [])) - len(remaining)
+                if remaining:
+                    value_class['values'] = remaining
+                    classes.append(value_class)
+            group['classes'] = classes
+
+        for heading, wanted in desired.items():
+            group = next((g for g in groups if g.get('heading') == heading), None)
+            if group is None:
+                group = {'type': 'CIMUniqueValueGroup', 'heading': heading, 'classes': []}
+                groups.append(group)
+            current = {tuple(v.get('fieldValues', [])) for c in group['classes'] for v in c.get('values', [])}
+            for key in sorted(wanted - current):
+                value_class = deepcopy(template) if template else {'type': 'CIMUniqueValueClass', 'symbol': deepcopy(renderer.get('defaultSymbol'))}
+                value_class['label'] = ', '.join(key)
+                value_class['values'] = [{'type': 'CIMUniqueValue', 'fieldValues': list(key)}]
+                group['classes'].append(value_class)
+                changes += 1
+
+        renderer['groups'] = [group for group in groups if group['classes']]
+        if changes != before:
+            doc.mark(name)
+    return changes
+
+def set_colorizer_breaks(doc: CIMDocument, breaks: list[tuple[float, str]], layer_name: str | None = None) -> int:
+    """Set raster classify colorizer breaks from `(value, label)` pairs (see `raster_sym.build_breaks`)
+
+    Existing break colors are kept by position.
+    """
+    changes = 0
+    for name, layer in doc.layers():
+        colorizer = layer.get('colorizer') or {}
+        if colorizer.get('type') != 'CIMRasterClassifyColorizer' or (layer_name and layer.get('name') != layer_name):
+            continue
+
+        current = colorizer.get('classBreaks', [])
+        class_breaks = []
+        for i, (value, label) in enumerate(breaks):
+            class_break = deepcopy(current[i]) if i < len(current) else {'type': 'CIMRasterClassBreak'}
+            class_break['upperBound'] = value
+            class_break['label'] = label
+            class_breaks.append(class_break)
+
+        if class_breaks != current:
+            colorizer['classBreaks'] = class_breaks
+            colorizer['classificationMethod'] = 'Manual'
+            doc.mark(name)
+            changes += 1
+    return changes
+
+def _edit_file(args: tuple[str, Callable[[CIMDocument], int]]) -> tuple[str, int | str]:
+    path, edit = args
+    try:
+        with CIMDocument.open(path) as doc:
+            return path, edit(doc)
+    except Exception as e:
+        return path, f"{type(e).__name__}: {e}"
+
+def bulk_edit(
+    paths: Iterable[str],
+    edit: Callable[[CIMDocument], int],
+    *,
+    workers: int | None = None) -> dict[str, int | str]:
+    """Apply an edit to many .lyrx/.aprx files in a process pool
+
+    Args:
+        paths: The files to edit
+        edit: A picklable function taking a document (use functools.partial for arguments)
+        workers: Number of worker processes (default is os.cpu_count(), 0 runs in this process)
+
+    Returns:
+        The number of changes per file, or the error message if the file failed
+    """
+    jobs = ((str(path), edit) for path in paths)
+    if workers == 0:
+        return dict(map(_edit_file, jobs))
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_edit_file, jobs))
+
+def _fixture_layer() -> JSON:
+    """A small feature layer definition with a unique value renderer"""
+    symbol = {'type': 'CIMSymbolReference', 'symbol': {'type': 'CIMLineSymbol'}}
+    return {
+        'type': 'CIMFeatureLayer',
+        'name': 'Roads',
+        'featureTable': {
+            'type': 'CIMFeatureTable',
+            'fieldDescriptions': [
+                {'type': 'CIMFieldDescription', 'fieldName': 'NAME', 'alias': 'Name', 'visible': True},
+                {'type': 'CIMFieldDescription', 'fieldName': 'CLASS', 'alias': 'Class', 'visible': True},
+                {'type': 'CIMFieldDescription', 'fieldName': 'LANES', 'alias': 'Lanes'},
+            ],
+        },
+        'renderer': {
+            'type': 'CIMUniqueValueRenderer',
+            'fields': ['LANES'],
+            'defaultSymbol': symbol,
+            'groups': [{
+                'type': 'CIMUniqueValueGroup',
+                'heading': 'Lanes',
+                'classes': [
+                    {'type': 'CIMUniqueValueClass', 'label': lanes, 'symbol': symbol, 'values': [{'type': 'CIMUniqueValue', 'fieldValues': [lanes]}]}
+                    for lanes in ('1', '2')
+                ],
+            }],
+        },
+    }
+
+def _round_trip(doc: CIMDocument) -> None:
+    """Apply every edit twice, the second pass must find nothing to change"""
+    edits = (
+        set_use_source_metadata,
+        lambda doc: set_field_visibility(doc, {'NAME', 'LANES'}),
+        # Numbers match the strings in the CIM, 2 is kept and 4 added
+        lambda doc: set_unique_values(doc, {'Lanes': [2, 4]}),
+    )
+    assert [edit(doc) for edit in edits] == [1, 2, 2]
+    assert [edit(doc) for edit in edits] == [0, 0, 0]
+
+if __name__ == '__main__':
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as folder:
+        # .lyrx: one JSON document
+        lyrx = Path(folder, 'Roads.lyrx')
+        lyrx.write_text(json.dumps({'type': 'CIMLayerDocument', 'layerDefinitions': [_fixture_layer()]}), encoding='utf-8')
+        with CIMDocument.open(lyrx) as doc:
+            _round_trip(doc)
+        doc = CIMDocument.open(lyrx)
+        _, layer = next(doc.layers())
+        assert layer['useSourceMetadata'] is True
+        assert [f.get('visible', False) for f in layer['featureTable']['fieldDescriptions']] == [True, False, True]
+        assert [c['values'][0]['fieldValues'] for c in layer['renderer']['groups'][0]['classes']] == [['2'], ['4']]
+        assert not doc.save(), "an unchanged document isn't written"
+
+        # .aprx: a zip of JSON parts, unchanged members are copied as is
+        aprx = Path(folder, 'Project.aprx')
+        with zipfile.ZipFile(aprx, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('GISProject.json', json.dumps({'type': 'CIMGISProject', 'mapDefinitions': ['CIMPATH=map/map.json']}))
+            archive.writestr('map/roads.json', json.dumps(_fixture_layer()))
+            archive.writestr('Index/thumbnail.png', b'\x89PNG')
+        with CIMDocument.open(aprx) as doc:
+            _round_trip(doc)
+        doc = CIMDocument.open(aprx)
+        assert doc.get('map/roads.json', 'renderer/groups/0/classes/1/label') == '4'
+        assert doc.get('GISProject.json', 'mapDefinitions/0') == 'CIMPATH=map/map.json'
+        with zipfile.ZipFile(aprx) as archive:
+            assert archive.read('Index/thumbnail.png') == b'\x89PNG'
+            assert archive.getinfo('map/roads.json').compress_type == zipfile.ZIP_DEFLATED
+
+        assert sorted(os.listdir(folder)) == ['Project.aprx', 'Roads.lyrx'], "no temporary files are left"
+        if os.name == 'posix':
+            # Saving keeps the permissions of the file it replaces
+            for path, mode in ((lyrx, 0o644), (aprx, 0o640)):
+                path.chmod(mode)
+                with CIMDocument.open(path) as doc:
+                    assert set_use_source_metadata(doc, False)
+                assert path.stat().st_mode & 0o777 == mode, oct(path.stat().st_mode)
+    print(".lyrx and .aprx round trips match")
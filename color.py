@@ -1,10 +1,100 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterator
+
+from lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    np = lazy_import('numpy')
+
 def is_primary(color: tuple[int, ...]) -> bool:
     color = color[:3]
-    return color.count(256) == 1 and color.count(0) == 2
+    return color.count(255) == 1 and color.count(0) == 2
 
 def is_secondary(color: tuple[int, ...]) -> bool:
     color = color[:3]
-    return color.count(256) == 2 and color.count(0) == 1
+    return color.count(255) == 2 and color.count(0) == 1
+
+# Array classification
+# Colors are (..., 3) or (..., 4) uint8 arrays (a color map, or an image with any leading 
+# shape), alpha is ignored. Large inputs are classified in chunks so the temporaries 
+# stay bounded.
+
+OTHER = 0
+PRIMARY = 1
+SECONDARY = 2
+CLASS_NAMES = {OTHER: 'other', PRIMARY: 'primary', SECONDARY: 'secondary'}
+
+CHUNK_SIZE = 1 << 20
+
+def as_pixels(colors: np.ndarray | bytes | memoryview, channels: int | None = None) -> np.ndarray:
+    """View colors or a raw image buffer as an (N, channels) uint8 array (no copy when possible)"""
+    if not isinstance(colors, np.ndarray):
+        if channels is None:
+            raise ValueError("channels is required for a raw buffer")
+        colors = np.frombuffer(colors, dtype=np.uint8)
+    if channels is None:
+        channels = colors.shape[-1]
+    if channels not in (3, 4):
+        raise ValueError(f"Expected 3 or 4 channels, got {channels}")
+    if colors.dtype != np.uint8:
+        raise TypeError(f"Expected uint8 colors, got {colors.dtype}")
+    return colors.reshape(-1, channels)
+
+_luts: tuple[np.ndarray, np.ndarray] | None = None
+
+def _lookup_tables() -> tuple[np.ndarray, np.ndarray]:
+    """Channel codes (0 -> 1, 255 -> 4, anything else -> 16) and the class of each code sum
+    
+    The sum of three codes is unique per count of 0 and 255 channels, one 255 and two 0
+    (primary) sum to 6, two 255 and one 0 (secondary) sum to 9.
+    """
+    global _luts
+    if _luts is None:
+        codes = np.full(256, 16, dtype=np.uint8)
+        codes[0], codes[255] = 1, 4
+        classes = np.full(49, OTHER, dtype=np.uint8)
+        classes[6], classes[9] = PRIMARY, SECONDARY
+        _luts = codes, classes
+    return _luts
+
+def _classify_chunk(rgb: np.ndarray) -> np.ndarray:
+    codes, classes = _lookup_tables()
+    total = codes[rgb[:, 0]]
+    total += codes[rgb[:, 1]]
+    total += codes[rgb[:, 2]]
+    return classes[total]
+
+def iter_chunks(pixels: np.ndarray, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[int, np.ndarray]]:
+    for start in range(0, len(pixels), chunk_size):
+        yield start, pixels[start:start + chunk_size, :3]
+
+def classify(colors: np.ndarray, channels: int | None = None, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """Classify every color as OTHER, PRIMARY or SECONDARY
+    
+    Args:
+        colors: A uint8 array with 3 or 4 channels in the last axis, or a raw buffer
+        channels: Channels per pixel (required for raw buffers)
+        chunk_size: Pixels classified at a time
+    
+    Returns:
+        A uint8 class array in the shape of the input without the channel axis
+        (flat for buffers), `classify(colors) == PRIMARY` is the primary mask
+    """
+    pixels = as_pixels(colors, channels)
+    classes = np.empty(len(pixels), dtype=np.uint8)
+    for start, rgb in iter_chunks(pixels, chunk_size):
+        classes[start:start + len(rgb)] = _classify_chunk(rgb)
+    return classes.reshape(colors.shape[:-1]) if isinstance(colors, np.ndarray) else classes
+
+def count_classes(colors: np.ndarray, channels: int | None = None, chunk_size: int = CHUNK_SIZE) -> dict[str, int]:
+    """Count the colors in each class without keeping a class array"""
+    counts = np.zeros(3, dtype=np.int64)
+    for _, rgb in iter_chunks(as_pixels(colors, channels), chunk_size):
+        counts += np.bincount(_classify_chunk(rgb), minlength=3)
+    return {CLASS_NAMES[i]: int(count) for i, count in enumerate(counts)}
 
 def main() -> None:
     # Use Walrus operator to get next input until user enters 'q' and assign it to `response`.
@@ -16,7 +106,7 @@ def main() -> None:
             
             # Match the case of 3 integers separated by spaces                
             case [r, g, b, *a]:
-                a = a[0] if a else '256'
+                a = a[0] if a else '255'
                 
                 if not all(map(str.isdigit, [r, g, b, a])):
                     print(' ' * 50, end='\r')
@@ -44,5 +134,27 @@ def main() -> None:
                 print(' ' * 50, end='\r')
                 print("Invalid input.", end='\r')
 
+def benchmark(pixels: int = 2_000_000) -> None:
+    """Compare `classify` with the scalar functions on random RGBA colors"""
+    from time import perf_counter
+    
+    rng = np.random.default_rng(42)
+    # Mostly 0 and 255 channels so every class shows up
+    colors = rng.choice(np.array([0, 128, 255], dtype=np.uint8), size=(pixels, 4), p=[0.45, 0.1, 0.45])
+    
+    start = perf_counter()
+    classes = classify(colors)
+    vectorized = perf_counter() - start
+    
+    tuples = list(map(tuple, colors.tolist()))
+    start = perf_counter()
+    expected = [PRIMARY if is_primary(c) else SECONDARY if is_secondary(c) else OTHER for c in tuples]
+    scalar = perf_counter() - start
+    
+    assert classes.tolist() == expected
+    print(f"{pixels:,} colors, {count_classes(colors)}")
+    print(f"classify: {vectorized:.3f} seconds, scalar functions: {scalar:.3f} seconds ({scalar / vectorized:.0f}x)")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import sys
+    benchmark() if 'benchmark' in sys.argv[1:] else main()
\ No newline at end of file
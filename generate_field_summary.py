@@ -1,9 +1,18 @@
-import arcpy
-import arcpy.typing
-import arcpy.typing.describe
-import docx
+from __future__ import annotations
+
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+from checkpoint import Journal
+from lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import arcpy
+    import docx
+else:
+    arcpy = lazy_import('arcpy')
+    docx = lazy_import('docx')
 
 # Utility functions
 def docx_find_replace_text(doc, old_text, new_text):
@@ -40,7 +49,10 @@ def get_domains(feature_class) -> dict[str, arcpy.da.Domain]:
     fc_desc = arcpy.Describe(feature_class)
     return {domain.name: domain for domain in arcpy.da.ListDomains(fc_desc.workspace.catalogPath)}
 
-def generate_field_summary(inputfilename, outputfolder, feature_class):
+def generate_field_summary(inputfilename, outputfolder, feature_class, journal: str | Path | None = None):
+    # Records written by an interrupted run are skipped when the same journal is passed again
+    journal = Journal(journal, job=f"{inputfilename} -> {outputfolder}")
+    
     # Define paths
     inputfilename = Path(inputfilename)
     outputfolder = Path(outputfolder)
@@ -81,7 +93,8 @@ def generate_field_summary(inputfilename, outputfolder, feature_class):
     ]
     domains = get_domains(feature_class)
 
-    for feature in features:
+    # A record is done once its document is saved (or it's skipped), edits after that are new work
+    for feature in journal.each(features, key=lambda feature: f"{feature['PROJECT_NAME']}@{feature['last_edited_date']}"):
         last_edited_date = feature['last_edited_date']
         subtype_code = feature[subtype_field]
 
@@ -114,18 +127,23 @@ def generate_field_summary(inputfilename, outputfolder, feature_class):
         doc.save(str(output_file))
         
         print(f"Created or updated: {output_file.name}")
+    
+    if journal.skipped:
+        print(f"Resumed, {journal.skipped} records were done by the last run.")
+    journal.finish()
     print("Process completed.")
 
 if __name__ == "__main__":
     from argparse import ArgumentParser
     
     parser = ArgumentParser(
-        name="Generate Field Summary",
+        prog="Generate Field Summary",
         description="Generates and maintains field summary documents for fieldwork records."
     )
     parser.add_argument("-i", "--inputfile", help="Input filename")
     parser.add_argument("-o", "--outputfile", help="Output folder")
-    parser.add_argument("-f", "-featureclass", help="Feature class")
+    parser.add_argument("-f", "--featureclass", help="Feature class")
+    parser.add_argument("-j", "--journal", help="Journal file, rerun with the same journal to resume after a failure")
     args = parser.parse_args()
     
-    generate_field_summary(args.inputfile, args.outputfile, args.featureclass)
\ No newline at end of file
+    generate_field_summary(args.inputfile, args.outputfile, args.featureclass, args.journal)
\ No newline at end of file
@@ -1,29 +1,90 @@
-import arcpy
-from osgeo import ogr
 import json
+from itertools import islice
+from typing import TYPE_CHECKING, Iterable, Iterator
 
-tbl =r"...\Default.gdb\work"
-source = r"filepath"
-spat_ref = arcpy.SpatialReference(102962)
-in_ds = ogr.Open(source)
-lay = in_ds.ExecuteSQL("select * from Townships")
-
-# Do the risky processing outside the cursor so
-# if something goes wrong, you wont have a partial insert
-to_insert = []
-for l in lay:
-    # Load Geojson
-    gJSON = json.loads(l.GetGeometryRef().ExportToJson())
-    
-    # Get as ESRI shape
-    shape = arcpy.AsShape(gJSON)
-    
-    # Re-build shape with correct spatial reference
-    proj_shape = arcpy.Polygon(arcpy.Array(part for part in shape), spat_ref)
-    
-    # Add shape to insert list
-    to_insert.append(proj_shape)
-
-with arcpy.da.InsertCursor(tbl, ["SHAPE@"]) as cursor:
-    for proj_shape in to_insert:
-        cursor.insertRow([proj_shape])
\ No newline at end of file
+from checkpoint import Journal
+from lazy_import import lazy_import
+from spatial_grid import ACTION_NAMES, INSERT, SKIP, UPDATE, GridIndex, geojson_vertices, match_shapes, read_shapes, summarize_vertices
+
+if TYPE_CHECKING:
+    import arcpy
+    import numpy as np
+    from osgeo import ogr
+else:
+    arcpy = lazy_import('arcpy')
+    np = lazy_import('numpy')
+    ogr = lazy_import('osgeo.ogr')
+
+BATCH_SIZE = 1000
+
+def batches(features: Iterable, size: int = BATCH_SIZE) -> Iterator[list]:
+    features = iter(features)
+    while batch := list(islice(features, size)):
+        yield batch
+
+def fid_range(batch: list) -> tuple[int, int]:
+    """Journal key of a batch, the first and last OGR FID"""
+    return batch[0].GetFID(), batch[-1].GetFID()
+
+def main(journal: str | None = "geojson_insert.journal", tolerance: float = 1.0):
+    tbl =r"...\Default.gdb\work"
+    source = r"filepath"
+    spat_ref = arcpy.SpatialReference(102962)
+    in_ds = ogr.Open(source)
+    lay = in_ds.ExecuteSQL("select * from Townships")
+
+    # Index the shapes already in the table so a re-run skips them instead of adding duplicates
+    oid_field = arcpy.Describe(tbl).OIDFieldName
+    oids, envelopes, keys = read_shapes(tbl, spatial_reference=spat_ref)
+    index = GridIndex(envelopes)
+    counts = dict.fromkeys(ACTION_NAMES.values(), 0)
+
+    # Batches inserted by a failed run are skipped when it's run again
+    with Journal(journal, job=f"{source} -> {tbl}") as journal:
+        for batch in journal.each(batches(lay), key=fid_range):
+            # Load Geojson
+            gJSONs = [json.loads(l.GetGeometryRef().ExportToJson()) for l in batch]
+
+            # Same shape: skip, same place within the tolerance: update, otherwise insert
+            # (shapes without vertices have no summary row and are inserted as they are)
+            ids, new_envelopes, new_keys = summarize_vertices(*geojson_vertices(gJSONs))
+            actions = np.full(len(gJSONs), INSERT)
+            matches = np.full(len(gJSONs), -1)
+            actions[ids], matches[ids] = match_shapes(index, keys, new_envelopes, new_keys, tolerance)
+
+            # Do the risky processing outside the cursor so
+            # if something goes wrong, you wont have a partial insert
+            to_insert = []
+            to_update = {}
+            for gJSON, action, match in zip(gJSONs, actions.tolist(), matches.tolist()):
+                counts[ACTION_NAMES[action]] += 1
+                if action == SKIP:
+                    continue
+
+                # Get as ESRI shape
+                shape = arcpy.AsShape(gJSON)
+
+                # Re-build shape with correct spatial reference
+                proj_shape = arcpy.Polygon(arcpy.Array(part for part in shape), spat_ref)
+
+                # Add shape to insert or update list
+                if action == UPDATE:
+                    to_update[int(oids[match])] = proj_shape
+                else:
+                    to_insert.append(proj_shape)
+
+            with arcpy.da.InsertCursor(tbl, ["SHAPE@"]) as cursor:
+                for proj_shape in to_insert:
+                    cursor.insertRow([proj_shape])
+
+            if to_update:
+                where = f"{oid_field} IN ({','.join(map(str, to_update))})"
+                with arcpy.da.UpdateCursor(tbl, ["OID@", "SHAPE@"], where) as cursor:
+                    for oid, _ in cursor:
+                        cursor.updateRow([oid, to_update[oid]])
+        journal.finish()
+
+    print(", ".join(f"{count} {action}" for action, count in counts.items()))
+
+if __name__ == "__main__":
+    main()
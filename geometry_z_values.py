@@ -1,77 +1,245 @@
-import arcpy
+from __future__ import annotations
+
 import os
+from enum import IntFlag
 from tempfile import mkdtemp
+from typing import TYPE_CHECKING, Literal
+
+import numpy as np
+
+from lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import arcpy
+    import arcpy.typing.describe
+else:
+    arcpy = lazy_import('arcpy')
+
+# Z inspection
+# Vertices are read as flat (oid, z) arrays from an exploded read and summarised per
+# feature with reduceat, no Python work is done per vertex
+
+class ZFlag(IntFlag):
+    OK = 0
+    MISSING = 1  # Every Z is NaN (or NoData)
+    PARTIAL = 2  # Some Z values are NaN
+    CONSTANT = 4 # Every vertex has the same Z
+    ZERO = 8     # Every Z is 0 (often Z was never set)
+
+Z_STATS_DTYPE = [
+    ('OID', 'i8'), ('vertices', 'i8'), ('missing', 'i8'),
+    ('z_min', 'f8'), ('z_max', 'f8'), ('flags', 'i4'),
+]
+
+def read_vertices(
+    feature_class: str, 
+    where: str | None = None, 
+    method: Literal['numpy', 'cursor'] = 'numpy') -> tuple[np.ndarray, np.ndarray]:
+    """Read the OID and Z of every vertex
+    
+    Args:
+        feature_class: A Z enabled feature class or layer
+        where: Optional where clause
+        method: `FeatureClassToNumPyArray` ('numpy') or an exploded `SearchCursor` ('cursor')
+    
+    Returns:
+        The OID and Z arrays (one entry per vertex)
+    """
+    if method == 'numpy':
+        vertices = arcpy.da.FeatureClassToNumPyArray(
+            feature_class, ['OID@', 'SHAPE@Z'], where, explode_to_points=True, skip_nulls=False, null_value=np.nan,
+        )
+        return vertices['OID@'].astype('i8'), vertices['SHAPE@Z'].astype('f8')
+    
+    with arcpy.da.SearchCursor(feature_class, ['OID@', 'SHAPE@Z'], where, explode_to_points=True) as cursor:
+        vertices = np.fromiter(
+            ((oid, np.nan if z is None else z) for oid, z in cursor), 
+            dtype=[('OID', 'i8'), ('Z', 'f8')],
+        )
+    return vertices['OID'], vertices['Z']
+
+def z_stats(oids: np.ndarray, z: np.ndarray, nodata: float | None = None) -> np.ndarray:
+    """Per feature vertex count, missing Z count, Z range and `ZFlag` flags
+    
+    Args:
+        oids: The feature OID of each vertex
+        z: The Z of each vertex (NaN is missing)
+        nodata: A Z value that also counts as missing (e.g. -9999)
+    
+    Returns:
+        A structured array with `Z_STATS_DTYPE` sorted by OID, z_min/z_max are NaN when every Z is missing
+    """
+    oids = np.asarray(oids, dtype='i8')
+    z = np.asarray(z, dtype='f8')
+    # Exploded reads are grouped by feature, only sort if they aren't
+    if len(oids) and np.any(oids[1:] < oids[:-1]):
+        order = np.argsort(oids, kind='stable')
+        oids, z = oids[order], z[order]
+    missing = np.isnan(z)
+    if nodata is not None:
+        missing |= z == nodata
+    
+    if not len(oids):
+        return np.zeros(0, dtype=Z_STATS_DTYPE)
+    
+    unique, starts, counts = np.unique(oids, return_index=True, return_counts=True)
+    stats = np.zeros(len(unique), dtype=Z_STATS_DTYPE)
+    stats['OID'] = unique
+    stats['vertices'] = counts
+    stats['missing'] = np.add.reduceat(missing, starts)
+    
+    # NaN loses in fmin/fmax, so missing vertices are skipped unless all of them are missing
+    valid_z = np.where(missing, np.nan, z)
+    stats['z_min'] = np.fmin.reduceat(valid_z, starts)
+    stats['z_max'] = np.fmax.reduceat(valid_z, starts)
+    
+    all_missing = stats['missing'] == counts
+    flags = np.where(all_missing, ZFlag.MISSING, ZFlag.OK)
+    flags |= np.where((stats['missing'] > 0) & ~all_missing, ZFlag.PARTIAL, ZFlag.OK)
+    constant = (stats['z_min'] == stats['z_max']) & (counts - stats['missing'] > 1)
+    flags |= np.where(constant, ZFlag.CONSTANT, ZFlag.OK)
+    flags |= np.where(constant & (stats['z_min'] == 0), ZFlag.ZERO, ZFlag.OK)
+    stats['flags'] = flags
+    return stats
+
+def flagged(stats: np.ndarray, flags: ZFlag = ZFlag.MISSING | ZFlag.PARTIAL | ZFlag.CONSTANT) -> np.ndarray:
+    """The rows of `z_stats` output with any of `flags` set"""
+    return stats[(stats['flags'] & flags) != 0]
+
+def inspect_z(feature_class: str, where: str | None = None, nodata: float | None = None, **kwargs) -> np.ndarray:
+    """Read the vertices of a feature class and compute `z_stats`, keyword arguments are passed to `read_vertices`"""
+    return z_stats(*read_vertices(feature_class, where, **kwargs), nodata=nodata)
+
+def describe_flags(flags: int) -> str:
+    return '|'.join(flag.name for flag in ZFlag if flag and flags & flag) or 'OK'
+
+def synthetic_vertices(
+    features: int, 
+    vertices: int = 50, 
+    missing: float = 0.01, 
+    constant: float = 0.01, 
+    seed: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """Random OID and Z arrays for testing without a geodatabase
+    
+    Feature sizes vary around `vertices`. A `missing` fraction of the features have no Z, 
+    as many again have some NaN Z values, and a `constant` fraction are flat.
+    """
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(2, 2 * vertices, features)
+    oids = np.repeat(np.arange(1, features + 1), counts)
+    z = rng.normal(100.0, 25.0, len(oids))
+    
+    feature_kind = rng.random(features)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    kind = np.repeat(feature_kind, counts)
+    z[kind < missing] = np.nan
+    partial = (kind >= missing) & (kind < 2 * missing) & (rng.random(len(z)) < 0.5)
+    # Keep the first vertex so partial features never lose every Z
+    partial[starts] = False
+    z[partial] = np.nan
+    flat = (kind >= 2 * missing) & (kind < 2 * missing + constant)
+    z[flat] = np.repeat(rng.normal(100.0, 25.0, features), counts)[flat]
+    return oids, z
+
+def main():
+    # Create a file geodatabase
+    output_folder = mkdtemp("_geo-z-val_test")
+    gdb_name = "ExampleDatabase.gdb"
+    gdb_full_path = os.path.join(output_folder, gdb_name)
+
+    if not arcpy.Exists(gdb_full_path):
+        arcpy.management.CreateFileGDB(out_folder_path=output_folder, out_name=gdb_name)
+
+    # Create a polyline feature class
+    feature_class_name_polyline = "counties_polyline"
+    arcpy.CreateFeatureclass_management(
+        out_path=gdb_full_path,
+        out_name=feature_class_name_polyline,
+        geometry_type="POLYLINE",
+        has_z="ENABLED"  # Enable Z values
+    )
+
+    # Create polyline geometry with Z values
+    array_polyline = arcpy.Array([arcpy.Point(1000.0, 2000.0, 50.0),
+                                   arcpy.Point(1500.0, 2500.0, 75.0),
+                                   arcpy.Point(2000.0, 3000.0, 100.0)])
+    polyline = arcpy.Polyline(array_polyline, has_z=True)
+
+    # InsertCursor to add new polyline geometry
+    with arcpy.da.InsertCursor(os.path.join(gdb_full_path, feature_class_name_polyline), ['SHAPE@']) as cursor:
+        cursor.insertRow([polyline])
+
+    # Create a polygon feature class
+    feature_class_name_polygon = "counties_polygon"
+    res = arcpy.CreateFeatureclass_management(
+        out_path=gdb_full_path,
+        out_name=feature_class_name_polygon,
+        geometry_type="POLYGON",
+        has_z="ENABLED"  # Enable Z values
+    )
+
+    desc: 'arcpy.typing.describe.FeatureClass' = arcpy.Describe(res[0])
+    print(desc.hasZ)
+
+    # Create polygon geometry with Z values
+    array_polygon = arcpy.Array([arcpy.Point(1000.0, 2000.0, 50.0),
+                                  arcpy.Point(1500.0, 2000.0, 50.0),
+                                  arcpy.Point(1500.0, 2500.0, 50.0),
+                                  arcpy.Point(1000.0, 2500.0, 50.0),
+                                  arcpy.Point(1000.0, 2000.0, 50.0)])  # Closing the polygon
+    polygon = arcpy.Polygon(array_polygon, has_z=True)
+
+    for part in polygon:
+        for point in part:
+            print(point)
+
+    # InsertCursor to add new polygon geometry
+    with arcpy.da.InsertCursor(os.path.join(gdb_full_path, feature_class_name_polygon), ['SHAPE@']) as cursor:
+        cursor.insertRow([polygon])
+
+    # Check Z values for both feature classes
+    for name in (feature_class_name_polyline, feature_class_name_polygon):
+        stats = inspect_z(os.path.join(gdb_full_path, name))
+        for row in stats:
+            print(f"{name} {row['OID']} - vertices: {row['vertices']}, Z: {row['z_min']} to {row['z_max']}, {describe_flags(row['flags'])}")
+
+def python_z_stats(oids: np.ndarray, z: np.ndarray) -> dict[int, tuple[int, int, float, float]]:
+    """The per vertex loop `z_stats` replaces (vertices, missing, z_min, z_max per OID)"""
+    stats: dict[int, list] = {}
+    for oid, value in zip(oids.tolist(), z.tolist()):
+        row = stats.setdefault(oid, [0, 0, float('nan'), float('nan')])
+        row[0] += 1
+        if value != value:
+            row[1] += 1
+            continue
+        row[2] = value if row[2] != row[2] else min(row[2], value)
+        row[3] = value if row[3] != row[3] else max(row[3], value)
+    return {oid: tuple(row) for oid, row in stats.items()}
+
+def benchmark(features: int = 200_000, vertices: int = 50) -> None:
+    """Compare `z_stats` with a per vertex loop on synthetic arrays"""
+    from time import perf_counter
+    
+    oids, z = synthetic_vertices(features, vertices, seed=42)
+    print(f"{features:,} features, {len(oids):,} vertices")
+    
+    start = perf_counter()
+    stats = z_stats(oids, z)
+    vectorized = perf_counter() - start
+    
+    start = perf_counter()
+    expected = python_z_stats(oids, z)
+    looped = perf_counter() - start
+    
+    for row in stats[::max(1, len(stats) // 1000)]:
+        vertex_count, missing, z_min, z_max = expected[int(row['OID'])]
+        assert (row['vertices'], row['missing']) == (vertex_count, missing)
+        assert np.allclose([row['z_min'], row['z_max']], [z_min, z_max], equal_nan=True)
+    
+    print(f"z_stats: {vectorized:.3f} seconds, per vertex loop: {looped:.3f} seconds ({looped / vectorized:.0f}x)")
+    for flag in (ZFlag.MISSING, ZFlag.PARTIAL, ZFlag.CONSTANT):
+        print(f"{flag.name}: {len(flagged(stats, flag)):,} features")
 
-import arcpy.typing
-import arcpy.typing.describe
-
-# Create a file geodatabase
-output_folder = mkdtemp("_geo-z-val_test")
-gdb_name = "ExampleDatabase.gdb"
-gdb_full_path = os.path.join(output_folder, gdb_name)
-
-if not arcpy.Exists(gdb_full_path):
-    arcpy.management.CreateFileGDB(out_folder_path=output_folder, out_name=gdb_name)
-
-# Create a polyline feature class
-feature_class_name_polyline = "counties_polyline"
-arcpy.CreateFeatureclass_management(
-    out_path=gdb_full_path,
-    out_name=feature_class_name_polyline,
-    geometry_type="POLYLINE",
-    has_z="ENABLED"  # Enable Z values
-)
-
-# Create polyline geometry with Z values
-array_polyline = arcpy.Array([arcpy.Point(1000.0, 2000.0, 50.0),
-                               arcpy.Point(1500.0, 2500.0, 75.0),
-                               arcpy.Point(2000.0, 3000.0, 100.0)])
-polyline = arcpy.Polyline(array_polyline)
-
-# InsertCursor to add new polyline geometry
-with arcpy.da.InsertCursor(os.path.join(gdb_full_path, feature_class_name_polyline), ['SHAPE@']) as cursor:
-    cursor.insertRow([polyline])
-
-# Create a polygon feature class
-feature_class_name_polygon = "counties_polygon"
-res = arcpy.CreateFeatureclass_management(
-    out_path=gdb_full_path,
-    out_name=feature_class_name_polygon,
-    geometry_type="POLYGON",
-    has_z="ENABLED"  # Enable Z values
-)
-
-desc: 'arcpy.typing.describe.FeatureClass' = arcpy.Describe(res[0])
-print(desc.hasZ)
-
-# Create polygon geometry with Z values
-array_polygon = arcpy.Array([arcpy.Point(1000.0, 2000.0, 50.0),
-                              arcpy.Point(1500.0, 2000.0, 50.0),
-                              arcpy.Point(1500.0, 2500.0, 50.0),
-                              arcpy.Point(1000.0, 2500.0, 50.0),
-                              arcpy.Point(1000.0, 2000.0, 50.0)])  # Closing the polygon
-polygon = arcpy.Polygon(array_polygon, has_z=True)
-
-for part in polygon:
-    for point in part:
-        print(point)
-
-# InsertCursor to add new polygon geometry
-with arcpy.da.InsertCursor(os.path.join(gdb_full_path, feature_class_name_polygon), ['SHAPE@']) as cursor:
-    cursor.insertRow([polygon])
-
-# Check Z values for polyline
-with arcpy.da.SearchCursor(os.path.join(gdb_full_path, feature_class_name_polyline), ['SHAPE@']) as cursor:
-    for row in cursor:
-        geometry = row[0]
-        for part in geometry:
-            for p in part:
-                print("Polyline - X:", p.X, "Y:", p.Y, "Z:", p.Z)  # Output Z values
-
-# Check Z values for polygon
-with arcpy.da.SearchCursor(os.path.join(gdb_full_path, feature_class_name_polygon), ['SHAPE@']) as cursor:
-    for row in cursor:
-        geometry = row[0]
-        for part in geometry:
-            for p in part:
-                print("Polygon - X:", p.X, "Y:", p.Y, "Z:", p.Z)  # Output Z values
\ No newline at end of file
+if __name__ == "__main__":
+    import sys
+    benchmark() if 'benchmark' in sys.argv[1:] else main()
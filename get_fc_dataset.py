@@ -1,26 +1,29 @@
 from __future__ import annotations
 from pathlib import Path
-from arcpy import Describe, ListDatasets, EnvManager
 from functools import lru_cache
+from typing import TYPE_CHECKING
 
-# For Describe type hinting
-try:
+from lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import arcpy
+    # For Describe type hinting (fails at runtime due to malformed package)
     from arcpy.typing.describe import FeatureClass
-except ImportError: # will fail at runtime do to malformed package
-    pass
+else:
+    arcpy = lazy_import('arcpy')
 
 def get_fc_dataset(fc: Path) -> str:
     fc = Path(fc)
-    fc_desc: FeatureClass = Describe(str(fc))
+    fc_desc: FeatureClass = arcpy.Describe(str(fc))
     fc_dataset = fc.parent
     wsp_path = Path(fc_desc.workspace.catalogPath)
     if fc_dataset != wsp_path:
         return str(fc_dataset.relative_to(wsp_path))
 
 def get_fc_dataset_list(fc: str) -> str:
-    fc_desc: FeatureClass = Describe(fc)
-    with EnvManager(workspace=fc_desc.workspace.catalogPath):
-        for ds in ListDatasets():
+    fc_desc: FeatureClass = arcpy.Describe(fc)
+    with arcpy.EnvManager(workspace=fc_desc.workspace.catalogPath):
+        for ds in arcpy.ListDatasets():
             if ds in fc:
                 return ds
     
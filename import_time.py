@@ -0,0 +1,181 @@
+"""Startup benchmark for the snippet modules
+
+Each module is imported in a fresh interpreter with `python -X importtime` and a stub
+arcpy on the path (the stub sleeps to stand in for the seconds a real arcpy import
+takes), the other lazy dependencies are stubbed when they aren't installed. The report
+has the import time of every module and the heavy packages it pulled in, modules over
+budget or importing a lazy dependency at import time fail the run.
+
+Usage:
+    python import_time.py                  # every module
+    python import_time.py raster_sym progressor --budget 20 --repeat 5
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from importlib.util import find_spec
+from pathlib import Path
+from typing import NamedTuple
+
+ROOT = Path(__file__).parent
+
+# Packages that must only be imported when used
+LAZY = ('arcpy', 'arcgis', 'docx', 'osgeo', 'pandas')
+STUB_DELAY = 0.2
+BUDGET_MS = 50.0
+# Modules built on NumPy pay for it up front
+BUDGETS_MS = {
+    'geometry_z_values': 250.0,
+    'inline_summary': 250.0,
+    'sketch_summary': 250.0,
+    'raster_histogram': 250.0,
+    'raster_sym': 250.0,
+    # A dozen expression dataclasses are built at import
+    'sql-formatting': 75.0,
+}
+
+STUB = '''\
+import sys
+import time
+from importlib.abc import Loader, MetaPathFinder
+from importlib.machinery import ModuleSpec
+from types import ModuleType
+
+time.sleep({delay})
+
+class _Stub:
+    def __init__(self, *args, **kwargs): ...
+    def __call__(self, *args, **kwargs): return _Stub()
+    def __getattr__(self, name): return _Stub()
+
+def __getattr__(name):
+    return _Stub
+
+class _StubModule(ModuleType):
+    def __getattr__(self, name):
+        return _Stub
+
+class _Finder(MetaPathFinder, Loader):
+    def find_spec(self, name, path=None, target=None):
+        if name.startswith(__name__ + '.'):
+            return ModuleSpec(name, self, is_package=True)
+    def create_module(self, spec):
+        return _StubModule(spec.name)
+    def exec_module(self, module):
+        module.__path__ = []
+
+sys.meta_path.append(_Finder())
+'''
+
+# Import the module by path (some file names aren't identifiers) and print the time it took
+RUNNER = '''\
+import sys, time
+from importlib.util import module_from_spec, spec_from_file_location
+spec = spec_from_file_location({name!r}, {path!r})
+module = module_from_spec(spec)
+sys.modules[{name!r}] = module
+sys.stderr.write('-- start\\n')
+start = time.perf_counter()
+spec.loader.exec_module(module)
+print(time.perf_counter() - start)
+'''
+
+IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+class Result(NamedTuple):
+    module: str
+    ms: float
+    lazy: list[str]
+    top: list[tuple[str, float]]
+    error: str | None = None
+
+def write_stubs(folder: Path, names: tuple[str, ...] = LAZY, delay: float = STUB_DELAY) -> list[str]:
+    """Write stub packages for arcpy and any lazy dependency that isn't installed"""
+    stubbed = []
+    for name in names:
+        if name != 'arcpy' and find_spec(name) is not None:
+            continue
+        package = folder / name
+        package.mkdir(exist_ok=True)
+        (package / '__init__.py').write_text(STUB.format(delay=delay if name == 'arcpy' else 0), encoding='utf-8')
+        stubbed.append(name)
+    return stubbed
+
+def measure(path: Path, stubs: Path) -> Result:
+    name = path.stem.replace('-', '_')
+    python_path = os.pathsep.join([str(stubs), str(ROOT), os.environ.get('PYTHONPATH', '')])
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', RUNNER.format(name=name, path=str(path))],
+        capture_output=True, text=True, cwd=ROOT,
+        env={**os.environ, 'PYTHONPATH': python_path},
+    )
+    imported: dict[str, float] = {}
+    packages: set[str] = set()
+    error = None
+    # Skip the interpreter startup and the runner's own imports
+    _, _, stderr = process.stderr.partition('-- start\n')
+    for line in stderr.splitlines():
+        if match := IMPORTTIME.match(line):
+            _, cumulative, indent, package = match.groups()
+            packages.add(package.split('.')[0])
+            # Only top level imports, nested ones are in their parent's cumulative time
+            if len(indent) == 1:
+                imported[package] = int(cumulative) / 1000
+        elif line.strip() and not line.startswith('import time:'):
+            error = line.strip()
+
+    if process.returncode != 0:
+        return Result(path.stem, 0.0, [], [], error or f"exit code {process.returncode}")
+
+    lazy = sorted(packages & set(LAZY))
+    top = sorted(imported.items(), key=lambda item: item[1], reverse=True)[:3]
+    return Result(path.stem, float(process.stdout.split()[-1]) * 1000, lazy, top)
+
+def modules() -> list[Path]:
+    return sorted(path for path in ROOT.glob('*.py') if path.stem != Path(__file__).stem)
+
+def main() -> int:
+    parser = ArgumentParser(description="Measure the import time of the snippet modules")
+    parser.add_argument('modules', nargs='*', help="Module names (default is every module)")
+    parser.add_argument('--budget', type=float, default=BUDGET_MS, help="Default budget per module in milliseconds")
+    parser.add_argument('--repeat', type=int, default=3, help="Imports per module, the fastest is reported")
+    args = parser.parse_args()
+
+    paths = modules()
+    if args.modules:
+        paths = [path for path in paths if path.stem in args.modules]
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as folder:
+        stubbed = write_stubs(Path(folder))
+        print(f"Stubbed: {', '.join(stubbed)} (arcpy import sleeps {STUB_DELAY}s)\n")
+        print(f"{'module':<28} {'ms':>8} {'budget':>8}  status   slowest imports")
+        for path in paths:
+            result = min((measure(path, Path(folder)) for _ in range(args.repeat)), key=lambda r: r.ms)
+            budget = BUDGETS_MS.get(result.module, args.budget)
+            if result.error:
+                status = 'ERROR'
+            elif result.lazy:
+                status = 'EAGER'
+            elif result.ms > budget:
+                status = 'SLOW'
+            else:
+                status = 'ok'
+            failures += status != 'ok'
+
+            detail = result.error or ', '.join(f"{package} {ms:.1f}" for package, ms in result.top)
+            if result.lazy:
+                detail = f"imports {', '.join(result.lazy)}; {detail}"
+            print(f"{result.module:<28} {result.ms:>8.1f} {budget:>8.0f}  {status:<7}  {detail}")
+
+    print(f"\n{failures} module(s) failed" if failures else "\nAll modules within budget")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
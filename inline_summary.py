@@ -1,22 +1,165 @@
-import this
+#import this
+from __future__ import annotations
+
 from collections import Counter
+from itertools import islice
+from os import cpu_count
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Literal, TypeVar
+
 import numpy as np
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
 #words = this.s*1000
 #
 #vals = [val.strip() for row in words.split('\n') for val in row.split(' ') if val.strip()]
 
-vals = np.random.randint(0, 100, size=10000000, dtype='int') 
+T = TypeVar('T')
+R = TypeVar('R')
 
-def python():
-    return np.array(list(Counter(vals).items()), dtype=[('Package', 'U50'), ('Counts', 'i4')])
+SUMMARY_DTYPE = [('Package', 'U50'), ('Counts', 'i4')]
 
-def numpy():
+def python(vals: np.ndarray) -> np.ndarray:
+    return np.array(list(Counter(vals).items()), dtype=SUMMARY_DTYPE)
+
+def numpy(vals: np.ndarray) -> np.ndarray:
     v, u = np.unique(vals, return_counts=True)
-    return np.array(list(zip(v, u)), dtype=[('Package', 'U50'), ('Counts', 'i4')])
+    return np.array(list(zip(v, u)), dtype=SUMMARY_DTYPE)
+
+# Partial summaries
+# Each chunk of rows is counted on its own (in a worker process) and the
+# partials are merged in the parent. Counting is associative, so the merged
+# result is identical to counting the whole column at once.
+
+def iter_chunks(values: Iterable, size: int) -> Iterator[np.ndarray]:
+    """Split any iterable (array, list, cursor generator) into arrays of `size` values
+
+    Only one chunk is held in memory at a time, so a column can be streamed from
+    a cursor: `iter_chunks((row[0] for row in SearchCursor(tbl, [field])), 100_000)`
+    """
+    if isinstance(values, np.ndarray):
+        for start in range(0, len(values), size):
+            yield values[start:start+size]
+        return
+
+    values = iter(values)
+    while chunk := list(islice(values, size)):
+        yield np.array(chunk)
+
+def count_chunk(chunk: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Count one chunk, returns sorted unique values and their counts"""
+    return np.unique(chunk, return_counts=True)
+
+def count_chunk_dict(chunk: Iterable) -> Counter:
+    """Count one chunk into a Counter (for values numpy can't sort)"""
+    return Counter(chunk.tolist() if isinstance(chunk, np.ndarray) else chunk)
+
+def merge_sorted(partials: Iterable[tuple[np.ndarray, np.ndarray]]) -> tuple[np.ndarray, np.ndarray]:
+    """Merge (values, counts) partials by sorting the concatenated values and summing runs"""
+    partials = list(partials)
+    if not partials:
+        return np.array([]), np.array([], dtype='i8')
+
+    values = np.concatenate([v for v, _ in partials])
+    counts = np.concatenate([c for _, c in partials])
+
+    # Stable sort keeps the merge deterministic, reduceat sums each run of equal values
+    order = np.argsort(values, kind='stable')
+    values, counts = values[order], counts[order]
+    unique, starts = np.unique(values, return_index=True)
+    return unique, np.add.reduceat(counts, starts) if len(starts) else counts[:0]
+
+def merge_dicts(partials: Iterable[Counter]) -> Counter:
+    """Merge Counter partials with a dictionary sum"""
+    total = Counter()
+    for partial in partials:
+        total.update(partial)
+    return total
+
+def as_summary(values: Iterable, counts: Iterable[int]) -> np.ndarray:
+    """Build the ('Package', 'Counts') structured array from values and counts"""
+    return np.array(list(zip(values, counts)), dtype=SUMMARY_DTYPE)
+
+def bounded_map(pool: Executor, func: Callable[[T], R], items: Iterable[T], pending: int) -> Iterator[R]:
+    """`pool.map` that submits at most `pending` items at a time, results come in completion order
+
+    `Executor.map` (and `multiprocessing.Pool.imap_unordered`) read the whole input up
+    front, so a streamed column would be held in memory (and pickled) all at once.
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+    running = set()
+    for item in items:
+        running.add(pool.submit(func, item))
+        if len(running) >= pending:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            yield from (future.result() for future in done)
+    while running:
+        done, running = wait(running, return_when=FIRST_COMPLETED)
+        yield from (future.result() for future in done)
+
+def parallel(
+    chunks: Iterable[np.ndarray],
+    *,
+    workers: int | None = None,
+    pending: int | None = None,
+    merge: Literal['sorted', 'dict'] = 'sorted') -> np.ndarray:
+    """Count chunks in a process pool and merge the partials into a summary array
+
+    Chunks are read from `chunks` as workers free up, the merge doesn't depend on order.
+
+    Args:
+        chunks: An iterable of value arrays (see `iter_chunks`)
+        workers: Number of worker processes (default is os.cpu_count())
+        pending: Chunks submitted but not counted yet (default is twice the workers)
+        merge: Merge partials as sorted arrays ('sorted') or Counter sums ('dict')
+    """
+    counter = count_chunk if merge == 'sorted' else count_chunk_dict
+    workers = workers or cpu_count() or 1
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = bounded_map(pool, counter, chunks, pending or 2 * workers)
+
+        if merge == 'sorted':
+            return as_summary(*merge_sorted(partials))
+
+        merged = merge_dicts(partials)
+        return as_summary(merged.keys(), merged.values())
+
+if __name__ == '__main__':
+    from time import perf_counter
+
+    vals = np.random.randint(0, 100, size=10000000, dtype='int')
+
+    numpy_list = sorted(numpy(vals).tolist())
+    python_list = sorted(python(vals).tolist())
+
+    assert numpy_list == python_list
+
+    chunk_size = len(vals) // (cpu_count() or 1) + 1
+    for merge in ('sorted', 'dict'):
+        for workers in (1, 2, cpu_count()):
+            start = perf_counter()
+            summary = parallel(iter_chunks(vals, chunk_size), workers=workers, merge=merge)
+            print(f'{merge} merge, {workers} workers: {perf_counter() - start:.3f} seconds')
+            assert sorted(summary.tolist()) == numpy_list
 
-numpy_list = sorted(numpy().tolist())
-python_list = sorted(python().tolist())
+    # A streamed column is read at most `pending` chunks ahead of the counted ones
+    from concurrent.futures import ThreadPoolExecutor
+    read = 0
+    def streamed(chunks: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        global read
+        for chunk in chunks:
+            read += 1
+            yield chunk
+    with ThreadPoolExecutor(4) as pool:
+        for counted, _ in enumerate(bounded_map(pool, count_chunk, streamed(iter_chunks(vals, 100_000)), pending=8), 1):
+            assert read - counted <= 8, (read, counted)
+    summary = parallel(iter_chunks(vals.tolist(), 100_000), pending=4)
+    assert sorted(summary.tolist()) == numpy_list
 
-assert numpy_list == python_list
+    start = perf_counter()
+    numpy(vals)
+    print(f'serial numpy: {perf_counter() - start:.3f} seconds')
 
-from decimal import Decimal
\ No newline at end of file
+from decimal import Decimal
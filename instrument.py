@@ -0,0 +1,337 @@
+"""Spans, row counters and call timers for finding where snippet tools spend time
+
+Spans nest per thread and are aggregated by their stack path, so the report has
+inclusive and self time for every path (e.g. `main;copy;search`). Cursor and
+service wrappers time every `next`, `insertRow` or call and count rows in and out.
+
+When the profiler is disabled (the default, set SNIPPETS_PROFILE=1 to enable it) spans
+are a shared no-op, decorated functions cost one attribute check and cursors are
+returned unwrapped, so the instrumentation can stay in production code.
+
+Usage:
+    >>> from instrument import profile
+    >>> @profile
+    ... def copy(source, target, fields):
+    ...     with profile.cursor(SearchCursor(source, fields), 'search') as search, \\
+    ...          profile.cursor(InsertCursor(target, fields), 'insert') as insert:
+    ...         for row in search:
+    ...             insert.insertRow(row)
+
+    >>> with profile.span('query'):
+    ...     features = profile.timed(layer.query, 'service.query')(where='1=1')
+    ...     profile.count('query', rows_out=len(features))
+
+    >>> profile.write_collapsed('profile.txt') # flamegraph.pl / speedscope input
+    >>> profile.write_json('profile.json')
+    >>> print(profile.report())
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from functools import wraps
+from threading import Lock, local
+from time import perf_counter_ns
+from typing import Any, Callable, Iterator, TypeVar
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+@dataclass(slots=True)
+class SpanStats:
+    calls: int = 0
+    total_ns: int = 0
+    self_ns: int = 0
+    rows_in: int = 0
+    rows_out: int = 0
+
+class _NullSpan:
+    """The span returned while the profiler is disabled"""
+    __slots__ = ()
+    def __enter__(self) -> _NullSpan:
+        return self
+    def __exit__(self, *exc) -> None:
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'start', 'children')
+
+    def __init__(self, profiler: Profiler, name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> _Span:
+        self.profiler._stack().append(self)
+        self.children = 0
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = perf_counter_ns() - self.start
+        stack = self.profiler._stack()
+        path = tuple(span.name for span in stack)
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        self.profiler._record(path, 1, elapsed, elapsed - self.children)
+
+class _TimedCursor:
+    """Proxy for a da cursor that times `next` and `insertRow`, stats are recorded when it is closed"""
+
+    def __init__(self, profiler: Profiler, cursor: Any, name: str) -> None:
+        self._profiler = profiler
+        self._cursor = cursor
+        self._name = name
+        self._parent = tuple(span.name for span in profiler._stack())
+        self._read = 0
+        self._inserted = 0
+        self._ns = 0
+
+    def __iter__(self) -> Iterator[Any]:
+        rows = iter(self._cursor)
+        clock = perf_counter_ns
+        count = elapsed = 0
+        try:
+            while True:
+                start = clock()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    break
+                elapsed += clock() - start
+                count += 1
+                yield row
+        finally:
+            self._read += count
+            self._ns += elapsed
+
+    def __next__(self) -> Any:
+        start = perf_counter_ns()
+        row = next(self._cursor)
+        self._ns += perf_counter_ns() - start
+        self._read += 1
+        return row
+
+    def insertRow(self, row: Any) -> Any:
+        start = perf_counter_ns()
+        result = self._cursor.insertRow(row)
+        self._ns += perf_counter_ns() - start
+        self._inserted += 1
+        return result
+
+    def close(self) -> None:
+        """Record the cursor stats and close the cursor (releasing its locks)"""
+        self._flush()
+        if hasattr(self._cursor, 'close'):
+            self._cursor.close()
+
+    def _flush(self) -> None:
+        """Record the cursor stats (rows read count as rows out, inserted rows as rows in)"""
+        if not (self._read or self._inserted):
+            return
+        # Cursor time is not the enclosing span's own time
+        stack = self._profiler._stack()
+        if stack and len(stack) == len(self._parent):
+            stack[-1].children += self._ns
+        self._profiler._record(
+            self._parent + (self._name,), self._read + self._inserted, self._ns, self._ns,
+            rows_in=self._inserted, rows_out=self._read,
+        )
+        self._read = self._inserted = self._ns = 0
+
+    def __enter__(self) -> _TimedCursor:
+        if hasattr(self._cursor, '__enter__'):
+            self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc) -> Any:
+        # The cursor's own __exit__ closes it
+        self._flush()
+        if hasattr(self._cursor, '__exit__'):
+            return self._cursor.__exit__(*exc)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+class Profiler:
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.stats: dict[tuple[str, ...], SpanStats] = {}
+        self._lock = Lock()
+        self._local = local()
+
+    def _stack(self) -> list[_Span]:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _record(self, path: tuple[str, ...], calls: int, total_ns: int, self_ns: int, rows_in: int = 0, rows_out: int = 0) -> None:
+        with self._lock:
+            stats = self.stats.get(path)
+            if stats is None:
+                stats = self.stats[path] = SpanStats()
+            stats.calls += calls
+            stats.total_ns += total_ns
+            stats.self_ns += self_ns
+            stats.rows_in += rows_in
+            stats.rows_out += rows_out
+
+    def span(self, name: str) -> _Span | _NullSpan:
+        """Context manager timing a named block, nested in the enclosing span"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def __call__(self, func: F | None = None, *, name: str | None = None) -> F | Callable[[F], F]:
+        """Decorator timing every call of a function as a span (`@profile` or `@profile(name=...)`)"""
+        def decorator(func: F) -> F:
+            span_name = name or func.__qualname__
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, span_name):
+                    return func(*args, **kwargs)
+            return wrapper # type: ignore[return-value]
+        return decorator(func) if func is not None else decorator
+
+    def timed(self, func: F, name: str | None = None) -> F:
+        """Wrap a callable (e.g. a service query) so every call is a span, returned as is when disabled"""
+        if not self.enabled:
+            return func
+        return self(func, name=name or getattr(func, '__qualname__', repr(func)))
+
+    def cursor(self, cursor: Any, name: str = 'cursor') -> Any:
+        """Time every row of a search/update cursor or every `insertRow` of an insert cursor
+
+        The cursor is returned as is when disabled. Stats are recorded when the wrapper
+        is exited or closed, so use it as a context manager.
+        """
+        if not self.enabled:
+            return cursor
+        return _TimedCursor(self, cursor, name)
+
+    def count(self, name: str, rows_in: int = 0, rows_out: int = 0) -> None:
+        """Add rows in/out to a stage, nested under the current span"""
+        if not self.enabled:
+            return
+        path = tuple(span.name for span in self._stack())
+        if not path or path[-1] != name:
+            path += (name,)
+        self._record(path, 0, 0, 0, rows_in, rows_out)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats.clear()
+
+    # Export
+
+    def collapsed(self) -> str:
+        """Self time in microseconds per stack in the collapsed format used by flame graph tools"""
+        return '\n'.join(
+            f"{';'.join(path)} {stats.self_ns // 1000}"
+            for path, stats in sorted(self.stats.items())
+            if stats.self_ns >= 1000
+        )
+
+    def to_json(self) -> list[dict[str, Any]]:
+        return [
+            {'path': ';'.join(path), 'name': path[-1], 'depth': len(path), **asdict(stats)}
+            for path, stats in sorted(self.stats.items())
+        ]
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed() + '\n')
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    def report(self) -> str:
+        """A text table of the spans, indented by depth"""
+        lines = [f"{'span':<40} {'calls':>10} {'total s':>10} {'self s':>10} {'rows in':>10} {'rows out':>10}"]
+        for path, stats in sorted(self.stats.items()):
+            label = '  ' * (len(path) - 1) + path[-1]
+            lines.append(
+                f"{label:<40} {stats.calls:>10,} {stats.total_ns / 1e9:>10.3f} {stats.self_ns / 1e9:>10.3f} "
+                f"{stats.rows_in:>10,} {stats.rows_out:>10,}"
+            )
+        return '\n'.join(lines)
+
+profile = Profiler(enabled=os.environ.get('SNIPPETS_PROFILE', '') not in ('', '0'))
+
+if __name__ == '__main__':
+    from time import perf_counter
+
+    CALLS = 1_000_000
+
+    class FakeCursor:
+        def __init__(self, rows: int) -> None:
+            self.rows = rows
+        def __iter__(self):
+            return iter(range(self.rows))
+        def insertRow(self, row):
+            return row
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            return None
+        def close(self):
+            self.closed = True
+
+    def bare(x):
+        return x
+
+    def measure(label: str, func: Callable[[], None]) -> None:
+        start = perf_counter()
+        func()
+        print(f"{label:<30} {(perf_counter() - start) / CALLS * 1e9:>8.1f} ns/call")
+
+    for enabled in (False, True):
+        profiler = Profiler(enabled)
+        decorated = profiler(bare, name='bare')
+        print(f"Profiler {'enabled' if enabled else 'disabled'}")
+
+        def span_loop():
+            for _ in range(CALLS):
+                with profiler.span('loop'):
+                    pass
+        def decorated_loop():
+            for i in range(CALLS):
+                decorated(i)
+        def cursor_loop():
+            with profiler.cursor(FakeCursor(CALLS), 'search') as search, profiler.cursor(FakeCursor(0), 'insert') as insert:
+                for row in search:
+                    insert.insertRow(row)
+
+        measure('  bare call', lambda: [bare(i) for i in range(CALLS)] and None)
+        measure('  span', span_loop)
+        measure('  decorated call', decorated_loop)
+        measure('  cursor next + insertRow', cursor_loop)
+
+    profiler = Profiler(True)
+    @profiler
+    def main():
+        with profiler.span('copy'):
+            with profiler.cursor(FakeCursor(100_000), 'search') as search, profiler.cursor(FakeCursor(0), 'insert') as insert:
+                for row in search:
+                    insert.insertRow(row)
+        profiler.count('copy', rows_out=100_000)
+    main()
+
+    # Closing the timer closes the cursor, stats are recorded once
+    checked, fake = Profiler(True), FakeCursor(10)
+    search = checked.cursor(fake, 'search')
+    assert list(search) == list(range(10))
+    search.close()
+    search.close()
+    assert getattr(fake, 'closed', False) and checked.stats[('search',)].rows_out == 10
+
+    print(profiler.report())
+    print(profiler.collapsed())
@@ -0,0 +1,397 @@
+"""Local columnar snapshots of feature layer tables
+
+A snapshot is the attribute table of one layer query (URL, where clause and fields)
+stored as one `.npy` file per column. Loading memory maps the files, so opening a
+snapshot is instant and repeated joins and audits read from the page cache instead of
+the service. Layers with edit tracking are refreshed with a delta query (rows edited
+since the newest edit date in the snapshot) and an object ID query to drop deleted rows,
+other layers are downloaded again.
+
+Columns are NumPy arrays: integers are int64, doubles float64, dates datetime64[ms] and
+strings fixed width unicode. Nulls are stored as a boolean mask next to the column
+(`snapshot.nulls[name]`). Geometry, blob and raster fields are not stored.
+
+Usage:
+    >>> store = SnapshotStore()
+    >>> with SyncFeatureServiceClient(token=token) as client:
+    ...     snapshot = store.refresh(client, layer_url, "STATUS = 'Open'", ['NAME', 'STATUS'])
+    >>> snapshot['NAME'][:5]
+    >>> frame = store.load(layer_url, "STATUS = 'Open'", ['NAME', 'STATUS']).to_frame()
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator, Literal, Sequence
+
+from lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    from pandas import DataFrame
+
+    from feature_service import SyncFeatureServiceClient
+else:
+    np = lazy_import('numpy')
+
+JSON = dict[str, Any]
+Kind = Literal['int', 'float', 'date', 'str']
+# A column and its null mask (None when nothing is null)
+Column = tuple['np.ndarray', 'np.ndarray | None']
+
+DEFAULT_ROOT = Path(os.environ.get('SNIPPETS_SNAPSHOTS', Path.home() / '.arcpy-snippets' / 'snapshots'))
+
+# Esri field type -> column kind, fields of other types are skipped
+FIELD_KINDS: dict[str, Kind] = {
+    'esriFieldTypeOID': 'int',
+    'esriFieldTypeSmallInteger': 'int',
+    'esriFieldTypeInteger': 'int',
+    'esriFieldTypeBigInteger': 'int',
+    'esriFieldTypeSingle': 'float',
+    'esriFieldTypeDouble': 'float',
+    'esriFieldTypeDate': 'date',
+    'esriFieldTypeString': 'str',
+    'esriFieldTypeGUID': 'str',
+    'esriFieldTypeGlobalID': 'str',
+}
+
+DTYPES = {'int': 'i8', 'float': 'f8', 'date': 'datetime64[ms]', 'str': 'U1'}
+NULL_VALUES = {'int': 0, 'float': float('nan'), 'date': 0, 'str': ''}
+
+def snapshot_key(layer_url: str, where: str = '1=1', out_fields: str | Sequence[str] = '*') -> str:
+    """Stable name for a layer query (field order and case don't matter)"""
+    fields = out_fields if isinstance(out_fields, str) else ','.join(sorted(field.lower() for field in out_fields))
+    query = json.dumps([layer_url.rstrip('/').lower(), where.strip(), fields])
+    return hashlib.sha1(query.encode()).hexdigest()[:16]
+
+def infer_kind(values: Sequence[Any]) -> Kind:
+    present = [value for value in values if value is not None]
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return 'int'
+    if all(isinstance(value, (int, float)) for value in present):
+        return 'float'
+    return 'str'
+
+def to_column(values: Sequence[Any], kind: Kind) -> Column:
+    """Convert attribute values (dates in epoch milliseconds) to a column and its null mask"""
+    nulls = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    if nulls.any():
+        fill = NULL_VALUES[kind]
+        values = [fill if value is None else value for value in values]
+    else:
+        nulls = None
+    if not len(values):
+        return np.zeros(0, dtype=DTYPES[kind]), None
+    match kind:
+        case 'int':
+            column = np.array(values, dtype='i8')
+        case 'float':
+            column = np.array(values, dtype='f8')
+        case 'date':
+            column = np.array(values, dtype='i8').astype('datetime64[ms]')
+            if nulls is not None:
+                column[nulls] = np.datetime64('NaT')
+        case _:
+            column = np.array([str(value) for value in values], dtype=str)
+    return column, nulls
+
+class Snapshot:
+    """A stored layer table, columns are read only memory maps"""
+
+    def __init__(self, path: Path, manifest: JSON, mmap: bool = True) -> None:
+        self.path = path
+        self.manifest = manifest
+        folder = path / manifest['generation']
+        # Empty arrays can't be memory mapped
+        mode = 'r' if mmap and manifest['rows'] else None
+        self.columns: dict[str, np.ndarray] = {
+            name: np.load(folder / f"{name}.npy", mmap_mode=mode) for name in manifest['columns']
+        }
+        self.nulls: dict[str, np.ndarray] = {
+            name: np.load(folder / f"{name}.nulls.npy", mmap_mode=mode)
+            for name, column in manifest['columns'].items() if column['nulls']
+        }
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self.columns)
+
+    @property
+    def object_id_field(self) -> str:
+        return self.manifest['object_id_field']
+
+    @property
+    def watermark(self) -> int | None:
+        """Newest edit date in the snapshot (epoch milliseconds), None without edit tracking"""
+        return self.manifest.get('watermark')
+
+    @property
+    def refreshed(self) -> datetime:
+        return datetime.fromtimestamp(self.manifest['refreshed'], timezone.utc)
+
+    def kind(self, name: str) -> Kind:
+        return self.manifest['columns'][name]['kind']
+
+    def is_null(self, name: str) -> np.ndarray:
+        if name in self.nulls:
+            return self.nulls[name]
+        return np.zeros(len(self), dtype=bool)
+
+    def __len__(self) -> int:
+        return self.manifest['rows']
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def rows(self, fields: Sequence[str] | None = None) -> Iterator[JSON]:
+        """Rows as attribute dictionaries like the service returns (None for nulls, dates in epoch milliseconds)"""
+        fields = list(fields or self.fields)
+        values = []
+        for name in fields:
+            column = self.columns[name]
+            column = (column.astype('i8') if self.kind(name) == 'date' else column).tolist()
+            if name in self.nulls:
+                column = [None if null else value for value, null in zip(column, self.nulls[name].tolist())]
+            values.append(column)
+        for row in zip(*values):
+            yield dict(zip(fields, row))
+
+    def to_frame(self, fields: Sequence[str] | None = None) -> DataFrame:
+        """The snapshot as a DataFrame, null values are NaN/NaT (integer columns with nulls become floats)"""
+        from pandas import DataFrame
+        fields = list(fields or self.fields)
+        frame = DataFrame({name: self.columns[name] for name in fields}, copy=False)
+        for name in fields:
+            if name in self.nulls:
+                frame[name] = frame[name].mask(self.nulls[name])
+        return frame
+
+    def __repr__(self) -> str:
+        return f"Snapshot({self.manifest['layer_url']!r}, where={self.manifest['where']!r}, rows={len(self)})"
+
+class SnapshotStore:
+    """A folder of snapshots, one sub folder per layer query"""
+
+    def __init__(self, root: str | Path = DEFAULT_ROOT) -> None:
+        self.root = Path(root)
+
+    def folder(self, layer_url: str, where: str = '1=1', out_fields: str | Sequence[str] = '*') -> Path:
+        return self.root / snapshot_key(layer_url, where, out_fields)
+
+    def load(self, layer_url: str, where: str = '1=1', out_fields: str | Sequence[str] = '*', *, mmap: bool = True) -> Snapshot | None:
+        """The stored snapshot of a layer query, None if it was never refreshed"""
+        folder = self.folder(layer_url, where, out_fields)
+        manifest = folder / 'manifest.json'
+        if not manifest.exists():
+            return None
+        return Snapshot(folder, json.loads(manifest.read_text(encoding='utf-8')), mmap)
+
+    def snapshots(self) -> list[JSON]:
+        """The manifests of every stored snapshot"""
+        return [
+            json.loads(manifest.read_text(encoding='utf-8'))
+            for manifest in sorted(self.root.glob('*/manifest.json'))
+        ]
+
+    def delete(self, layer_url: str, where: str = '1=1', out_fields: str | Sequence[str] = '*') -> bool:
+        folder = self.folder(layer_url, where, out_fields)
+        if not folder.exists():
+            return False
+        shutil.rmtree(folder, ignore_errors=True)
+        return True
+
+    def write(
+        self,
+        layer_url: str,
+        where: str,
+        out_fields: str | Sequence[str],
+        columns: dict[str, Column],
+        kinds: dict[str, Kind],
+        *,
+        object_id_field: str,
+        edit_field: str | None = None,
+        stats: JSON | None = None) -> Snapshot:
+        """Store columns as a new generation of the snapshot
+
+        The manifest is replaced last, so readers see either the old or the new generation.
+        Older generations are removed when nothing has them mapped (Windows keeps mapped
+        files locked, those are removed by a later write).
+        """
+        folder = self.folder(layer_url, where, out_fields)
+        generation = f"{time.time_ns():x}"
+        (folder / generation).mkdir(parents=True)
+        for name, (column, nulls) in columns.items():
+            np.save(folder / generation / f"{name}.npy", column)
+            if nulls is not None and nulls.any():
+                np.save(folder / generation / f"{name}.nulls.npy", nulls)
+
+        rows = len(columns[object_id_field][0])
+        watermark = None
+        if edit_field and edit_field in columns:
+            edits = columns[edit_field][0]
+            edits = edits[~np.isnat(edits)]
+            watermark = int(edits.max().astype('i8')) if len(edits) else None
+        manifest = {
+            'layer_url': layer_url,
+            'where': where,
+            'out_fields': out_fields,
+            'generation': generation,
+            'rows': rows,
+            'object_id_field': object_id_field,
+            'edit_field': edit_field,
+            'watermark': watermark,
+            'refreshed': time.time(),
+            'last_refresh': stats or {},
+            'columns': {
+                name: {'kind': kinds[name], 'dtype': str(column.dtype), 'nulls': nulls is not None and bool(nulls.any())}
+                for name, (column, nulls) in columns.items()
+            },
+        }
+        temporary = folder / 'manifest.json.tmp'
+        temporary.write_text(json.dumps(manifest, indent=1), encoding='utf-8')
+        os.replace(temporary, folder / 'manifest.json')
+
+        for old in folder.iterdir():
+            if old.is_dir() and old.name != generation:
+                shutil.rmtree(old, ignore_errors=True)
+        return Snapshot(folder, manifest)
+
+    def refresh(
+        self,
+        client: SyncFeatureServiceClient,
+        layer_url: str,
+        where: str = '1=1',
+        out_fields: str | Sequence[str] = '*',
+        *,
+        full: bool = False,
+        overlap: float = 1.0) -> Snapshot:
+        """Bring the snapshot of a layer query up to date and return it
+
+        With edit tracking only rows edited since the snapshot's watermark are downloaded
+        (the watermark is the service's own edit date, so client clock skew doesn't matter),
+        rows that were deleted or no longer match `where` are dropped. The object ID and
+        edit date fields are always stored.
+
+        Edits can be committed with an edit date a little older than rows that were already
+        read, so the delta query reaches `overlap` seconds back and downloads those rows again.
+
+        Args:
+            client: The client used for the service requests
+            layer_url: The layer to snapshot
+            where: Where clause of the rows to keep
+            out_fields: Fields to store ('*' is every supported field)
+            full: Download every row even if a delta refresh is possible
+            overlap: Seconds before the watermark included in the delta query
+        """
+        info = client.layer_info(layer_url)
+        object_id_field = info.get('objectIdField') or 'OBJECTID'
+        edit_field = (info.get('editFieldsInfo') or {}).get('editDateField')
+        layer_kinds = {field['name']: FIELD_KINDS.get(field.get('type', ''), None) for field in info.get('fields', [])}
+        names = _select_fields(layer_kinds, out_fields, object_id_field, edit_field)
+
+        previous = None if full else self.load(layer_url, where, out_fields)
+        if previous is not None and set(previous.fields) != set(names):
+            previous = None
+        kinds = {name: layer_kinds.get(name) or (previous.kind(name) if previous else None) for name in names}
+
+        if previous is None or not edit_field or previous.watermark is None:
+            features = client.query(layer_url, where, names)
+            columns, kinds = _columns(features, names, kinds)
+            stats = {'mode': 'full', 'downloaded': len(features)}
+            return self.write(layer_url, where, out_fields, columns, kinds, object_id_field=object_id_field, edit_field=edit_field, stats=stats)
+
+        since = datetime.fromtimestamp(previous.watermark / 1000 - overlap, timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        current = np.array(client.object_ids(layer_url, where), dtype='i8')
+        changed = client.query(layer_url, f"({where}) AND {edit_field} > TIMESTAMP '{since}'", names)
+        delta, kinds = _columns(changed, names, kinds)
+
+        oids = previous[object_id_field]
+        exists = np.isin(oids, current)
+        keep = exists & ~np.isin(oids, delta[object_id_field][0])
+        columns = {}
+        for name in names:
+            column, nulls = delta[name]
+            nulls = np.zeros(len(column), dtype=bool) if nulls is None else nulls
+            columns[name] = (
+                np.concatenate([previous[name][keep], column]),
+                np.concatenate([previous.is_null(name)[keep], nulls]),
+            )
+        order = np.argsort(columns[object_id_field][0], kind='stable')
+        columns = {name: (column[order], nulls[order]) for name, (column, nulls) in columns.items()}
+        stats = {'mode': 'delta', 'downloaded': len(changed), 'deleted': int((~exists).sum()), 'since': since}
+        return self.write(layer_url, where, out_fields, columns, kinds, object_id_field=object_id_field, edit_field=edit_field, stats=stats)
+
+def _select_fields(layer_kinds: dict[str, Kind | None], out_fields: str | Sequence[str], object_id_field: str, edit_field: str | None) -> list[str]:
+    """Layer field names for `out_fields` (matched without case), unsupported types are dropped"""
+    by_lower = {name.lower(): name for name in layer_kinds}
+    if isinstance(out_fields, str):
+        out_fields = list(layer_kinds) if out_fields == '*' else out_fields.split(',')
+    names = [object_id_field]
+    for field in [*out_fields, edit_field]:
+        name = by_lower.get(field.strip().lower(), field.strip()) if field else None
+        if name and name not in names and layer_kinds.get(name, 'str') is not None:
+            names.append(name)
+    return names
+
+def _columns(features: list[JSON], names: list[str], kinds: dict[str, Kind | None]) -> tuple[dict[str, Column], dict[str, Kind]]:
+    columns = {}
+    resolved = {}
+    for name in names:
+        values = [feature['attributes'].get(name) for feature in features]
+        resolved[name] = kinds.get(name) or infer_kind(values)
+        columns[name] = to_column(values, resolved[name])
+    return columns, resolved
+
+if __name__ == '__main__':
+    import tempfile
+
+    from feature_service import StandInFeatureServer, SyncFeatureServiceClient
+
+    FEATURES = 50_000
+
+    with tempfile.TemporaryDirectory() as root, \
+         StandInFeatureServer(FEATURES, latency=0.02, max_record_count=2000) as server, \
+         SyncFeatureServiceClient(per_host=8, max_connections=8) as client:
+        store = SnapshotStore(root)
+        fields = ['NAME', 'VALUE']
+
+        def timed(label: str, func, *args, **kwargs):
+            requests = client.client.requests
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            print(f"{label}: {time.perf_counter() - start:.3f} seconds, {client.client.requests - requests} requests")
+            return result
+
+        snapshot = timed("Full refresh", store.refresh, client, server.layer_url, '1=1', fields)
+        assert len(snapshot) == FEATURES
+
+        # Edit the service: updates, deletes and adds
+        client.apply_edits(
+            server.layer_url,
+            updates=[{'attributes': {'OBJECTID': oid, 'VALUE': -1, 'NAME': None}} for oid in range(1, FEATURES, 250)],
+            deletes=list(range(5, 500, 10)),
+            adds=[{'attributes': {'NAME': f"New {i}", 'VALUE': 1000 + i}} for i in range(20)],
+        )
+
+        snapshot = timed("Delta refresh", store.refresh, client, server.layer_url, '1=1', fields)
+        print(f"  {snapshot.manifest['last_refresh']}")
+
+        expected = {feature['attributes']['OBJECTID']: feature['attributes'] for feature in client.query(server.layer_url, '1=1', snapshot.fields)}
+        assert {row['OBJECTID']: row for row in snapshot.rows()} == expected
+        print(f"  {len(snapshot):,} rows match a full download")
+
+        loaded = timed("Load from disk", store.load, server.layer_url, '1=1', fields)
+        start = time.perf_counter()
+        values, counts = np.unique(loaded['VALUE'], return_counts=True)
+        print(f"Count by VALUE from the snapshot: {time.perf_counter() - start:.4f} seconds, {len(values)} values")
+        assert isinstance(loaded['VALUE'], np.memmap)
+        print(loaded.to_frame().head())
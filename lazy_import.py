@@ -0,0 +1,52 @@
+"""Import heavy modules on first use
+
+Importing arcpy takes seconds, so short lived workers that only need part of a snippet
+pay for it up front. `lazy_import` returns a placeholder module that imports the real
+one the first time an attribute is read, keeping snippet imports free of side effects.
+
+Usage:
+    >>> from typing import TYPE_CHECKING
+    >>> from lazy_import import lazy_import
+    >>> if TYPE_CHECKING:
+    ...     import arcpy
+    ... else:
+    ...     arcpy = lazy_import('arcpy')
+    >>> arcpy.da.SearchCursor(...) # arcpy is imported here
+"""
+
+from __future__ import annotations
+
+import sys
+from importlib import import_module
+from types import ModuleType
+from typing import Any
+
+class LazyModule(ModuleType):
+    """Placeholder that imports `__name__` on first attribute access
+
+    Attributes are cached on the placeholder once read, so later reads cost a normal
+    module attribute lookup. Submodules the package doesn't import itself (e.g. arcpy._mp)
+    are imported when they are accessed.
+    """
+
+    def __getattr__(self, attr: str) -> Any:
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        module = import_module(self.__name__)
+        try:
+            value = getattr(module, attr)
+        except AttributeError:
+            try:
+                value = import_module(f"{self.__name__}.{attr}")
+            except ModuleNotFoundError:
+                raise AttributeError(f"module {self.__name__!r} has no attribute {attr!r}") from None
+        setattr(self, attr, value)
+        return value
+
+    @property
+    def loaded(self) -> bool:
+        return self.__name__ in sys.modules
+
+def lazy_import(name: str) -> ModuleType:
+    """The module if it is already imported, otherwise a `LazyModule` placeholder for it"""
+    return sys.modules.get(name) or LazyModule(name)
@@ -0,0 +1,281 @@
+"""Buffered message sink for stdout and the geoprocessing message channel
+
+Calling `print` and `arcpy.AddMessage` for every field or row is slow, the
+messaging calls can take more time than the work being logged. `MessageSink`
+queues messages in a ring buffer and writes them out in batches (one write and
+one `AddMessage` per run of same level messages). Formatting is deferred until
+the flush, and messages below the sink level or skipped by sampling cost one
+comparison.
+
+Usage:
+    >>> from message_sink import log
+    >>> log.info("Field %s for %s is now hidden", name, layer.name)
+    >>> for i, row in enumerate(cursor):
+    ...     log.debug("Processed row %s", i, every=10_000) # Only every 10,000th call is kept
+    >>> log.flush()
+
+    Sinks still alive at exit are flushed. Close a sink (or use it as a context
+    manager) before dropping it, messages left in a collected sink are lost.
+
+    Flush on a background thread every half second:
+
+    >>> with MessageSink(interval=0.5) as sink:
+    ...     sink.warning("Skipping %s", oid)
+
+    >>> sink.stats()
+    {'emitted': 1, 'dropped': 0, 'sampled': 0, 'filtered': 0}
+"""
+
+from __future__ import annotations
+
+import atexit
+import sys
+from collections import deque
+from threading import Event, Lock, Thread
+from types import ModuleType
+from typing import Any, TextIO
+from weakref import WeakSet
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+_GP_FUNCTIONS = {DEBUG: 'AddMessage', INFO: 'AddMessage', WARNING: 'AddWarning', ERROR: 'AddError'}
+
+# Live sinks are flushed by one exit handler, a sink that is garbage collected drops out
+_sinks: WeakSet[MessageSink] = WeakSet()
+
+@atexit.register
+def _flush_all() -> None:
+    for sink in list(_sinks):
+        sink.flush()
+
+class MessageSink:
+    def __init__(
+        self,
+        level: int = INFO,
+        *,
+        capacity: int = 100_000,
+        batch_size: int = 1_000,
+        interval: float | None = None,
+        stream: TextIO | None = sys.stdout,
+        gp: ModuleType | Any | None = None) -> None:
+        """
+        Args:
+            level: Messages below this level are ignored
+            capacity: Size of the ring buffer, the oldest messages are dropped when it is full
+            batch_size: Flush once this many messages are buffered (unless a flush thread is running)
+            interval: Seconds between flushes on a background thread (None flushes inline)
+            stream: Text stream to echo messages to (None disables echo)
+            gp: Object providing AddMessage/AddWarning/AddError (default is arcpy if it is installed)
+        """
+        self.level = level
+        self.batch_size = batch_size
+        self.stream = stream
+        self._gp = gp
+        self._buffer: deque[tuple[int, str, tuple]] = deque(maxlen=capacity)
+        self._samples: dict[str, int] = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Thread | None = None
+
+        self.emitted = 0
+        self.dropped = 0
+        self.sampled = 0
+        self.filtered = 0
+
+        _sinks.add(self)
+        if interval is not None:
+            self.start(interval)
+
+    def log(self, level: int, message: str, *args: object, every: int = 1) -> None:
+        """Queue a message, `args` are %-formatted into the message when it is flushed
+
+        Args:
+            every: Keep only every Nth call with this message (counted per message string)
+        """
+        if level < self.level:
+            self.filtered += 1
+            return
+        self._queue(level, message, args, every)
+
+    def _queue(self, level: int, message: str, args: tuple, every: int) -> None:
+        if every > 1:
+            count = self._samples.get(message, 0)
+            self._samples[message] = count + 1
+            if count % every:
+                self.sampled += 1
+                return
+
+        buffer = self._buffer
+        if len(buffer) == buffer.maxlen:
+            self.dropped += 1
+        buffer.append((level, message, args))
+
+        if self._thread is None and len(buffer) >= self.batch_size:
+            self.flush()
+
+    # The level methods check the level themselves to keep ignored calls cheap
+    def debug(self, message: str, *args: object, every: int = 1) -> None:
+        if DEBUG < self.level:
+            self.filtered += 1
+            return
+        self._queue(DEBUG, message, args, every)
+
+    def info(self, message: str, *args: object, every: int = 1) -> None:
+        if INFO < self.level:
+            self.filtered += 1
+            return
+        self._queue(INFO, message, args, every)
+
+    def warning(self, message: str, *args: object, every: int = 1) -> None:
+        if WARNING < self.level:
+            self.filtered += 1
+            return
+        self._queue(WARNING, message, args, every)
+
+    def error(self, message: str, *args: object, every: int = 1) -> None:
+        self._queue(ERROR, message, args, every)
+
+    def _get_gp(self) -> Any | None:
+        if self._gp is None:
+            try:
+                import arcpy
+                self._gp = arcpy
+            except ImportError:
+                self._gp = False
+        return self._gp or None
+
+    def flush(self) -> None:
+        """Write all buffered messages, one write per run of messages with the same level"""
+        with self._lock:
+            buffer = self._buffer
+            pending = [buffer.popleft() for _ in range(len(buffer))]
+        if not pending:
+            return
+
+        gp = self._get_gp()
+        lines: list[str] = []
+        batch: list[str] = []
+        batch_level = pending[0][0]
+        for level, message, args in pending:
+            if level != batch_level:
+                if gp:
+                    getattr(gp, _GP_FUNCTIONS[batch_level])('\n'.join(batch))
+                batch = []
+                batch_level = level
+            text = message % args if args else message
+            batch.append(text)
+            lines.append(text)
+        if gp:
+            getattr(gp, _GP_FUNCTIONS[batch_level])('\n'.join(batch))
+
+        if self.stream is not None:
+            self.stream.write('\n'.join(lines) + '\n')
+        self.emitted += len(pending)
+
+    def start(self, interval: float = 0.5) -> None:
+        """Flush on a background thread every `interval` seconds"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the background thread, flush what is left and stop flushing at exit"""
+        self.stop()
+        _sinks.discard(self)
+
+    def stop(self) -> None:
+        """Stop the background thread and flush what is left"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'emitted': self.emitted,
+            'dropped': self.dropped,
+            'sampled': self.sampled,
+            'filtered': self.filtered,
+        }
+
+    def __enter__(self) -> MessageSink:
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+# Shared sink for the snippets
+log = MessageSink()
+
+if __name__ == '__main__':
+    from io import StringIO
+    from time import perf_counter
+    from types import SimpleNamespace
+
+    CALLS = 1_000_000
+
+    # Stand in for arcpy that counts calls
+    gp_calls = 0
+    def add_message(message: str) -> None:
+        global gp_calls
+        gp_calls += 1
+    gp = SimpleNamespace(AddMessage=add_message, AddWarning=add_message, AddError=add_message)
+
+    stats: list[dict[str, int]] = []
+    def bench(name: str, func) -> None:
+        global gp_calls
+        gp_calls = 0
+        start = perf_counter()
+        func()
+        elapsed = perf_counter() - start
+        print(f"{name:<25} {elapsed:.3f} seconds ({elapsed / CALLS * 1e9:.0f} ns/call, {gp_calls} gp calls)")
+        if stats:
+            print(f"{'':<25} {stats.pop()}")
+
+    def bare():
+        for i in range(CALLS):
+            pass
+
+    def direct():
+        stream = StringIO()
+        for i in range(CALLS):
+            message = f"Processed row {i}"
+            print(message, file=stream)
+            add_message(message)
+
+    def sink(every: int = 1, **kwargs):
+        def run():
+            with MessageSink(stream=StringIO(), gp=gp, **kwargs) as sink:
+                for i in range(CALLS):
+                    sink.info("Processed row %s", i, every=every)
+            stats.append(sink.stats())
+        return run
+
+    bench('bare loop', bare)
+    bench('print + AddMessage', direct)
+    bench('sink (inline flush)', sink())
+    bench('sink (thread flush)', sink(interval=0.1, capacity=1_000_000))
+    bench('sink (every 1000th)', sink(every=1000))
+    bench('sink (filtered level)', sink(level=WARNING))
+
+    # Short lived sinks don't stay alive until exit, closed sinks leave the exit flush
+    import gc
+    gp_calls = 0
+    for _ in range(1_000):
+        with MessageSink(stream=StringIO(), gp=gp) as short_lived:
+            short_lived.info("Short lived")
+    del short_lived
+    gc.collect()
+    assert len(_sinks) == 1, len(_sinks)
+    assert gp_calls == 1_000, "closed sinks flush their messages"
+    print(f"{len(_sinks)} live sink after 1,000 short lived sinks")
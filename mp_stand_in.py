@@ -0,0 +1,73 @@
+"""A stand-in for the parts of arcpy.mp that snippets use, for running them without ArcGIS
+
+A project is a JSON file of maps and layers. Layers have a name, a long name (with the
+group layers above them) and the visibility of their fields. `getDefinition` returns a
+copy, changes only apply after `setDefinition` and are only written by `save`, like
+arcpy.mp. Pass the module (or its name, for worker processes) as `mp` to snippets that
+take one.
+
+Usage:
+    >>> write_project('test.aprx.json', {'Map': [layer('Roads', ['NAME', 'TYPE'], group='Transport')]})
+    >>> update_field_visibility('test.aprx.json', 'Map', visible_fields=['NAME'], mp='mp_stand_in')
+    {'Transport\\\\Roads': (1, 0)}
+"""
+
+from __future__ import annotations
+
+import json
+from copy import deepcopy
+from fnmatch import fnmatch
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterable
+
+def layer(name: str, fields: Iterable[str], *, group: str = '', visible: bool = True, feature_layer: bool = True) -> dict:
+    """The JSON of a layer with every field visible (or hidden)"""
+    return {
+        'name': name,
+        'longName': f"{group}\\{name}" if group else name,
+        'isFeatureLayer': feature_layer,
+        'fields': [{'fieldName': field, 'alias': field.title(), 'visible': visible} for field in fields],
+    }
+
+def write_project(path: str | Path, maps: dict[str, list[dict]]) -> None:
+    Path(path).write_text(json.dumps({'maps': [{'name': name, 'layers': layers} for name, layers in maps.items()]}))
+
+def read_project(path: str | Path) -> dict[str, list[dict]]:
+    return {m['name']: m['layers'] for m in json.loads(Path(path).read_text())['maps']}
+
+class Layer:
+    def __init__(self, data: dict) -> None:
+        self._data = data
+        self.name = data['name']
+        self.longName = data['longName']
+        self.isFeatureLayer = data['isFeatureLayer']
+
+    def getDefinition(self, version: str) -> Any:
+        fields = [SimpleNamespace(**field) for field in deepcopy(self._data['fields'])]
+        return SimpleNamespace(name=self.name, featureTable=SimpleNamespace(fieldDescriptions=fields))
+
+    def setDefinition(self, definition: Any) -> None:
+        self._data['fields'] = [vars(field) for field in definition.featureTable.fieldDescriptions]
+
+class Map:
+    def __init__(self, data: dict) -> None:
+        self.name = data['name']
+        self._layers = [Layer(layer) for layer in data['layers']]
+
+    def listLayers(self, wildcard: str | None = None) -> list[Layer]:
+        return [layer for layer in self._layers if wildcard is None or fnmatch(layer.name, wildcard)]
+
+class ArcGISProject:
+    def __init__(self, path: str | Path) -> None:
+        self.filePath = str(path)
+        self._data = json.loads(Path(path).read_text())
+        self._maps = [Map(data) for data in self._data['maps']]
+        self.saves = 0
+
+    def listMaps(self, wildcard: str | None = None) -> list[Map]:
+        return [m for m in self._maps if wildcard is None or fnmatch(m.name, wildcard)]
+
+    def save(self) -> None:
+        Path(self.filePath).write_text(json.dumps(self._data))
+        self.saves += 1
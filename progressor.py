@@ -1,32 +1,137 @@
-from dataclasses import dataclass
-from arcpy import SetProgressor, SetProgressorLabel, SetProgressorPosition, ResetProgressor
-from typing import Literal
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import timedelta
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Any, Iterable, Iterator, Literal
+
+_gp: Any = None
+
+def _arcpy() -> Any:
+    """arcpy, imported on first use
+
+    Outside ArcGIS (e.g. the benchmark below) a stand-in whose progress calls do nothing
+    is returned instead.
+    """
+    global _gp
+    if _gp is None:
+        try:
+            import arcpy as _gp
+        except ImportError:
+            def noop(*args) -> None: ...
+            _gp = SimpleNamespace(
+                SetProgressor=noop, SetProgressorLabel=noop, SetProgressorPosition=noop, ResetProgressor=noop,
+            )
+    return _gp
 
 @dataclass(slots=True)
 class Progressor:
-    label: str
-    style: Literal['default', 'step'] = 'step'
-    range: range
-    
+    """Wrap an iterable and report progress to the geoprocessing progressor
+
+    The position and label are updated at most every `interval` seconds or every
+    `percent` percent, between updates each item costs an increment and a compare.
+
+    Usage:
+        >>> for row in Progressor(SearchCursor(fc, fields), 'Reading rows', total=count):
+        ...     ...
+        Reading rows 120,000/1,000,000 (52,310 rows/s, ETA 0:00:16)
+    """
+    iterable: Iterable[Any]
+    label: str = 'Processing'
+    total: int | None = None
+    interval: float = 0.25
+    percent: float = 1.0
+    style: Literal['default', 'step'] = field(init=False, default='step')
+    position: int = field(init=False, default=0)
+    _start: float = field(init=False, default=0.0)
+    _last: float = field(init=False, default=0.0)
+    _last_percent: int = field(init=False, default=-1)
+
     def __post_init__(self):
-        self._position: int = 0
+        if self.total is None:
+            try:
+                self.total = len(self.iterable)
+            except TypeError:
+                pass
+        # Without a total there is no position, only the label changes
+        self.style = 'step' if self.total else 'default'
 
-    def __enter__(self):
-        SetProgressor(self.style, self.label, self.range.start, self.range.stop, self.range.step)
+    def __enter__(self) -> Progressor:
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        ResetProgressor()
-
-    def __iter__(self):
-        return self
+        _arcpy().ResetProgressor()
 
     def __call__(self, label: str):
-        SetProgressorLabel(label)
-    
-    def __next__(self):
-        SetProgressorPosition()
-        self._position += 1
-        if self._position > self.range.stop: # inclusive range
-            raise StopIteration
-        yield self._position
\ No newline at end of file
+        self.label = label
+        _arcpy().SetProgressorLabel(label)
+
+    def __iter__(self) -> Iterator[Any]:
+        gp = _arcpy()
+        gp.SetProgressor(self.style, self.label, 0, 100, 1)
+        self._start = self._last = perf_counter()
+        position = 0
+        next_check = 1
+        try:
+            for item in self.iterable:
+                yield item
+                position += 1
+                if position >= next_check:
+                    next_check = self._update(position)
+        finally:
+            self.position = position
+            self._update(position, force=True)
+            gp.ResetProgressor()
+
+    def _update(self, position: int, force: bool = False) -> int:
+        """Update the progressor if it is due, returns the position of the next check"""
+        now = perf_counter()
+        elapsed = now - self._start
+        rate = position / elapsed if elapsed > 0 else 0.0
+        percent = int(position * 100 / self.total) if self.total else 0
+
+        if force or now - self._last >= self.interval or percent - self._last_percent >= self.percent:
+            self._last = now
+            self._last_percent = percent
+            label = f"{self.label} {position:,}"
+            if self.total:
+                label += f"/{self.total:,}"
+                _arcpy().SetProgressorPosition(min(percent, 100))
+            label += f" ({rate:,.0f} rows/s"
+            if self.total and rate:
+                label += f", ETA {timedelta(seconds=round((self.total - position) / rate))}"
+            _arcpy().SetProgressorLabel(label + ")")
+
+        # Skip the clock until about a tenth of an interval (or a percent) of items has passed
+        step = max(1, int(rate * self.interval / 10))
+        if self.total:
+            step = min(step, max(1, int(self.total * self.percent / 100)))
+        return position + step
+
+if __name__ == '__main__':
+    ITEMS = 10_000_000
+
+    def bare():
+        for _ in range(ITEMS):
+            pass
+
+    def per_step():
+        # The old behaviour, a progressor call for every item
+        gp = _arcpy()
+        for _ in range(ITEMS):
+            gp.SetProgressorPosition()
+
+    def throttled():
+        for _ in Progressor(range(ITEMS), 'Benchmark'):
+            pass
+
+    results = {}
+    for name, func in (('bare loop', bare), ('position per item', per_step), ('Progressor', throttled)):
+        start = perf_counter()
+        func()
+        results[name] = perf_counter() - start
+        print(f"{name:<20} {results[name]:.3f} seconds ({results[name] / ITEMS * 1e9:.1f} ns/item)")
+
+    overhead = (results['Progressor'] - results['bare loop']) / ITEMS * 1e9
+    print(f"Progressor overhead: {overhead:.1f} ns/item (position per item calls a no-op stand-in outside ArcGIS)")
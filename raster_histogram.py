@@ -0,0 +1,444 @@
+"""Streaming, mergeable histograms for rasters too large to load at once
+
+Rasters are read in tiles through a reader (`NpyTileReader` for memory mapped
+`.npy` files, `GdalTileReader` for GeoTIFF and `ArcpyTileReader` for anything arcpy
+can open). Each tile is binned into a histogram and the tile histograms are merged,
+so tiles can be processed in parallel and only one tile per worker is in memory.
+
+- `FixedHistogram` bins a known value range into equal bins
+- `AdaptiveHistogram` needs no range, its bins are log scaled with a fixed relative
+  accuracy (like DDSketch) so long tailed data stays accurate in the bulk
+
+Both track exact count, min, max, mean and std, and can give approximate quantiles
+and class breaks (see `raster_sym.data_breaks`).
+
+Usage:
+    >>> hist = compute_histogram(NpyTileReader('dem_change.npy'), workers=8)
+    >>> hist.quantile([0.05, 0.5, 0.95])
+    array([-3.1, 0.02, 2.9])
+"""
+
+from __future__ import annotations
+
+from functools import partial
+from math import ceil, floor, log
+from os import PathLike
+from typing import Any, Iterator, Protocol
+
+import numpy as np
+
+Window = tuple[int, int, int, int] # row, col, nrows, ncols
+
+class TileReader(Protocol):
+    shape: tuple[int, int]
+
+    def read(self, window: Window) -> np.ndarray:
+        """Read a window as float values with NoData as NaN"""
+        ...
+
+def iter_windows(shape: tuple[int, int], tile: int = 2048) -> Iterator[Window]:
+    rows, cols = shape
+    for row in range(0, rows, tile):
+        for col in range(0, cols, tile):
+            yield row, col, min(tile, rows - row), min(tile, cols - col)
+
+def _mask_nodata(block: np.ndarray, nodata: float | None) -> np.ndarray:
+    block = block.astype('f8')
+    if nodata is not None:
+        block[block == nodata] = np.nan
+    return block
+
+class NpyTileReader:
+    """Reads tiles from a memory mapped 2D `.npy` file (the file is opened once per process)"""
+    def __init__(self, path: str, nodata: float | None = None):
+        self.path = path
+        self.nodata = nodata
+        self._array: np.ndarray | None = None
+
+    @property
+    def array(self) -> np.ndarray:
+        if self._array is None:
+            self._array = np.load(self.path, mmap_mode='r')
+        return self._array
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.array.shape[:2]
+
+    def read(self, window: Window) -> np.ndarray:
+        row, col, nrows, ncols = window
+        return _mask_nodata(self.array[row:row+nrows, col:col+ncols], self.nodata)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Memory maps are reopened in worker processes instead of pickled
+        return {**self.__dict__, '_array': None}
+
+class GdalTileReader:
+    """Reads tiles from the first band of a GeoTIFF (or any GDAL raster)"""
+    def __init__(self, path: str, band: int = 1):
+        self.path = path
+        self.band = band
+        self._dataset = None
+
+    @property
+    def dataset(self):
+        if self._dataset is None:
+            from osgeo import gdal
+            self._dataset = gdal.Open(self.path)
+        return self._dataset
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.dataset.RasterYSize, self.dataset.RasterXSize
+
+    def read(self, window: Window) -> np.ndarray:
+        row, col, nrows, ncols = window
+        band = self.dataset.GetRasterBand(self.band)
+        return _mask_nodata(band.ReadAsArray(col, row, ncols, nrows), band.GetNoDataValue())
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {**self.__dict__, '_dataset': None}
+
+class ArcpyTileReader:
+    """Reads tiles with `arcpy.RasterToNumPyArray` from a raster path or an open `arcpy.Raster`"""
+    def __init__(self, raster: str | Any):
+        self.path = str(raster)
+        self._raster = None if isinstance(raster, str | PathLike) else raster
+
+    @property
+    def raster(self):
+        if self._raster is None:
+            import arcpy
+            self._raster = arcpy.Raster(self.path)
+        return self._raster
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.raster.height, self.raster.width
+
+    def read(self, window: Window) -> np.ndarray:
+        import arcpy
+        row, col, nrows, ncols = window
+        raster = self.raster
+        # RasterToNumPyArray blocks are anchored at their lower left corner
+        corner = arcpy.Point(
+            raster.extent.XMin + col * raster.meanCellWidth,
+            raster.extent.YMax - (row + nrows) * raster.meanCellHeight,
+        )
+        return _mask_nodata(arcpy.RasterToNumPyArray(raster, corner, ncols, nrows), raster.noDataValue)
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {**self.__dict__, '_raster': None}
+
+class Histogram:
+    """Shared statistics, subclasses provide `edges` and `counts`"""
+    def __init__(self) -> None:
+        self.count = 0
+        self.nodata = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def _update_stats(self, values: np.ndarray) -> np.ndarray:
+        """Update the exact statistics and return the valid values"""
+        values = np.asarray(values, dtype='f8').ravel()
+        valid = values[np.isfinite(values)]
+        self.nodata += len(values) - len(valid)
+        if len(valid):
+            self.count += len(valid)
+            self.total += float(valid.sum())
+            self.total_sq += float(np.dot(valid, valid))
+            self.minimum = min(self.minimum, float(valid.min()))
+            self.maximum = max(self.maximum, float(valid.max()))
+        return valid
+
+    def _merge_stats(self, other: Histogram) -> None:
+        self.count += other.count
+        self.nodata += other.nodata
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count
+
+    @property
+    def std(self) -> float:
+        return max(self.total_sq / self.count - self.mean**2, 0.0) ** 0.5
+
+    def bins(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Left edges, right edges and counts of the bins in value order"""
+        raise NotImplementedError
+
+    def quantile(self, q: float | list[float] | np.ndarray) -> np.ndarray:
+        """Approximate quantiles, values are interpolated linearly within a bin"""
+        lefts, rights, counts = self.bins()
+        # The outer bins only hold values between the exact min and max
+        lefts = np.clip(lefts, self.minimum, self.maximum)
+        rights = np.clip(rights, self.minimum, self.maximum)
+        cumulative = np.cumsum(counts) / self.count
+        xp = np.column_stack([cumulative - counts / self.count, cumulative]).ravel()
+        fp = np.column_stack([lefts, rights]).ravel()
+        return np.interp(q, xp, fp)
+
+class FixedHistogram(Histogram):
+    """Equal width bins over [low, high], values outside are clipped into the end bins"""
+    def __init__(self, low: float, high: float, bins: int = 1024):
+        super().__init__()
+        self.low = float(low)
+        self.high = float(high)
+        self._counts = np.zeros(bins, dtype='i8')
+
+    def update(self, values: np.ndarray) -> FixedHistogram:
+        valid = self._update_stats(values)
+        bins = len(self._counts)
+        scale = bins / (self.high - self.low) if self.high > self.low else 0.0
+        index = np.clip(((valid - self.low) * scale).astype('i8'), 0, bins - 1)
+        self._counts += np.bincount(index, minlength=bins)
+        return self
+
+    def merge(self, other: FixedHistogram) -> FixedHistogram:
+        if (other.low, other.high, len(other._counts)) != (self.low, self.high, len(self._counts)):
+            raise ValueError("Fixed histograms must share bins to merge")
+        self._merge_stats(other)
+        self._counts += other._counts
+        return self
+
+    def bins(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        edges = np.linspace(self.low, self.high, len(self._counts) + 1)
+        return edges[:-1], edges[1:], self._counts
+
+class AdaptiveHistogram(Histogram):
+    """Log scaled bins, each bin spans values within `accuracy` (relative) of its center
+
+    Bin `k` holds `gamma**(k-1) < |x| <= gamma**k`, so no value range is needed and long
+    tails cost a few bins instead of the resolution of the bulk of the data. When there
+    are more than `max_bins` bins the smallest magnitude bins are folded into the zero
+    bin. Bins only depend on `accuracy`, so any two adaptive histograms merge exactly.
+    """
+    def __init__(self, accuracy: float = 0.005, max_bins: int = 4096, min_value: float = 1e-9):
+        super().__init__()
+        self.accuracy = accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.zero_key = floor(log(min_value) / log(self.gamma)) # Values with |x| <= gamma**zero_key
+        self.zero_count = 0
+        self._positive = (np.zeros(0, dtype='i8'), np.zeros(0, dtype='i8'))
+        self._negative = (np.zeros(0, dtype='i8'), np.zeros(0, dtype='i8'))
+
+    @staticmethod
+    def _add_store(store: tuple[np.ndarray, np.ndarray], keys: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        keys, inverse = np.unique(np.concatenate([store[0], keys]), return_inverse=True)
+        return keys, np.bincount(inverse, weights=np.concatenate([store[1], counts])).astype('i8')
+
+    @staticmethod
+    def _count_keys(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Unique keys and counts, keys span a few thousand values so bincount beats sorting"""
+        if not len(keys):
+            return keys.astype('i8'), np.zeros(0, dtype='i8')
+        keys = keys.astype('i8')
+        low = keys.min()
+        counts = np.bincount(keys - low)
+        occupied = np.flatnonzero(counts)
+        return occupied + low, counts[occupied]
+
+    def _collapse(self) -> None:
+        """Fold bins at or below `zero_key` into the zero bin, raising it until there are `max_bins` bins"""
+        excess = len(self._positive[0]) + len(self._negative[0]) - self.max_bins
+        if excess > 0:
+            keys = np.sort(np.concatenate([self._positive[0], self._negative[0]]))
+            self.zero_key = max(self.zero_key, int(keys[excess - 1]))
+        for name in ('_positive', '_negative'):
+            keys, counts = getattr(self, name)
+            folded = keys <= self.zero_key
+            if folded.any():
+                self.zero_count += int(counts[folded].sum())
+                setattr(self, name, (keys[~folded], counts[~folded]))
+
+    def update(self, values: np.ndarray) -> AdaptiveHistogram:
+        valid = self._update_stats(values)
+        magnitude = np.abs(valid)
+        with np.errstate(divide='ignore'):
+            keys = np.ceil(np.log(magnitude) / log(self.gamma))
+        zero = (magnitude == 0) | (keys <= self.zero_key)
+        self.zero_count += int(zero.sum())
+        positive = ~zero & (valid > 0)
+        negative = ~zero & (valid < 0)
+        self._positive = self._add_store(self._positive, *self._count_keys(keys[positive]))
+        self._negative = self._add_store(self._negative, *self._count_keys(keys[negative]))
+        self._collapse()
+        return self
+
+    def merge(self, other: AdaptiveHistogram) -> AdaptiveHistogram:
+        if other.gamma != self.gamma:
+            raise ValueError("Adaptive histograms must share accuracy to merge")
+        self._merge_stats(other)
+        self.zero_key = max(self.zero_key, other.zero_key)
+        self.zero_count += other.zero_count
+        self._positive = self._add_store(self._positive, *other._positive)
+        self._negative = self._add_store(self._negative, *other._negative)
+        self._collapse()
+        return self
+
+    def bins(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        negative_keys, negative_counts = self._negative[0][::-1], self._negative[1][::-1]
+        positive_keys, positive_counts = self._positive
+        zero = self.gamma ** self.zero_key
+        lefts = np.concatenate([-self.gamma ** negative_keys, [-zero], self.gamma ** (positive_keys - 1)])
+        rights = np.concatenate([-self.gamma ** (negative_keys - 1), [zero], self.gamma ** positive_keys])
+        counts = np.concatenate([negative_counts, [self.zero_count], positive_counts])
+        return lefts, rights, counts
+
+def jenks_breaks(centers: np.ndarray, weights: np.ndarray, uppers: np.ndarray, classes: int) -> list[float]:
+    """Fisher-Jenks natural breaks over weighted bins, returns the upper edge of each class"""
+    keep = weights > 0
+    centers, weights, uppers = centers[keep], weights[keep].astype('f8'), uppers[keep]
+    n = len(weights)
+    classes = min(classes, n)
+
+    # Prefix sums give the within class squared deviation of bins i..j in O(1)
+    w = np.concatenate([[0], np.cumsum(weights)])
+    s1 = np.concatenate([[0], np.cumsum(weights * centers)])
+    s2 = np.concatenate([[0], np.cumsum(weights * centers**2)])
+    def cost(i: np.ndarray, j: int) -> np.ndarray:
+        return (s2[j+1] - s2[i]) - (s1[j+1] - s1[i])**2 / (w[j+1] - w[i])
+
+    error = s2[1:] - s1[1:]**2 / w[1:]
+    starts = [np.zeros(n, dtype=int)]
+    for _ in range(1, classes):
+        next_error = np.full(n, np.inf)
+        next_start = np.zeros(n, dtype=int)
+        for j in range(1, n):
+            # Last class covers bins i..j, the previous classes cover 0..i-1
+            i = np.arange(1, j+1)
+            total = error[i-1] + cost(i, j)
+            best = int(np.argmin(total))
+            next_error[j], next_start[j] = total[best], i[best]
+        error = next_error
+        starts.append(next_start)
+
+    # Walk the class starts back from the last bin
+    breaks, j = [], n - 1
+    for start in reversed(starts):
+        breaks.append(float(uppers[j]))
+        j = start[j] - 1
+    return sorted(breaks)
+
+def summary_breaks(stats: Any, method: str, classes: int) -> np.ndarray | None:
+    """Breaks that only need the exact statistics (`minimum`, `maximum`, `mean`, `std`)
+
+    Returns:
+        The breaks for 'equal_interval' and 'std_dev', None for the other methods
+    """
+    if method == 'equal_interval':
+        return np.linspace(stats.minimum, stats.maximum, classes + 1)[1:]
+    if method == 'std_dev':
+        # One standard deviation wide classes centered on the mean
+        offsets = np.arange(classes) - (classes - 1) / 2
+        return stats.mean + (offsets + 0.5) * stats.std
+    return None
+
+def clip_breaks(breaks: Any, minimum: float, maximum: float) -> list[float]:
+    """Sorted unique breaks within the data range, the last bound is the exact maximum"""
+    breaks = np.unique(np.clip(breaks, minimum, maximum))
+    breaks[-1] = maximum
+    return breaks.tolist()
+
+def histogram_breaks(hist: Histogram, method: str = 'quantile', classes: int = 5, max_bins: int = 512) -> list[float]:
+    """Upper bounds of each class from a histogram, the last bound is the exact maximum"""
+    if not hist.count:
+        raise ValueError("No valid raster values to classify")
+
+    if method == 'quantile':
+        breaks = hist.quantile(np.linspace(0, 1, classes + 1)[1:])
+    elif method == 'jenks':
+        # Merge neighbouring bins so the O(classes * bins**2) search stays small
+        lefts, rights, counts = hist.bins()
+        keep = counts > 0
+        lefts, rights, counts = lefts[keep], rights[keep], counts[keep]
+        groups = np.arange(0, len(counts), max(1, ceil(len(counts) / max_bins)))
+        weights = np.add.reduceat(counts, groups)
+        centers = np.add.reduceat(counts * (lefts + rights) / 2, groups) / weights
+        uppers = rights[np.append(groups[1:], len(counts)) - 1]
+        breaks = jenks_breaks(centers, weights, uppers, classes)
+    elif (breaks := summary_breaks(hist, method, classes)) is None:
+        raise ValueError(f"Unknown break method {method}")
+    return clip_breaks(breaks, hist.minimum, hist.maximum)
+
+def _tile_histogram(reader: TileReader, factory: partial, window: Window) -> Histogram:
+    return factory().update(reader.read(window))
+
+def compute_histogram(
+    reader: TileReader,
+    *,
+    bins: int = 1024,
+    accuracy: float = 0.005,
+    value_range: tuple[float, float] | None = None,
+    tile: int = 2048,
+    workers: int | None = None) -> Histogram:
+    """Histogram a raster tile by tile, optionally in a process pool
+
+    Args:
+        reader: A tile reader (readers are pickled to workers and reopen their source)
+        bins: Bin count of a fixed histogram
+        accuracy: Relative accuracy of an adaptive histogram
+        value_range: Build a `FixedHistogram` over this range, otherwise an `AdaptiveHistogram`
+        tile: Tile width and height in cells
+        workers: Number of worker processes (default is os.cpu_count(), 0 runs in this process)
+    """
+    if value_range is None:
+        factory = partial(AdaptiveHistogram, accuracy)
+    else:
+        factory = partial(FixedHistogram, *value_range, bins)
+
+    windows = iter_windows(reader.shape, tile)
+    histogram = factory()
+    if workers == 0:
+        for window in windows:
+            histogram.merge(_tile_histogram(reader, factory, window))
+        return histogram
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial_histogram in pool.map(partial(_tile_histogram, reader, factory), windows):
+            histogram.merge(partial_histogram)
+    return histogram
+
+if __name__ == '__main__':
+    from os import cpu_count
+    from pathlib import Path
+    from tempfile import TemporaryDirectory
+    from time import perf_counter
+
+    with TemporaryDirectory() as folder:
+        # Synthetic change raster with a NoData border
+        path = str(Path(folder) / 'change.npy')
+        rng = np.random.default_rng(0)
+        raster = np.lib.format.open_memmap(path, mode='w+', dtype='f4', shape=(8000, 8000))
+        for row in range(0, 8000, 1000):
+            raster[row:row+1000] = rng.normal(0, 2, (1000, 8000)) + rng.standard_cauchy((1000, 8000)) * 0.1
+        raster[:, :50] = -9999
+        raster.flush()
+        del raster
+
+        q = np.linspace(0, 1, 11)
+        start = perf_counter()
+        full = np.load(path)
+        full = full[full != -9999].astype('f8')
+        exact = np.quantile(full, q)
+        print(f"full array: {perf_counter() - start:.3f} seconds ({full.nbytes / 2**20:.0f} MiB in memory)")
+        del full
+
+        for workers in (0, 2, cpu_count()):
+            for value_range in (None, (-20, 20)):
+                start = perf_counter()
+                hist = compute_histogram(NpyTileReader(path, nodata=-9999), value_range=value_range, workers=workers, tile=1000)
+                elapsed = perf_counter() - start
+                error = np.abs(hist.quantile(q)[1:-1] - exact[1:-1]).max()
+                kind = 'adaptive' if value_range is None else 'fixed'
+                print(f"{kind} histogram, {workers} workers: {elapsed:.3f} seconds, max decile error {error:.4f}")
+
+        print(f"jenks breaks: {histogram_breaks(hist, 'jenks', 5)}")
@@ -1,13 +1,20 @@
-import arcpy
-from arcpy._mp import ArcGISProject, Layer, ColorRamp, Symbology
-from arcpy._symbology import RasterClassifyColorizer
+from __future__ import annotations
 
-from arcpy.cim import (
-    CIMRasterLayer, 
-    CIMRasterClassifyColorizer, 
-    CIMRasterClassBreak, 
-    ClassificationMethod, 
-)
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterator, Literal
+
+import numpy as np
+
+from lazy_import import lazy_import
+from raster_histogram import ArcpyTileReader, Histogram, clip_breaks, histogram_breaks, iter_windows, jenks_breaks, summary_breaks
+
+if TYPE_CHECKING:
+    import arcpy
+    from arcpy._mp import ArcGISProject, Layer, ColorRamp, Symbology
+    from arcpy._symbology import RasterClassifyColorizer
+    from arcpy.cim import CIMRasterLayer
+else:
+    arcpy = lazy_import('arcpy')
 
 def build_breaks(min_break: int, max_break: int, total_breaks: int, 
                  units: str = '%', 
@@ -17,8 +24,9 @@ def build_breaks(min_break: int, max_break: int, total_breaks: int,
     Args:
         min_break (int): The minimum break value (> -100)
         max_break (int): The maximum break value (< 100)
-        total_breaks (int): The total number of breaks
-        skip_zero (bool, optional): Skip the zero break if it is in the step. Defaults to True.
+        total_breaks (int): The total number of breaks (including the two extremes)
+        units (str, optional): Units appended to the labels. Defaults to '%'.
+        zero_break (str, optional): Label for a break at 0. Defaults to 'No Change'.
     """
     # Raise some errors if the input is invalid
     if min_break > max_break:
@@ -30,19 +38,26 @@ def build_breaks(min_break: int, max_break: int, total_breaks: int,
     if max_break >= 100:
         raise ValueError("max_break must be less than 100")
     
+    if total_breaks < 3:
+        raise ValueError("total_breaks must be at least 3")
+    
     # Calculate the step (total_breaks has the 2 extremes removed)
-    step = int((max_break - min_break) // (total_breaks-2))
+    # Keep integer steps when they divide evenly, narrow ranges fall back to a float step
+    step = (max_break - min_break) / (total_breaks-2)
+    if step.is_integer():
+        step = int(step)
     breaks = []
     
     # Add minimum extreme
     breaks.append((-100, f"Under {min_break}{units}"))
     
     # Build the breaks
-    for upper_bound in range(min_break, max_break, step):
+    for i in range(total_breaks-2):
+        upper_bound = min_break + i*step
         if upper_bound == 0:
             breaks.append((upper_bound, zero_break))
             continue
-        breaks.append((upper_bound, f"{upper_bound+step}{units} to {upper_bound}{units}"))
+        breaks.append((upper_bound, f"{upper_bound+step:g}{units} to {upper_bound:g}{units}"))
         
     # Add maximum extreme
     breaks.append((100, f"Over {max_break}{units}"))
@@ -50,16 +65,135 @@ def build_breaks(min_break: int, max_break: int, total_breaks: int,
     return breaks
 
 
+# Data driven breaks
+# Rasters are read in blocks, exact min/max/mean/std are accumulated and a bounded
+# random sample is kept for the quantile and natural breaks methods
+
+BreakMethod = Literal['quantile', 'jenks', 'equal_interval', 'std_dev']
+
+@dataclass
+class RasterSample:
+    """Running statistics and a Bernoulli sample of raster values"""
+    count: int = 0
+    total: float = 0.0
+    total_sq: float = 0.0
+    minimum: float = np.inf
+    maximum: float = -np.inf
+    samples: list[np.ndarray] = field(default_factory=list)
+    
+    def update(self, values: np.ndarray, rate: float = 1.0, rng: np.random.Generator | None = None) -> None:
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.total_sq += float(np.square(values).sum())
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        if rate < 1.0:
+            values = values[(rng or np.random.default_rng()).random(len(values)) < rate]
+        self.samples.append(values)
+    
+    @classmethod
+    def from_array(cls, values: np.ndarray) -> RasterSample:
+        sample = cls()
+        sample.update(np.asarray(values, dtype='f8').ravel())
+        return sample
+    
+    @property
+    def values(self) -> np.ndarray:
+        return np.concatenate(self.samples) if self.samples else np.array([])
+    
+    @property
+    def mean(self) -> float:
+        return self.total / self.count
+    
+    @property
+    def std(self) -> float:
+        return max(self.total_sq / self.count - self.mean**2, 0.0) ** 0.5
+
+def iter_raster_blocks(raster: str | arcpy.Raster, block_size: int = 2048) -> Iterator[np.ndarray]:
+    """Read a raster as float blocks with NoData as NaN"""
+    reader = ArcpyTileReader(raster)
+    for window in iter_windows(reader.shape, block_size):
+        yield reader.read(window)
+
+def sample_raster(
+    raster: str | arcpy.Raster, 
+    *, 
+    block_size: int = 2048, 
+    max_samples: int = 1_000_000, 
+    seed: int | None = None) -> RasterSample:
+    """Read a raster block by block, keeping about `max_samples` values for quantiles"""
+    raster = arcpy.Raster(str(raster)) if not isinstance(raster, arcpy.Raster) else raster
+    rate = min(1.0, max_samples / (raster.width * raster.height))
+    rng = np.random.default_rng(seed)
+    sample = RasterSample()
+    for block in iter_raster_blocks(raster, block_size):
+        sample.update(block.ravel(), rate, rng)
+    return sample
+
+def _jenks(values: np.ndarray, classes: int, bins: int = 512) -> list[float]:
+    """Fisher-Jenks natural breaks over a histogram of the values (weighted by bin count)"""
+    counts, edges = np.histogram(values, bins=min(bins, len(np.unique(values))))
+    return jenks_breaks((edges[:-1] + edges[1:]) / 2, counts, edges[1:], classes)
+
+def class_breaks(sample: RasterSample, method: BreakMethod = 'quantile', classes: int = 5) -> list[float]:
+    """Upper bounds of each class, the last bound is the raster maximum"""
+    if not sample.count:
+        raise ValueError("No valid raster values to classify")
+    
+    if method == 'quantile':
+        breaks = np.quantile(sample.values, np.linspace(0, 1, classes + 1)[1:])
+    elif method == 'jenks':
+        breaks = _jenks(sample.values, classes)
+    elif (breaks := summary_breaks(sample, method, classes)) is None:
+        raise ValueError(f"Unknown break method {method}")
+    return clip_breaks(breaks, sample.minimum, sample.maximum)
+
+def data_breaks(
+    raster: str | arcpy.Raster | RasterSample | Histogram, 
+    method: BreakMethod = 'quantile', 
+    classes: int = 5, 
+    *, 
+    units: str = '', 
+    precision: int = 2,
+    **sample_kwargs) -> list[tuple[float, str]]:
+    """Build (upper bound, label) breaks from raster values, like `build_breaks`
+    
+    Args:
+        raster: A raster, a `RasterSample` (use `RasterSample.from_array` for local arrays)
+            or a histogram from `raster_histogram.compute_histogram` for rasters too large to sample
+        method: 'quantile', 'jenks', 'equal_interval' or 'std_dev'
+        classes: The number of classes (fewer are returned if the data has fewer distinct values)
+        units: Units appended to the labels
+        precision: Decimal places in the labels
+        sample_kwargs: Passed to `sample_raster`
+    """
+    if isinstance(raster, Histogram):
+        sample, breaks = raster, histogram_breaks(raster, method, classes)
+    else:
+        sample = raster if isinstance(raster, RasterSample) else sample_raster(raster, **sample_kwargs)
+        breaks = class_breaks(sample, method, classes)
+    lower_bounds = [sample.minimum] + breaks[:-1]
+    return [
+        (upper, f"{lower:.{precision}f}{units} to {upper:.{precision}f}{units}")
+        for lower, upper in zip(lower_bounds, breaks)
+    ]
+
 def main():
+    from arcpy.cim import CIMRasterClassifyColorizer, CIMRasterClassBreak, ClassificationMethod
+    
     # Placeholder symbology and color ramp
-    project: ArcGISProject = ArcGISProject(r"<path_to_project>")
+    project: ArcGISProject = arcpy.mp.ArcGISProject(r"<path_to_project>")
     raster_layer: Layer = project.listMaps('<map_name>')[0].listLayers('<raster_layer_name>')[0]
     
     layer_cim: CIMRasterLayer = raster_layer.getDefinition('V3')
     
-    # Build the class breaks
-    class_breaks = [CIMRasterClassBreak() for _ in range(10)]
-    for (val, label), class_break in zip(build_breaks(-40, 40, 10), class_breaks):
+    # Build the class breaks (or from the data: data_breaks(raster_layer.dataSource, 'jenks', 10))
+    breaks = build_breaks(-40, 40, 10)
+    cim_breaks = [CIMRasterClassBreak() for _ in breaks]
+    for (val, label), class_break in zip(breaks, cim_breaks):
         class_break: CIMRasterClassBreak = class_break
         class_break.label = label
         class_break.upperBound = val
@@ -67,7 +201,7 @@ def main():
     # Build the colorizer
     colorizer = CIMRasterClassifyColorizer()
     colorizer.classificationMethod = ClassificationMethod.Manual
-    colorizer.classBreaks = class_breaks
+    colorizer.classBreaks = cim_breaks
     colorizer.field = "Value"
     
     layer_cim.colorizer.__dict__.update(colorizer.__dict__)
@@ -78,7 +212,7 @@ def main():
     color_ramp: ColorRamp = project.listColorRamps('Prediction')[0]
     sym_colorizer.colorRamp = color_ramp
     
-    raster_layer.symbology = sym_colorizer
+    raster_layer.symbology = raster_sym
         
     # Save the project
     project.save()
@@ -0,0 +1,404 @@
+"""Row hash diffs between two tables and a cursor writer for the minimal edit set
+
+Both tables are streamed once. Each row becomes a (key id, row hash) pair: the key id
+is the key itself for integer keys and a 64 bit hash of the text for string keys
+(GlobalIDs, codes), the row hash is a 64 bit BLAKE2b of the attribute values and the
+geometry WKB. The pairs are joined by key id with NumPy, giving the keys to insert,
+update and delete. Only (key id, hash) pairs are kept, 16 bytes a row, and once a table
+has more than `memory_rows` rows the pairs are spilled into partition files on disk and
+each partition is sorted and merged on its own.
+
+`apply_diff` then reads the source a second time and writes only the changed rows with
+an insert and an update cursor.
+
+Usage:
+    >>> fields = ['PARCEL_ID', 'OWNER', 'ZONING', 'SHAPE@']
+    >>> diff = diff_tables(read_table(source, fields), read_table(target, fields), geometry_index=3)
+    >>> print(diff)
+    1,204 inserts, 3,871 updates, 96 deletes (2,417,733 unchanged)
+    >>> apply_diff(diff, source, target, fields)
+
+    Run this module to benchmark on synthetic tables (10M rows takes a few minutes):
+
+    python row_diff.py 10000000 --memory-rows 2000000
+"""
+
+from __future__ import annotations
+
+import tempfile
+from dataclasses import dataclass
+from hashlib import blake2b
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Sequence
+
+from instrument import profile
+from lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import arcpy
+    import numpy as np
+else:
+    arcpy = lazy_import('arcpy')
+    np = lazy_import('numpy')
+
+Row = Sequence[Any]
+
+CHUNK_SIZE = 100_000
+MEMORY_ROWS = 20_000_000
+PARTITIONS = 16
+# Fibonacci hashing spreads sequential keys evenly over the partitions
+_GOLDEN = 0x9E3779B97F4A7C15
+
+def key_id(key: int | str) -> int:
+    """The int64 id of a key, integers are their own id and text is hashed"""
+    if isinstance(key, int):
+        return key
+    if key is None:
+        raise ValueError("Rows with a null key can't be matched")
+    return int.from_bytes(blake2b(str(key).encode(), digest_size=8).digest(), 'little', signed=True)
+
+def row_hash(values: Row, geometry: bytes | bytearray | None = None) -> int:
+    """Stable 64 bit hash of attribute values and geometry WKB
+
+    Values are hashed by their repr, so 1, 1.0 and '1' are different values and
+    tables should be compared field by field with the same field types.
+    """
+    digest = blake2b(repr(tuple(values)).encode(), digest_size=8)
+    if geometry:
+        digest.update(geometry)
+    return int.from_bytes(digest.digest(), 'little', signed=True)
+
+def hash_chunks(rows: Iterable[Row], geometry_index: int | None = None, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """(key ids, row hashes) arrays for every `chunk_size` rows, the key is the first value of a row
+
+    Args:
+        rows: Rows of (key, *values), e.g. from `read_table`
+        geometry_index: Index of the WKB value in a row (hashed as bytes, not by repr)
+        chunk_size: Rows per chunk
+    """
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        keys = np.fromiter((key_id(row[0]) for row in chunk), dtype='i8', count=len(chunk))
+        if geometry_index is None:
+            hashes = (row_hash(row[1:]) for row in chunk)
+        else:
+            hashes = (
+                row_hash(row[1:geometry_index] + row[geometry_index + 1:], row[geometry_index])
+                for row in map(tuple, chunk)
+            )
+        yield keys, np.fromiter(hashes, dtype='i8', count=len(chunk))
+
+def read_table(table: str, fields: Sequence[str], where: str | None = None, **kwargs) -> Iterator[tuple]:
+    """Stream rows of a table or feature class for `diff_tables`, geometry tokens are read as WKB
+
+    Args:
+        table: Table, feature class or layer
+        fields: The key field first, then the compared fields ('SHAPE@' for geometry)
+        where: Optional where clause
+        kwargs: Passed to the SearchCursor (e.g. spatial_reference)
+    """
+    fields = _wkb_fields(fields)
+    with profile.cursor(arcpy.da.SearchCursor(table, fields, where, **kwargs), 'diff.read') as cursor:
+        yield from cursor
+
+def _wkb_fields(fields: Sequence[str]) -> list[str]:
+    return ['SHAPE@WKB' if field.upper().startswith('SHAPE@') else field for field in fields]
+
+# Joining hashes
+
+@dataclass
+class Diff:
+    """Key ids to insert into, update in and delete from the target (each sorted)"""
+    inserts: np.ndarray
+    updates: np.ndarray
+    deletes: np.ndarray
+    unchanged: int
+
+    def __len__(self) -> int:
+        return len(self.inserts) + len(self.updates) + len(self.deletes)
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.inserts):,} inserts, {len(self.updates):,} updates, "
+            f"{len(self.deletes):,} deletes ({self.unchanged:,} unchanged)"
+        )
+
+def _check_unique(keys: np.ndarray, name: str) -> None:
+    if len(keys) > 1 and (duplicate := np.flatnonzero(keys[1:] == keys[:-1])).size:
+        raise ValueError(f"{name} has {duplicate.size:,} duplicate keys (first key id {keys[duplicate[0]]})")
+
+def diff_hashes(
+    source_keys: np.ndarray,
+    source_hashes: np.ndarray,
+    target_keys: np.ndarray,
+    target_hashes: np.ndarray) -> Diff:
+    """Sort both sides by key and merge them"""
+    source_order = np.argsort(source_keys, kind='stable')
+    target_order = np.argsort(target_keys, kind='stable')
+    source_keys, source_hashes = source_keys[source_order], source_hashes[source_order]
+    target_keys, target_hashes = target_keys[target_order], target_hashes[target_order]
+    _check_unique(source_keys, 'source')
+    _check_unique(target_keys, 'target')
+
+    common, in_source, in_target = np.intersect1d(source_keys, target_keys, assume_unique=True, return_indices=True)
+    changed = source_hashes[in_source] != target_hashes[in_target]
+    only_source = np.ones(len(source_keys), dtype=bool)
+    only_source[in_source] = False
+    only_target = np.ones(len(target_keys), dtype=bool)
+    only_target[in_target] = False
+    return Diff(source_keys[only_source], common[changed], target_keys[only_target], int((~changed).sum()))
+
+class _HashSpool:
+    """(key id, hash) pairs of one table, kept in memory until `memory_rows` then written to partition files"""
+
+    def __init__(self, name: str, folder: Path, memory_rows: int, partitions: int) -> None:
+        self.name = name
+        self.folder = folder
+        self.memory_rows = memory_rows
+        self.partitions = partitions
+        self.chunks: list[tuple[np.ndarray, np.ndarray]] = []
+        self.rows = 0
+        self.spilled = False
+
+    def add(self, keys: np.ndarray, hashes: np.ndarray) -> None:
+        self.rows += len(keys)
+        if self.spilled:
+            self._write(keys, hashes)
+            return
+        self.chunks.append((keys, hashes))
+        if self.rows > self.memory_rows:
+            self.spill()
+
+    def spill(self) -> None:
+        if self.spilled:
+            return
+        self.spilled = True
+        for keys, hashes in self.chunks:
+            self._write(keys, hashes)
+        self.chunks.clear()
+
+    def _write(self, keys: np.ndarray, hashes: np.ndarray) -> None:
+        partition = ((keys.view('u8') * np.uint64(_GOLDEN)) >> np.uint64(40)) % np.uint64(self.partitions)
+        order = np.argsort(partition, kind='stable')
+        bounds = np.searchsorted(partition[order], np.arange(self.partitions + 1, dtype='u8'))
+        pairs = np.column_stack([keys[order], hashes[order]])
+        for index in range(self.partitions):
+            if bounds[index] < bounds[index + 1]:
+                with open(self._path(index), 'ab') as file:
+                    pairs[bounds[index]:bounds[index + 1]].tofile(file)
+
+    def _path(self, index: int) -> Path:
+        return self.folder / f"{self.name}.{index}.bin"
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """Every pair held in memory"""
+        if not self.chunks:
+            return np.zeros(0, dtype='i8'), np.zeros(0, dtype='i8')
+        return np.concatenate([k for k, _ in self.chunks]), np.concatenate([h for _, h in self.chunks])
+
+    def partition(self, index: int) -> tuple[np.ndarray, np.ndarray]:
+        path = self._path(index)
+        if not path.exists():
+            return np.zeros(0, dtype='i8'), np.zeros(0, dtype='i8')
+        pairs = np.fromfile(path, dtype='i8').reshape(-1, 2)
+        return pairs[:, 0].copy(), pairs[:, 1].copy()
+
+@profile(name='diff_tables')
+def diff_tables(
+    source: Iterable[Row],
+    target: Iterable[Row],
+    *,
+    geometry_index: int | None = None,
+    memory_rows: int = MEMORY_ROWS,
+    partitions: int = PARTITIONS,
+    workdir: str | Path | None = None,
+    chunk_size: int = CHUNK_SIZE) -> Diff:
+    """Inserts, updates and deletes that turn `target` into `source`
+
+    Args:
+        source: Rows of (key, *values) with the wanted state
+        target: Rows of (key, *values) with the current state, same fields as `source`
+        geometry_index: Index of the geometry WKB in a row
+        memory_rows: Rows per table kept in memory before spilling to disk
+        partitions: Partition files per table once spilled, each partition pair is diffed in memory
+        workdir: Folder for the partition files (default is the temp folder)
+        chunk_size: Rows hashed at a time
+
+    Returns:
+        A `Diff` of key ids (see `key_id`)
+    """
+    with tempfile.TemporaryDirectory(dir=workdir, prefix='row_diff_') as folder:
+        spools = [_HashSpool(name, Path(folder), memory_rows, partitions) for name in ('source', 'target')]
+        for spool, rows in zip(spools, (source, target)):
+            with profile.span(f"hash.{spool.name}"):
+                for keys, hashes in hash_chunks(rows, geometry_index, chunk_size):
+                    spool.add(keys, hashes)
+                    profile.count(f"hash.{spool.name}", rows_in=len(keys))
+
+        source_spool, target_spool = spools
+        if not (source_spool.spilled or target_spool.spilled):
+            with profile.span('merge'):
+                return diff_hashes(*source_spool.arrays(), *target_spool.arrays())
+
+        source_spool.spill()
+        target_spool.spill()
+        parts = []
+        with profile.span('merge'):
+            for index in range(partitions):
+                parts.append(diff_hashes(*source_spool.partition(index), *target_spool.partition(index)))
+        return Diff(
+            np.sort(np.concatenate([part.inserts for part in parts])),
+            np.sort(np.concatenate([part.updates for part in parts])),
+            np.sort(np.concatenate([part.deletes for part in parts])),
+            sum(part.unchanged for part in parts),
+        )
+
+# Applying a diff
+
+def _members(keys: np.ndarray, sorted_keys: np.ndarray) -> np.ndarray:
+    """Mask of `keys` found in the sorted array `sorted_keys`"""
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    index = np.searchsorted(sorted_keys, keys).clip(max=len(sorted_keys) - 1)
+    return sorted_keys[index] == keys
+
+def changed_rows(diff: Diff, source: Iterable[Row], chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[str, Row]]:
+    """The ('insert' | 'update', row) pairs of the source rows in a diff"""
+    source = iter(source)
+    while chunk := list(islice(source, chunk_size)):
+        keys = np.fromiter((key_id(row[0]) for row in chunk), dtype='i8', count=len(chunk))
+        inserts = _members(keys, diff.inserts)
+        updates = _members(keys, diff.updates)
+        for index in np.flatnonzero(inserts | updates).tolist():
+            yield ('insert' if inserts[index] else 'update'), chunk[index]
+
+@profile(name='apply_diff')
+def apply_diff(
+    diff: Diff,
+    source: str,
+    target: str,
+    fields: Sequence[str],
+    where: str | None = None,
+    *,
+    workspace: str | None = None) -> dict[str, int]:
+    """Write the rows of a diff from `source` to `target`
+
+    Inserts go through an InsertCursor, updated source rows are held until the
+    UpdateCursor pass over the target that also deletes rows. Use a key that is the
+    same in both tables (not OID@, inserted rows get new ObjectIDs).
+
+    Args:
+        diff: The diff from `diff_tables` with the same fields
+        source: The table with the wanted state
+        target: The table to edit
+        fields: The key field first, then the compared fields
+        where: Where clause used for the source when the diff was made
+        workspace: Start an edit session on this workspace (versioned or related data)
+
+    Returns:
+        Counts of rows inserted, updated and deleted
+    """
+    fields = _wkb_fields(fields)
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    if not len(diff):
+        return counts
+
+    edit = arcpy.da.Editor(workspace) if workspace else None
+    if edit:
+        edit.startEditing(False, True)
+        edit.startOperation()
+    try:
+        updates: dict[int, Row] = {}
+        deletes = set(diff.deletes.tolist())
+        with profile.cursor(arcpy.da.InsertCursor(target, fields), 'diff.insert') as cursor:
+            for kind, row in changed_rows(diff, read_table(source, fields, where)):
+                if kind == 'insert':
+                    cursor.insertRow(row)
+                    counts['inserted'] += 1
+                else:
+                    updates[key_id(row[0])] = row
+
+        if updates or deletes:
+            with profile.cursor(arcpy.da.UpdateCursor(target, fields), 'diff.update') as cursor:
+                for row in cursor:
+                    key = key_id(row[0])
+                    if key in updates:
+                        cursor.updateRow(updates.pop(key))
+                        counts['updated'] += 1
+                    elif key in deletes:
+                        cursor.deleteRow()
+                        counts['deleted'] += 1
+        if edit:
+            edit.stopOperation()
+            edit.stopEditing(True)
+    except Exception:
+        if edit:
+            edit.abortOperation()
+            edit.stopEditing(False)
+        raise
+    return counts
+
+# Synthetic tables
+
+def synthetic_rows(count: int, *, version: int = 0, change_every: int = 1000, inserts: int = 0) -> Iterator[tuple]:
+    """Rows of (key, name, value, class, point WKB) without a geodatabase
+
+    Version 1 changes every `change_every`th row (attribute or geometry), drops the row
+    after it and adds `inserts` rows with new keys, compared to version 0.
+    """
+    from struct import Struct
+    point = Struct('<BIdd')
+    for key in range(1, count + 1):
+        changed = version and key % change_every == 0
+        if version and key % change_every == 1:
+            continue
+        value = key * 0.25 + (1.0 if changed and key % 2 else 0.0)
+        x = 500_000.0 + key % 10_000 + (0.5 if changed and not key % 2 else 0.0)
+        yield key, f"Feature {key % 5000}", value, key % 7, point.pack(1, 1, x, 4_000_000.0 + key // 10_000)
+    for key in range(count + 1, count + 1 + (inserts if version else 0)):
+        yield key, f"Feature {key % 5000}", key * 0.25, key % 7, point.pack(1, 1, 0.0, 0.0)
+
+def benchmark(rows: int = 1_000_000, memory_rows: int = MEMORY_ROWS, change_every: int = 1000) -> None:
+    from time import perf_counter
+
+    inserts = rows // change_every
+    expected_updates = rows // change_every
+    expected_deletes = len(range(1, rows + 1, change_every))
+    for label, limit in (('in memory', max(memory_rows, rows + inserts)), ('partitioned', memory_rows)):
+        if label == 'partitioned' and limit >= rows:
+            limit = rows // 4
+        start = perf_counter()
+        diff = diff_tables(
+            synthetic_rows(rows, version=1, change_every=change_every, inserts=inserts),
+            synthetic_rows(rows),
+            geometry_index=4,
+            memory_rows=limit,
+        )
+        elapsed = perf_counter() - start
+        print(f"{label}: {diff}")
+        print(f"  {elapsed:.1f} seconds, {2 * rows / elapsed:,.0f} rows/s")
+        assert (len(diff.inserts), len(diff.updates), len(diff.deletes)) == (inserts, expected_updates, expected_deletes)
+
+    # Apply a diff to a dictionary "table" and check nothing is left to change
+    start = perf_counter()
+    count = min(rows, 1_000_000)
+    source = lambda: synthetic_rows(count, version=1, change_every=change_every, inserts=100)
+    target = {row[0]: row for row in synthetic_rows(count)}
+    diff = diff_tables(source(), target.values(), geometry_index=4)
+    for key in diff.deletes.tolist():
+        del target[key]
+    for _, row in changed_rows(diff, source()):
+        target[row[0]] = row
+    assert not diff_tables(source(), target.values(), geometry_index=4)
+    print(f"Applied {diff} to a dictionary, diffed again with no changes ({perf_counter() - start:.1f} seconds)")
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description="Diff two synthetic tables")
+    parser.add_argument('rows', nargs='?', type=int, default=1_000_000)
+    parser.add_argument('--memory-rows', type=int, default=MEMORY_ROWS, help="Rows per table held in memory before partitioning")
+    args = parser.parse_args()
+    benchmark(args.rows, args.memory_rows)
+    if profile.enabled:
+        print(profile.report())
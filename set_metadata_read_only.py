@@ -1,9 +1,20 @@
+from __future__ import annotations
+
+import json
+import os
 from pathlib import Path
+from tempfile import mkstemp
+from typing import TYPE_CHECKING
+
+from lazy_import import lazy_import
 
-from arcpy.mp import LayerFile, ArcGISProject
-from arcpy._mp import Map, Layer # Hidden mp types
+if TYPE_CHECKING:
+    from arcpy.mp import LayerFile, ArcGISProject
+    from arcpy._mp import Map, Layer # Hidden mp types
 
-from arcpy.cim import CIMDefinition # All CIM types support the useSourceMetadata property
+    from arcpy.cim import CIMDefinition # All CIM types support the useSourceMetadata property
+else:
+    mp = lazy_import('arcpy.mp')
 
 def get_map(project: ArcGISProject, map_name: str) -> Map:
     return project.listMaps(map_name)[0]
@@ -19,7 +30,7 @@ def set_metadata_readonly(project: ArcGISProject, layerfiles: list[str], output_
     for layer_path in layerfiles:
         # Set Up LayerFile object
         lyrpath =  Path(layer_path)
-        lyr = LayerFile(str(lyrpath))
+        lyr = mp.LayerFile(str(lyrpath))
         
         # Add Layer to top of map
         target_map = get_map(project, output_map)
@@ -37,9 +48,96 @@ def set_metadata_readonly(project: ArcGISProject, layerfiles: list[str], output_
         # Update CIM definition
         new_layer.setDefinition(new_layer_cim)
             
+def set_lyrx_metadata_readonly(layerfile: str, output_folder: str | None=None, prefix: str='') -> str:
+    """Write a copy of a .lyrx with useSourceMetadata set on every layer definition
+
+    Data sources in a .lyrx can be relative to its folder, so by default the copy is
+    written next to the source under a unique temporary name (the caller removes it).
+
+    Returns:
+        The path of the edited copy
+    """
+    lyrpath = Path(layerfile)
+    document = json.loads(lyrpath.read_text(encoding='utf-8'))
+    for definition in document.get('layerDefinitions', []):
+        definition['useSourceMetadata'] = True
+
+    if output_folder is None:
+        handle, output = mkstemp(suffix='.lyrx', prefix=f"~{prefix}{lyrpath.stem}_", dir=lyrpath.parent)
+        os.close(handle)
+        output = Path(output)
+    else:
+        output = Path(output_folder) / f"{prefix}{lyrpath.name}"
+    output.write_text(json.dumps(document), encoding='utf-8')
+    return str(output)
+
+def set_metadata_readonly_bulk(
+    project: ArcGISProject,
+    layerfiles: list[str],
+    output_map: str | None=None,
+    edit_lyrx: bool=False) -> list[Layer]:
+    """Adds layerfiles to a map with the useSourceMetadata property set to True.
+
+    The map is resolved once and new layers are taken from the return value of `addLayer`
+    instead of re-listing the map, so the cost is linear in the number of layerfiles.
+
+    Parameters:
+        project (ArcGISProject): The project to add the layers to.
+        layerfiles (list[str]): The list of layerfiles to add to the map.
+        output_map (Optional[str]): The name of the map to add the layers to. (default is first map in project)
+        edit_lyrx (bool): Set useSourceMetadata in copies of the .lyrx JSON before adding them
+            (no CIM round trip per layer). Each copy is written next to its source and
+            removed once it is added. (default is False)
+
+    Returns:
+        list[Layer]: The added layers
+    """
+    target_map = get_map(project, output_map)
+
+    new_layers: list[Layer] = []
+    if edit_lyrx:
+        for layer_path in layerfiles:
+            edited = set_lyrx_metadata_readonly(layer_path)
+            try:
+                new_layers.extend(target_map.addLayer(mp.LayerFile(edited), add_position="TOP"))
+            finally:
+                # The project holds its own copy of the added layers
+                os.remove(edited)
+        return new_layers
+
+    for layer_path in layerfiles:
+        new_layers.extend(target_map.addLayer(mp.LayerFile(str(layer_path)), add_position="TOP"))
+
+    # One CIM pass per added layer
+    for new_layer in new_layers:
+        new_layer_cim: CIMDefinition = new_layer.getDefinition("V3")
+        if new_layer_cim.useSourceMetadata:
+            continue
+        new_layer_cim.useSourceMetadata = True
+        new_layer.setDefinition(new_layer_cim)
+
+    return new_layers
+
 def main():
     ## Implement your script here
     return
 
+def compare_timing(project_path: str, layerfiles: list[str], total: int=500, output_map: str | None=None):
+    """Time each method adding `total` layerfiles (cycled from `layerfiles`), the project is not saved"""
+    from itertools import cycle, islice
+    from time import perf_counter
+
+    layerfiles = list(islice(cycle(layerfiles), total))
+    for name, func, kwargs in (
+        ('per layer', set_metadata_readonly, {}),
+        ('bulk', set_metadata_readonly_bulk, {}),
+        ('bulk (lyrx edit)', set_metadata_readonly_bulk, {'edit_lyrx': True}),
+    ):
+        project = mp.ArcGISProject(project_path)
+        start = perf_counter()
+        func(project, layerfiles, output_map, **kwargs)
+        print(f"{name}: {perf_counter() - start:.2f} seconds for {total} layerfiles")
+        del project
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,235 @@
+"""Approximate field summaries for tables too large to count exactly
+
+`inline_summary` builds an exact `('Package', 'Counts')` array, which needs a
+counter entry for every distinct value. These sketches use fixed memory:
+
+- `HyperLogLog` estimates the distinct count with a relative error of about
+  `1.04 / sqrt(2**precision)`
+- `SpaceSaving` tracks the heaviest values, every reported count is at most
+  `total_rows / capacity` over the true count
+
+Both are mergeable, so chunks can be sketched in worker processes and combined
+in the parent the same way `inline_summary.parallel` merges exact counts.
+
+Usage:
+    >>> top, distinct = sketch(iter_chunks(vals, 1_000_000), top_k=10, epsilon=0.0001)
+    >>> top
+    array([('42', 100211), ('17', 100093), ...], dtype=[('Package', '<U50'), ('Counts', '<i4')])
+"""
+
+from __future__ import annotations
+
+from hashlib import blake2b
+from math import ceil, log, log2
+from os import cpu_count
+from typing import Iterable
+
+import numpy as np
+
+from inline_summary import as_summary, bounded_map, iter_chunks
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """Vectorized splitmix64 finalizer (uint64 arithmetic wraps)"""
+    x = (x + np.uint64(0x9E3779B97F4A7C15)) & _MASK64
+    x = ((x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)) & _MASK64
+    x = ((x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)) & _MASK64
+    return x ^ (x >> np.uint64(31))
+
+def hash64(values: np.ndarray) -> np.ndarray:
+    """Stable 64 bit hashes (unlike `hash()` these match across processes)"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        return _splitmix64(values.astype('i8').view('u8'))
+    if values.dtype.kind == 'f':
+        return _splitmix64(values.astype('f8').view('u8'))
+    return np.fromiter(
+        (int.from_bytes(blake2b(str(v).encode(), digest_size=8).digest(), 'little') for v in values),
+        dtype='u8', count=len(values),
+    )
+
+def _leading_zeros(x: np.ndarray) -> np.ndarray:
+    """Count leading zeros of uint64 values with a branchless binary search"""
+    zeros = np.zeros(x.shape, dtype='u1')
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = x < (np.uint64(1) << np.uint64(64 - shift))
+        zeros[empty] += shift
+        x = np.where(empty, x << np.uint64(shift), x)
+    return zeros
+
+class HyperLogLog:
+    """Distinct count estimator"""
+    def __init__(self, error: float = 0.01, precision: int | None = None):
+        if precision is None:
+            precision = ceil(log2((1.04 / error) ** 2))
+        self.precision = min(max(precision, 4), 18)
+        self.registers = np.zeros(1 << self.precision, dtype='u1')
+
+    @property
+    def error(self) -> float:
+        """Expected relative standard error"""
+        return 1.04 / len(self.registers) ** 0.5
+
+    def update(self, values: np.ndarray) -> HyperLogLog:
+        hashes = hash64(values)
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype('i8')
+        rank = np.minimum(_leading_zeros((hashes << p) & _MASK64) + 1, 65 - self.precision)
+        np.maximum.at(self.registers, index, rank.astype('u1'))
+        return self
+
+    def merge(self, other: HyperLogLog) -> HyperLogLog:
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge precision {other.precision} into {self.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype('i4')))
+
+        # Linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * m and (empty := int(np.count_nonzero(self.registers == 0))):
+            estimate = m * log(m / empty)
+        return round(estimate)
+
+class SpaceSaving:
+    """Heavy hitter summary with bounded overestimation
+
+    Values that were dropped from the summary have a true count of at most `floor`
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.items = np.array([])
+        self.counts = np.zeros(0, dtype='i8')
+        self.errors = np.zeros(0, dtype='i8')
+        self.floor = 0
+
+    def update(self, values: np.ndarray) -> SpaceSaving:
+        items, counts = np.unique(values, return_counts=True)
+        chunk = SpaceSaving(self.capacity)
+        chunk.items, chunk.counts, chunk.errors = items, counts.astype('i8'), np.zeros(len(items), dtype='i8')
+        chunk._truncate()
+        return self.merge(chunk)
+
+    def merge(self, other: SpaceSaving) -> SpaceSaving:
+        if not len(other.items):
+            return self
+        if not len(self.items):
+            self.items, self.counts, self.errors = other.items, other.counts, other.errors
+            self.floor = max(self.floor, other.floor)
+            return self._truncate()
+
+        items, inverse = np.unique(np.concatenate([self.items, other.items]), return_inverse=True)
+        ours, theirs = inverse[:len(self.items)], inverse[len(self.items):]
+
+        # Values missing from one side could have been dropped there with up to `floor` rows
+        counts = np.full(len(items), self.floor + other.floor, dtype='i8')
+        errors = counts.copy()
+        counts[ours] += self.counts - self.floor
+        errors[ours] += self.errors - self.floor
+        counts[theirs] += other.counts - other.floor
+        errors[theirs] += other.errors - other.floor
+
+        self.items, self.counts, self.errors = items, counts, errors
+        self.floor += other.floor
+        return self._truncate()
+
+    def _truncate(self) -> SpaceSaving:
+        if len(self.items) <= self.capacity:
+            return self
+        order = np.argsort(-self.counts, kind='stable')
+        keep, dropped = order[:self.capacity], order[self.capacity:]
+        self.floor = max(self.floor, int(self.counts[dropped].max()))
+        self.items, self.counts, self.errors = self.items[keep], self.counts[keep], self.errors[keep]
+        return self
+
+    def top(self, k: int) -> np.ndarray:
+        order = np.argsort(-self.counts, kind='stable')[:k]
+        return as_summary(self.items[order], self.counts[order])
+
+class FieldSketch:
+    """Distinct count and top-k sketch for one field"""
+    def __init__(self, top_k: int = 10, epsilon: float = 0.001, error: float = 0.01):
+        self.top_k = top_k
+        self.rows = 0
+        self.distinct = HyperLogLog(error)
+        self.heavy = SpaceSaving(max(top_k, ceil(1 / epsilon)))
+
+    def update(self, chunk: np.ndarray) -> FieldSketch:
+        chunk = np.asarray(chunk)
+        self.rows += len(chunk)
+        self.distinct.update(chunk)
+        self.heavy.update(chunk)
+        return self
+
+    def merge(self, other: FieldSketch) -> FieldSketch:
+        self.rows += other.rows
+        self.distinct.merge(other.distinct)
+        self.heavy.merge(other.heavy)
+        return self
+
+    def summary(self) -> np.ndarray:
+        """Top-k values as a ('Package', 'Counts') array"""
+        return self.heavy.top(self.top_k)
+
+def _sketch_chunk(args: tuple[np.ndarray, int, float, float]) -> FieldSketch:
+    chunk, top_k, epsilon, error = args
+    return FieldSketch(top_k, epsilon, error).update(chunk)
+
+def sketch(
+    chunks: Iterable[np.ndarray],
+    *,
+    top_k: int = 10,
+    epsilon: float = 0.001,
+    error: float = 0.01,
+    workers: int | None = None) -> tuple[np.ndarray, int]:
+    """Sketch chunks in a process pool and merge them
+
+    Args:
+        chunks: An iterable of value arrays (see `inline_summary.iter_chunks`)
+        top_k: Number of values to report
+        epsilon: Top-k counts overestimate by at most epsilon * total rows
+        error: Target relative error of the distinct count
+        workers: Number of worker processes (default is os.cpu_count())
+
+    Returns:
+        The top-k ('Package', 'Counts') array and the estimated distinct count
+    """
+    merged = FieldSketch(top_k, epsilon, error)
+    workers = workers or cpu_count() or 1
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Only a few chunks are read ahead, the input is never held in memory at once
+        jobs = ((c, top_k, epsilon, error) for c in chunks)
+        for partial in bounded_map(pool, _sketch_chunk, jobs, pending=2 * workers):
+            merged.merge(partial)
+    return merged.summary(), merged.distinct.count()
+
+if __name__ == '__main__':
+    from time import perf_counter
+    from inline_summary import numpy
+
+    # Zipf distributed values have a clear head and a long tail
+    vals = np.random.default_rng(1).zipf(1.3, size=10_000_000) % 2_000_000
+
+    start = perf_counter()
+    exact = numpy(vals)
+    print(f'exact: {perf_counter() - start:.3f} seconds')
+
+    for epsilon, error in ((0.001, 0.02), (0.0001, 0.005)):
+        start = perf_counter()
+        top, distinct = sketch(iter_chunks(vals, 1_000_000), top_k=10, epsilon=epsilon, error=error)
+        elapsed = perf_counter() - start
+
+        exact_counts = dict(exact.tolist())
+        exact_top = set(np.sort(exact, order='Counts')[::-1][:10]['Package'])
+        count_error = max(abs(count - exact_counts[value]) for value, count in top.tolist())
+
+        print(f'sketch {epsilon=} {error=}: {elapsed:.3f} seconds')
+        print(f'\tdistinct: {distinct} (exact {len(exact)}, error {abs(distinct - len(exact)) / len(exact):.2%})')
+        print(f'\ttop-k recall: {len(exact_top & set(top["Package"])) / 10:.0%}')
+        print(f'\tmax count error: {count_error} (bound {epsilon * len(vals):.0f})')
+        assert count_error <= epsilon * len(vals)
@@ -0,0 +1,346 @@
+"""Uniform grid index over feature envelopes for bulk geometry matching
+
+Everything works on plain arrays: envelopes are (N, 4) float arrays of xmin, ymin,
+xmax, ymax and shapes are summarised from flat (id, x, y) vertex arrays, so the index
+can be built from an exploded `FeatureClassToNumPyArray` read, GeoJSON coordinates or
+synthetic data. Each envelope is registered in the grid cells it covers, a query only
+compares envelopes that share a cell with it. Bulk queries are joined by cell id with
+NumPy instead of one Python lookup per geometry.
+
+Matching decides per incoming shape whether it is already in the target (same shape
+key, skip), a changed version of a target shape (envelope within `tolerance`, update)
+or new (insert). The shape key is an order independent hash of the distinct vertices rounded
+to `resolution`, so ring orientation and start point don't matter.
+
+Usage:
+    >>> oids, envelopes, keys = read_shapes(target_fc)
+    >>> index = GridIndex(envelopes)
+    >>> actions, matches = match_shapes(index, keys, new_envelopes, new_keys, tolerance=1.0)
+    >>> oids[matches[actions == UPDATE]]  # target features to update
+
+    Run this module to benchmark against a brute force envelope comparison (1M features).
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Sequence
+
+from lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import arcpy
+    import numpy as np
+else:
+    arcpy = lazy_import('arcpy')
+    np = lazy_import('numpy')
+
+INSERT = 0
+UPDATE = 1
+SKIP = 2
+ACTION_NAMES = {INSERT: 'insert', UPDATE: 'update', SKIP: 'skip'}
+
+RESOLUTION = 0.001
+# Queries are joined with the grid this many at a time to bound the temporary arrays
+QUERY_CHUNK = 250_000
+
+# Shape summaries
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer (uint64 in, uint64 out)"""
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+def summarize_vertices(
+    ids: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray,
+    resolution: float = RESOLUTION) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Envelope and shape key of every feature from flat vertex arrays
+
+    Args:
+        ids: The feature id of each vertex
+        x: Vertex X coordinates
+        y: Vertex Y coordinates
+        resolution: Vertices closer than this are the same vertex in the shape key
+
+    Returns:
+        The sorted unique ids, their (N, 4) envelopes and int64 shape keys
+    """
+    ids = np.asarray(ids, dtype='i8')
+    x = np.asarray(x, dtype='f8')
+    y = np.asarray(y, dtype='f8')
+    if len(ids) and np.any(ids[1:] < ids[:-1]):
+        order = np.argsort(ids, kind='stable')
+        ids, x, y = ids[order], x[order], y[order]
+    if not len(ids):
+        return ids, np.zeros((0, 4)), np.zeros(0, dtype='i8')
+
+    unique, starts, counts = np.unique(ids, return_index=True, return_counts=True)
+    envelopes = np.column_stack([
+        np.minimum.reduceat(x, starts), np.minimum.reduceat(y, starts),
+        np.maximum.reduceat(x, starts), np.maximum.reduceat(y, starts),
+    ])
+    # A sum of the distinct vertex hashes doesn't depend on vertex order or the ring start
+    # point (which decides the repeated closing vertex)
+    xi = np.round(x / resolution).astype('i8').view('u8')
+    yi = np.round(y / resolution).astype('i8').view('u8')
+    vertex = _mix(_mix(xi) ^ (yi * np.uint64(0x9E3779B97F4A7C15)))
+    # First occurrence of each (feature, vertex), still in feature order
+    _, distinct = np.unique(_mix(vertex ^ _mix(ids.view('u8'))), return_index=True)
+    distinct.sort()
+    _, starts, counts = np.unique(ids[distinct], return_index=True, return_counts=True)
+    keys = _mix(np.add.reduceat(vertex[distinct], starts) + counts.astype('u8'))
+    return unique, envelopes, keys.view('i8')
+
+def geojson_vertices(geometries: Sequence[dict], ids: Sequence[int] | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Flat (ids, x, y) vertex arrays of GeoJSON Polygon, MultiPolygon or LineString geometries"""
+    parts, part_ids = [], []
+    for index, geometry in zip(ids if ids is not None else range(len(geometries)), geometries):
+        coordinates = geometry['coordinates']
+        rings = {
+            'Polygon': coordinates,
+            'MultiPolygon': [ring for polygon in coordinates for ring in polygon],
+            'LineString': [coordinates],
+            'MultiLineString': coordinates,
+            'Point': [[coordinates]],
+        }[geometry['type']]
+        for ring in filter(len, rings):
+            parts.append(np.asarray(ring, dtype='f8')[:, :2])
+            part_ids.append(np.full(len(ring), index, dtype='i8'))
+    if not parts:
+        return np.zeros(0, dtype='i8'), np.zeros(0), np.zeros(0)
+    vertices = np.concatenate(parts)
+    return np.concatenate(part_ids), vertices[:, 0], vertices[:, 1]
+
+def read_shapes(
+    feature_class: str,
+    where: str | None = None,
+    resolution: float = RESOLUTION,
+    spatial_reference: arcpy.SpatialReference | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """OIDs, envelopes and shape keys of a feature class from one exploded read"""
+    vertices = arcpy.da.FeatureClassToNumPyArray(
+        feature_class, ['OID@', 'SHAPE@X', 'SHAPE@Y'], where, spatial_reference, explode_to_points=True,
+    )
+    return summarize_vertices(vertices['OID@'], vertices['SHAPE@X'], vertices['SHAPE@Y'], resolution)
+
+# Grid index
+
+def overlaps(envelopes: np.ndarray, envelope: np.ndarray) -> np.ndarray:
+    """Mask of `envelopes` that overlap (or touch) one envelope"""
+    return (
+        (envelopes[:, 0] <= envelope[2]) & (envelopes[:, 2] >= envelope[0])
+        & (envelopes[:, 1] <= envelope[3]) & (envelopes[:, 3] >= envelope[1])
+    )
+
+class GridIndex:
+    """Envelopes registered in the cells of a uniform grid (cells are stored sparsely)"""
+
+    def __init__(self, envelopes: np.ndarray, cell_size: float | None = None, max_cells: int = 64) -> None:
+        """
+        Args:
+            envelopes: (N, 4) xmin, ymin, xmax, ymax
+            cell_size: Grid cell size (default is twice the median envelope size)
+            max_cells: Envelopes covering more cells are kept in a list checked by every query
+        """
+        self.envelopes = np.asarray(envelopes, dtype='f8').reshape(-1, 4)
+        envelopes = self.envelopes
+        if not len(envelopes):
+            envelopes = np.zeros((1, 4))
+        self.origin = envelopes[:, :2].min(axis=0)
+        extent = envelopes[:, 2:].max(axis=0) - self.origin
+        if cell_size is None:
+            sizes = np.maximum(envelopes[:, 2] - envelopes[:, 0], envelopes[:, 3] - envelopes[:, 1])
+            # Keep the grid under a few cells per feature when every feature is tiny
+            cell_size = max(2 * float(np.median(sizes)), float(extent.max()) / np.sqrt(4 * len(envelopes)), 1e-9)
+        self.cell_size = cell_size
+        self.shape = np.floor(extent / cell_size).astype('i8') + 1
+
+        items, cells, large = self._cells(self.envelopes, max_cells)
+        order = np.argsort(cells, kind='stable')
+        self.items = items[order]
+        self.cells, self.starts, self.counts = np.unique(cells[order], return_index=True, return_counts=True)
+        self.large = large
+
+    def __len__(self) -> int:
+        return len(self.envelopes)
+
+    def _cell_ranges(self, envelopes: np.ndarray) -> tuple[np.ndarray, ...]:
+        low = np.floor((envelopes[:, :2] - self.origin) / self.cell_size).astype('i8')
+        high = np.floor((envelopes[:, 2:] - self.origin) / self.cell_size).astype('i8')
+        low = np.clip(low, 0, self.shape - 1)
+        high = np.clip(high, 0, self.shape - 1)
+        # Envelopes outside the grid cover no cells
+        outside = np.any(envelopes[:, 2:] < self.origin, axis=1) | np.any(envelopes[:, :2] > self.origin + self.shape * self.cell_size, axis=1)
+        high[outside] = low[outside] - 1
+        return low[:, 0], low[:, 1], high[:, 0], high[:, 1]
+
+    def _cells(self, envelopes: np.ndarray, max_cells: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Expand envelopes to (item, cell id) pairs, and the items covering more than `max_cells`"""
+        x0, y0, x1, y1 = self._cell_ranges(envelopes)
+        width = np.maximum(x1 - x0 + 1, 0)
+        counts = width * np.maximum(y1 - y0 + 1, 0)
+        items = np.arange(len(envelopes))
+        large = np.zeros(0, dtype='i8')
+        if max_cells is not None:
+            large = items[counts > max_cells]
+            counts = np.where(counts > max_cells, 0, counts)
+
+        item = np.repeat(items, counts)
+        offset = np.arange(len(item)) - np.repeat(np.cumsum(counts) - counts, counts)
+        width = np.repeat(width, counts)
+        ix = np.repeat(x0, counts) + offset % np.maximum(width, 1)
+        iy = np.repeat(y0, counts) + offset // np.maximum(width, 1)
+        return item, iy * self.shape[0] + ix, large
+
+    def query(self, envelope: Sequence[float], expand: float = 0.0) -> np.ndarray:
+        """Indexes of the envelopes overlapping one envelope"""
+        queries, targets = self.query_pairs(np.asarray(envelope, dtype='f8').reshape(1, 4), expand)
+        return targets
+
+    def query_pairs(self, envelopes: np.ndarray, expand: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
+        """Every overlapping (query, target) index pair, sorted by query
+
+        Args:
+            envelopes: (M, 4) query envelopes
+            expand: Grow the query envelopes by this distance
+        """
+        envelopes = np.asarray(envelopes, dtype='f8').reshape(-1, 4) + np.array([-expand, -expand, expand, expand])
+        pairs = [self._join(envelopes[start:start + QUERY_CHUNK], start) for start in range(0, len(envelopes), QUERY_CHUNK)]
+        for item in self.large.tolist():
+            queries = np.flatnonzero(overlaps(envelopes, self.envelopes[item]))
+            pairs.append((queries, np.full(len(queries), item, dtype='i8')))
+        if not pairs:
+            return np.zeros(0, dtype='i8'), np.zeros(0, dtype='i8')
+        queries = np.concatenate([q for q, _ in pairs])
+        targets = np.concatenate([t for _, t in pairs])
+        order = np.lexsort((targets, queries))
+        return queries[order], targets[order]
+
+    def _join(self, envelopes: np.ndarray, offset: int) -> tuple[np.ndarray, np.ndarray]:
+        query, cell, _ = self._cells(envelopes)
+        found = np.searchsorted(self.cells, cell).clip(max=max(len(self.cells) - 1, 0))
+        hit = len(self.cells) > 0
+        hit = (self.cells[found] == cell) if hit else np.zeros(len(cell), dtype=bool)
+        query, cell, found = query[hit], cell[hit], found[hit]
+
+        counts = self.counts[found]
+        position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        target = self.items[np.repeat(self.starts[found], counts) + position]
+        query = np.repeat(query, counts)
+        cell = np.repeat(cell, counts)
+
+        a, b = envelopes[query], self.envelopes[target]
+        keep = (a[:, 0] <= b[:, 2]) & (a[:, 2] >= b[:, 0]) & (a[:, 1] <= b[:, 3]) & (a[:, 3] >= b[:, 1])
+        # A pair shares several cells when both envelopes span them, only keep it in the
+        # cell holding the lower left corner of the intersection
+        corner = np.maximum(a[:, :2], b[:, :2])
+        corner_cell = np.clip(np.floor((corner - self.origin) / self.cell_size).astype('i8'), 0, self.shape - 1)
+        keep &= corner_cell[:, 1] * self.shape[0] + corner_cell[:, 0] == cell
+        return query[keep] + offset, target[keep]
+
+def brute_force_pairs(envelopes: np.ndarray, targets: np.ndarray, expand: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
+    """`GridIndex.query_pairs` by comparing every query with every target"""
+    envelopes = np.asarray(envelopes, dtype='f8').reshape(-1, 4) + np.array([-expand, -expand, expand, expand])
+    pairs = [(index, np.flatnonzero(overlaps(targets, envelope))) for index, envelope in enumerate(envelopes)]
+    return (
+        np.concatenate([np.full(len(t), q, dtype='i8') for q, t in pairs] or [np.zeros(0, dtype='i8')]),
+        np.concatenate([t for _, t in pairs] or [np.zeros(0, dtype='i8')]),
+    )
+
+# Matching
+
+def match_shapes(
+    index: GridIndex,
+    target_keys: np.ndarray,
+    envelopes: np.ndarray,
+    keys: np.ndarray,
+    tolerance: float = 1.0) -> tuple[np.ndarray, np.ndarray]:
+    """Decide whether to insert, update or skip each incoming shape
+
+    A target is a match when every envelope coordinate is within `tolerance`. A match with
+    the same shape key is a skip, otherwise the closest match is updated. Two incoming
+    shapes can match the same target.
+
+    Args:
+        index: Grid of the target envelopes
+        target_keys: Shape keys of the targets (same order as the index envelopes)
+        envelopes: (M, 4) incoming envelopes
+        keys: Incoming shape keys
+        tolerance: Largest envelope coordinate difference of a match
+
+    Returns:
+        The action of every incoming shape (INSERT, UPDATE, SKIP) and the index of its
+        matched target (-1 for inserts)
+    """
+    envelopes = np.asarray(envelopes, dtype='f8').reshape(-1, 4)
+    queries, targets = index.query_pairs(envelopes, tolerance)
+    distance = np.abs(index.envelopes[targets] - envelopes[queries]).max(axis=1)
+    near = distance <= tolerance
+    queries, targets, distance = queries[near], targets[near], distance[near]
+    same = target_keys[targets] == keys[queries]
+
+    # Per query: same shape first, then the closest envelope
+    order = np.lexsort((distance, ~same, queries))
+    queries, targets, same = queries[order], targets[order], same[order]
+    first = np.ones(len(queries), dtype=bool)
+    first[1:] = queries[1:] != queries[:-1]
+
+    actions = np.full(len(envelopes), INSERT, dtype='i1')
+    matches = np.full(len(envelopes), -1, dtype='i8')
+    actions[queries[first]] = np.where(same[first], SKIP, UPDATE)
+    matches[queries[first]] = targets[first]
+    return actions, matches
+
+# Benchmark
+
+def synthetic_envelopes(count: int, extent: float = 100_000.0, size: float = 50.0, seed: int | None = None) -> np.ndarray:
+    """Random envelopes with log normal sizes around `size`"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, extent, (count, 2))
+    half = rng.lognormal(np.log(size / 2), 0.5, (count, 2))
+    return np.column_stack([centers - half, centers + half])
+
+def benchmark(count: int = 1_000_000, sample: int = 2_000, tolerance: float = 1.0) -> None:
+    from time import perf_counter
+
+    rng = np.random.default_rng(42)
+    targets = synthetic_envelopes(count, seed=1)
+    target_keys = rng.integers(-2**63, 2**63 - 1, count, dtype='i8')
+
+    # Incoming: 40% unchanged, 30% moved within the tolerance, 30% new
+    incoming = synthetic_envelopes(count, seed=2)
+    keys = rng.integers(-2**63, 2**63 - 1, count, dtype='i8')
+    kind = rng.random(count)
+    source = rng.integers(0, count, count)
+    same, moved = kind < 0.4, (kind >= 0.4) & (kind < 0.7)
+    incoming[same] = targets[source[same]]
+    keys[same] = target_keys[source[same]]
+    incoming[moved] = targets[source[moved]] + rng.uniform(-tolerance / 2, tolerance / 2, (int(moved.sum()), 4))
+
+    start = perf_counter()
+    index = GridIndex(targets)
+    built = perf_counter() - start
+    print(f"Grid of {count:,} envelopes: {built:.2f} seconds, cell size {index.cell_size:.1f}, {len(index.cells):,} cells, {len(index.large)} large")
+
+    start = perf_counter()
+    actions, matches = match_shapes(index, target_keys, incoming, keys, tolerance)
+    matched = perf_counter() - start
+    counts = {ACTION_NAMES[action]: int((actions == action).sum()) for action in ACTION_NAMES}
+    print(f"Matched {count:,} incoming shapes: {matched:.2f} seconds, {counts}")
+    assert np.all(actions[same] == SKIP)
+    assert np.all(matches[same] == source[same]) or np.all(target_keys[matches[same]] == keys[same])
+    assert np.all(actions[moved] != INSERT)
+
+    # Brute force on a sample, extrapolated to every incoming shape
+    queries = rng.choice(count, sample, replace=False)
+    start = perf_counter()
+    brute_q, brute_t = brute_force_pairs(incoming[queries], targets, tolerance)
+    brute = (perf_counter() - start) * count / sample
+    grid_q, grid_t = index.query_pairs(incoming[queries], tolerance)
+    assert np.array_equal(grid_q, brute_q) and np.array_equal(grid_t, brute_t)
+    print(f"Brute force: {brute:.0f} seconds estimated from {sample:,} queries ({brute / (built + matched):,.0f}x slower), same candidate pairs")
+
+if __name__ == '__main__':
+    import sys
+    benchmark(int(sys.argv[1]) if sys.argv[1:] else 1_000_000)
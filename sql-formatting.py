@@ -9,79 +9,646 @@ Usage:
     ...    return_geometry=False).features
     
     >>> query
-    SQLQuery(self.field='inspection_number', self.comparisons=set())
+    SQLQuery(self.field='inspection_number', self.comparisons=())
     
     >>> (query + 'Ad-hoc Inspection').exclusive
     "inspection_number <> 'Ad-hoc Inspection'"
     
-    >>> (query + 'Ad-hoc Inspection' + 'Other').exclusive
+    >>> (query + 'Other' + 'Ad-hoc Inspection').exclusive
     "inspection_number NOT IN ('Ad-hoc Inspection','Other')"
     
     >>> (query + 'Ad-hoc Inspection' + 'Other').inclusive
     "inspection_number IN ('Ad-hoc Inspection','Other')"
+    
+    >>> (query + "O'Brien").inclusive
+    "inspection_number = 'O''Brien'"
+
+Queries are immutable, `+`, `append` and `extend` return a new query. Adding to the 
+newest version of a query is O(1), so building a query one value at a time is linear.
+Values render in sorted order (numbers then strings) so equal queries give equal strings.
+
+Batching:
+    Large comparison sets go over service and database where clause limits, use
+    `batches` to split them into bounded clauses (contiguous integers become BETWEEN)
+    
+    >>> ids = SQLQuery('objectid', [1, 2, 3, 4, 10, 12])
+    >>> list(ids.batches(max_terms=2))
+    ['objectid BETWEEN 1 AND 4', 'objectid IN (10,12)']
+    
+    >>> features = run_batches(ids, lambda where: fs1_layer.query(where=where).features)
+
+Expressions:
+    Compound filters are built from `In`, `Range`, `IsNull`, `Like` and `&`, `|`, `~`.
+    `render` simplifies the tree (merging INs on a field, dropping `1 = 1`) and formats 
+    it for the 'fgdb', 'enterprise' or 'service' dialect, `mask` evaluates it locally.
+    
+    >>> expr = ids.expression() | In('objectid', [20]) & TRUE | IsNull('status')
+    >>> expr.render()
+    'objectid IN (1,2,3,4,10,12,20) OR status IS NULL'
+    
+    >>> df[expr.mask(df)]
 """
 
 from __future__ import annotations
 
+import operator
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from functools import cached_property, lru_cache, reduce
+from itertools import chain
+from math import isfinite
+from numbers import Number
+from typing import Any, Callable, Generator, Iterable
+
+Comparison = str | int | float | Decimal
+
+class _Log:
+    """Append only value log shared by every query built from the same base
+    
+    A query is a prefix of a log (`_length` values), so adding a value to the newest 
+    query appends in place. Adding to an older query copies its prefix into a new log.
+    """
+    __slots__ = ('values', 'index')
+    
+    def __init__(self, values: Iterable[Comparison] = ()):
+        self.values: list[Comparison] = []
+        self.index: dict[Comparison, int] = {}
+        for value in values:
+            if value not in self.index:
+                self.index[value] = len(self.values)
+                self.values.append(value)
+
 class SQLQuery:
-    def __init__(self, field: str, comparisons: set=None):
+    def __init__(self, field: str, comparisons: Iterable[Comparison] = ()):
         self.field = field
         if ' ' in field:
-            self.field = f'"{field}"' # Wrap spaced field in ""
-        self.comparisons = comparisons
-        if not comparisons:
-            self.comparisons = set() # initialize empty set
-    
-    def _guard(self, value: str | int | float) -> str | int | float | None:
-        """Reject any non standard inputs, add single quotes to strings
-        NOTE: This does not sanitize the input! Someone could still inject SQL queries
-        into a string value.
+            self.field = '"{}"'.format(field.replace('"', '""')) # Wrap spaced field in ""
+        self._log = _Log(map(self._guard, comparisons))
+        self._length = len(self._log.values)
+    
+    @classmethod
+    def _from_log(cls, field: str, log: _Log, length: int) -> SQLQuery:
+        query = cls.__new__(cls)
+        query.field, query._log, query._length = field, log, length
+        return query
+    
+    @staticmethod
+    def _guard(value: Comparison) -> Comparison:
+        """Reject any non standard inputs and give equal numbers one canonical value
+        
+        NumPy scalars become the Python value, integral floats and Decimals become ints 
+        and other Decimals become the equal float (or their normalized form), so equal 
+        queries render equal strings (1.0 and 1 are both 1, Decimal('2.50') is 2.5).
         """
-        if isinstance(value, str):
-            value = f"'{value}'"
-        elif not isinstance(value, int | float):
-            raise ValueError(f"Invalid Comparison {value}, must be str | int | float")
-        if value in self.comparisons:
-            value = None
+        if not isinstance(value, str) and hasattr(value, 'item'):
+            value = value.item()
+        if isinstance(value, bool) or not isinstance(value, str | int | float | Decimal):
+            raise ValueError(f"Invalid Comparison {value}, must be str | int | float | Decimal")
+        if isinstance(value, float | Decimal) and not isfinite(value):
+            raise ValueError(f"Invalid Comparison {value}, must be a finite number")
+        if isinstance(value, float | Decimal):
+            if value == int(value):
+                return int(value)
+            if isinstance(value, Decimal):
+                return float(value) if float(value) == value else value.normalize()
         return value
-               
-    def __add__(self, value: str | int | float) -> SQLQuery:
-        comps = set(self.comparisons)
-        comps.add(self._guard(value))
-        return SQLQuery(self.field, comps)
     
-    def __sub__(self, value: str | int | float) -> SQLQuery:
-        comps = set(self.comparisons)
-        comps.remove(self._guard(value))
-        return SQLQuery(self.field, comps)
+    @staticmethod
+    def _literal(value: Comparison) -> str:
+        """Render a value as a SQL literal, single quotes in strings are escaped by doubling"""
+        if isinstance(value, str):
+            return "'{}'".format(value.replace("'", "''"))
+        # repr of a NumPy scalar is np.float64(1.5) and of a Decimal is Decimal('1.5')
+        if hasattr(value, 'item'):
+            value = value.item()
+        return str(value)
+    
+    @staticmethod
+    def _sort_key(value: Comparison) -> tuple[bool, Comparison]:
+        return (isinstance(value, str), value)
+    
+    @property
+    def comparisons(self) -> tuple[Comparison, ...]:
+        """The comparison values in the order they were added"""
+        return tuple(self._log.values[:self._length])
     
-    def append(self, value: str | int | float) -> None:
-        self.comparisons.add(self._guard(value))
+    def __contains__(self, value: Comparison) -> bool:
+        index = self._log.index.get(value)
+        return index is not None and index < self._length
     
-    def extend(self, comparisons: list) -> None:
+    def __len__(self) -> int:
+        return self._length
+    
+    def __add__(self, value: Comparison) -> SQLQuery:
+        value = self._guard(value)
+        if value in self:
+            return self
+        
+        log = self._log
+        if self._length != len(log.values):
+            # Another query already appended to this log, branch off a copy
+            log = _Log(log.values[:self._length])
+        log.index[value] = len(log.values)
+        log.values.append(value)
+        return self._from_log(self.field, log, self._length + 1)
+    
+    def __sub__(self, value: Comparison) -> SQLQuery:
+        value = self._guard(value)
+        if value not in self:
+            raise KeyError(value)
+        return self._from_log(
+            self.field, 
+            _Log(v for v in self.comparisons if v != value),
+            self._length - 1,
+        )
+    
+    def append(self, value: Comparison) -> SQLQuery:
+        return self + value
+    
+    def extend(self, comparisons: Iterable[Comparison]) -> SQLQuery:
+        query = self
         for value in comparisons:
-            self.comparisons.add(self._guard(value))
+            query += value
+        return query
+    
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SQLQuery):
+            return NotImplemented
+        return self.field == other.field and self._sorted == other._sorted
+    
+    def __hash__(self) -> int:
+        return hash((self.field, self._sorted))
     
     def __repr__(self) -> str:
         return f"SQLQuery({self.field=}, {self.comparisons=})"
     
+    @cached_property
+    def _sorted(self) -> tuple[Comparison, ...]:
+        return tuple(sorted(self.comparisons, key=self._sort_key))
+    
     def _compare(self, inclusive: bool):
         # No comparison returns all
-        if not self.comparisons:
+        if not self._length:
             return "1 = 1"
         
         # Use single op for one comparison
-        if len(self.comparisons) == 1:
-            return f"{self.field} {'=' if inclusive else '<>'} {list(self.comparisons)[0]}"
+        if self._length == 1:
+            return f"{self.field} {'=' if inclusive else '<>'} {self._literal(self._sorted[0])}"
         
         # Use IN operator for multiple comparisons
-        if len(self.comparisons) > 1:
-            return f"{self.field} {'IN' if inclusive else 'NOT IN'} ({','.join(map(str, self.comparisons))})"
-        
-    @property
+        return f"{self.field} {'IN' if inclusive else 'NOT IN'} ({','.join(map(self._literal, self._sorted))})"
+    
+    @cached_property
     def inclusive(self) -> str:
         return self._compare(inclusive=True)
     
-    @property
+    @cached_property
     def exclusive(self) -> str:
-        return self._compare(inclusive=False)
\ No newline at end of file
+        return self._compare(inclusive=False)
+    
+    def expression(self, inclusive: bool = True) -> In:
+        """The query as an `In` expression node for composing with other filters"""
+        field = self.field
+        if field.startswith('"'):
+            field = field[1:-1].replace('""', '"')
+        return In(field, self.comparisons, negate=not inclusive)
+    
+    def _runs(self, min_run: int) -> tuple[list[tuple[int, int]], list[Comparison]]:
+        """Split comparisons into contiguous integer runs and remaining single values"""
+        ints = [value for value in self._sorted if isinstance(value, int)]
+        others = [value for value in self._sorted if not isinstance(value, int)]
+        
+        runs: list[tuple[int, int]] = []
+        singles: list[Comparison] = []
+        start = 0
+        for end in range(1, len(ints) + 1):
+            # Close the run at the end of the list or when the next value skips
+            if end < len(ints) and ints[end] == ints[end-1] + 1:
+                continue
+            if end - start >= min_run:
+                runs.append((ints[start], ints[end-1]))
+            else:
+                singles.extend(ints[start:end])
+            start = end
+        
+        return runs, sorted(singles + others, key=self._sort_key)
+    
+    def batches(self, max_terms: int = 1000, min_run: int = 3) -> Generator[str, None, None]:
+        """Yield inclusive where clauses that each hold at most `max_terms` terms
+        
+        Running every clause and concatenating the results is the same as running
+        `inclusive`. Exclusive filters can't be split into independent queries.
+        
+        Args:
+            max_terms: The maximum number of values or ranges in a clause (default 1000, the Oracle IN limit)
+            min_run: The shortest run of contiguous integers to collapse into BETWEEN (default 3)
+        """
+        if not self._length:
+            yield self.inclusive
+            return
+        
+        runs, singles = self._runs(min_run)
+        parts: list[tuple[str, int]] = [
+            (f"{self.field} BETWEEN {low} AND {high}", 1)
+            for low, high in runs
+        ]
+        for i in range(0, len(singles), max_terms):
+            chunk = singles[i:i+max_terms]
+            if len(chunk) == 1:
+                parts.append((f"{self.field} = {self._literal(chunk[0])}", 1))
+            else:
+                parts.append((f"{self.field} IN ({','.join(map(self._literal, chunk))})", len(chunk)))
+        
+        batch: list[str] = []
+        size = 0
+        for part, cost in parts:
+            if batch and size + cost > max_terms:
+                yield self._join(batch)
+                batch, size = [], 0
+            batch.append(part)
+            size += cost
+        if batch:
+            yield self._join(batch)
+    
+    @staticmethod
+    def _join(parts: list[str]) -> str:
+        return parts[0] if len(parts) == 1 else f"({' OR '.join(parts)})"
+
+def run_batches(
+    query: SQLQuery, 
+    query_function: Callable[[str], Iterable[Any]], 
+    *, 
+    max_terms: int = 1000, 
+    workers: int = 4,
+    combine: Callable[[list[Any]], Any] = lambda results: list(chain.from_iterable(results))) -> Any:
+    """Run each batch of a query through `query_function` concurrently and combine the results
+    
+    Args:
+        query: The query to split with `SQLQuery.batches`
+        query_function: Called with each where clause (e.g. `lambda where: layer.query(where=where).features`)
+        max_terms: Passed to `SQLQuery.batches`
+        workers: The number of concurrent queries (default 4)
+        combine: Joins the list of batch results in batch order (default concatenates lists, use `pandas.concat` for DataFrames)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return combine(list(pool.map(query_function, query.batches(max_terms))))
+
+# Expressions
+# SQLQuery only covers one field IN / NOT IN a set. Compound filters are built as a
+# tree of frozen nodes that can be simplified, rendered for a dialect, or evaluated
+# locally against a table as a boolean mask.
+
+@dataclass(frozen=True)
+class Dialect:
+    """Rendering differences between where clause targets"""
+    name: str
+    date: str
+    true: str = "1 = 1"
+    false: str = "1 = 0"
+    
+    def field(self, name: str) -> str:
+        if name.isidentifier():
+            return name
+        return '"{}"'.format(name.replace('"', '""'))
+    
+    def literal(self, value: Comparison | datetime) -> str:
+        if isinstance(value, datetime):
+            return self.date.format(value)
+        return SQLQuery._literal(value)
+
+DIALECTS: dict[str, Dialect] = {
+    'fgdb': Dialect('fgdb', date="date '{:%Y-%m-%d %H:%M:%S}'"),
+    'enterprise': Dialect('enterprise', date="TIMESTAMP '{:%Y-%m-%d %H:%M:%S}'"),
+    'service': Dialect('service', date="timestamp '{:%Y-%m-%d %H:%M:%S}'", true="1=1", false="1=0"),
+}
+
+class Expr:
+    """Base expression node, combine with `&`, `|` and `~`"""
+    def __and__(self, other: Expr) -> Expr:
+        return And((self, other))
+    
+    def __or__(self, other: Expr) -> Expr:
+        return Or((self, other))
+    
+    def __invert__(self) -> Expr:
+        return Not(self)
+    
+    def render(self, dialect: str = 'fgdb') -> str:
+        return _compile(self, DIALECTS[dialect])
+    
+    def simplify(self) -> Expr:
+        return self
+    
+    def mask(self, table: Any) -> Any:
+        """Evaluate the expression over a DataFrame, structured array or dict of columns
+        
+        Rows where the result is unknown (a comparison against NULL) are excluded like 
+        they would be by the database.
+        """
+        return self.simplify()._eval(table)[0]
+    
+    def _sql(self, dialect: Dialect) -> str:
+        raise NotImplementedError
+    
+    def _eval(self, table: Any) -> tuple[Any, Any]:
+        """Return (true, unknown) boolean arrays (SQL three valued logic)"""
+        raise NotImplementedError
+
+@lru_cache(maxsize=1024)
+def _render(expr: Expr, dialect: Dialect) -> str:
+    return expr._sql(dialect)
+
+@lru_cache(maxsize=1024)
+def _compile(expr: Expr, dialect: Dialect) -> str:
+    return _render(expr.simplify(), dialect)
+
+def _column(table: Any, field: str) -> Any:
+    import numpy as np
+    return np.asarray(table[field])
+
+def _is_null(column: Any) -> Any:
+    import numpy as np
+    if column.dtype.kind in 'fc':
+        return np.isnan(column)
+    if column.dtype.kind == 'M':
+        return np.isnat(column)
+    if column.dtype.kind == 'O':
+        return np.fromiter((v is None or v != v for v in column), dtype=bool, count=len(column))
+    return np.zeros(len(column), dtype=bool)
+
+def _rows(table: Any) -> int:
+    return len(table) if not isinstance(table, dict) else len(next(iter(table.values())))
+
+@dataclass(frozen=True)
+class Const(Expr):
+    value: bool
+    
+    def _sql(self, dialect: Dialect) -> str:
+        return dialect.true if self.value else dialect.false
+    
+    def _eval(self, table: Any) -> tuple[Any, Any]:
+        import numpy as np
+        rows = _rows(table)
+        return np.full(rows, self.value), np.zeros(rows, dtype=bool)
+
+TRUE = Const(True)
+FALSE = Const(False)
+
+@dataclass(frozen=True)
+class In(Expr):
+    field: str
+    values: frozenset[Comparison]
+    negate: bool = False
+    
+    def __init__(self, field: str, values: Iterable[Comparison], negate: bool = False):
+        object.__setattr__(self, 'field', field)
+        object.__setattr__(self, 'values', frozenset(map(SQLQuery._guard, values)))
+        object.__setattr__(self, 'negate', negate)
+    
+    def simplify(self) -> Expr:
+        if not self.values:
+            return TRUE if self.negate else FALSE
+        return self
+    
+    def _sql(self, dialect: Dialect) -> str:
+        values = sorted(self.values, key=SQLQuery._sort_key)
+        if len(values) == 1:
+            return f"{dialect.field(self.field)} {'<>' if self.negate else '='} {dialect.literal(values[0])}"
+        return f"{dialect.field(self.field)} {'NOT IN' if self.negate else 'IN'} ({','.join(map(dialect.literal, values))})"
+    
+    def _eval(self, table: Any) -> tuple[Any, Any]:
+        import numpy as np
+        column = _column(table, self.field)
+        null = _is_null(column)
+        hit = np.zeros(len(column), dtype=bool)
+        hit[~null] = np.isin(column[~null], list(self.values))
+        return (~hit if self.negate else hit) & ~null, null
+
+@dataclass(frozen=True)
+class Range(Expr):
+    """`low <= field <= high`, either bound can be None"""
+    field: str
+    low: Comparison | datetime | None = None
+    high: Comparison | datetime | None = None
+    
+    def __post_init__(self) -> None:
+        # Expressions are cache keys, equal bounds (1 and 1.0) must render the same
+        for bound in ('low', 'high'):
+            value = getattr(self, bound)
+            if isinstance(value, str | Number):
+                object.__setattr__(self, bound, SQLQuery._guard(value))
+    
+    def simplify(self) -> Expr:
+        if self.low is None and self.high is None:
+            return IsNull(self.field, negate=True)
+        if self.low is not None and self.high is not None and self.low > self.high:
+            return FALSE
+        return self
+    
+    def _sql(self, dialect: Dialect) -> str:
+        field = dialect.field(self.field)
+        if self.high is None:
+            return f"{field} >= {dialect.literal(self.low)}"
+        if self.low is None:
+            return f"{field} <= {dialect.literal(self.high)}"
+        return f"{field} BETWEEN {dialect.literal(self.low)} AND {dialect.literal(self.high)}"
+    
+    def _eval(self, table: Any) -> tuple[Any, Any]:
+        import numpy as np
+        column = _column(table, self.field)
+        null = _is_null(column)
+        values = column[~null]
+        in_range = np.ones(len(values), dtype=bool)
+        if self.low is not None:
+            in_range &= values >= self.low
+        if self.high is not None:
+            in_range &= values <= self.high
+        hit = np.zeros(len(column), dtype=bool)
+        hit[~null] = in_range
+        return hit, null
+
+@dataclass(frozen=True)
+class IsNull(Expr):
+    field: str
+    negate: bool = False
+    
+    def _sql(self, dialect: Dialect) -> str:
+        return f"{dialect.field(self.field)} IS {'NOT ' if self.negate else ''}NULL"
+    
+    def _eval(self, table: Any) -> tuple[Any, Any]:
+        import numpy as np
+        null = _is_null(_column(table, self.field))
+        return (~null if self.negate else null), np.zeros(len(null), dtype=bool)
+
+@dataclass(frozen=True)
+class Like(Expr):
+    """SQL LIKE, `%` matches any run of characters and `_` matches one character"""
+    field: str
+    pattern: str
+    negate: bool = False
+    
+    def _sql(self, dialect: Dialect) -> str:
+        return f"{dialect.field(self.field)} {'NOT LIKE' if self.negate else 'LIKE'} {dialect.literal(self.pattern)}"
+    
+    def _eval(self, table: Any) -> tuple[Any, Any]:
+        import numpy as np
+        regex = re.compile(''.join(
+            '.*' if char == '%' else '.' if char == '_' else re.escape(char)
+            for char in self.pattern
+        ), re.DOTALL)
+        column = _column(table, self.field)
+        null = _is_null(column)
+        hit = np.fromiter(
+            (isinstance(v, str) and regex.fullmatch(v) is not None for v in column.tolist()),
+            dtype=bool, count=len(column),
+        )
+        return (~hit if self.negate else hit) & ~null, null
+
+@dataclass(frozen=True)
+class Not(Expr):
+    expr: Expr
+    
+    def simplify(self) -> Expr:
+        expr = self.expr.simplify()
+        match expr:
+            case Const(value):
+                return Const(not value)
+            case Not(inner):
+                return inner
+            case In(field, values, negate):
+                return In(field, values, not negate)
+            case IsNull(field, negate):
+                return IsNull(field, not negate)
+            case Like(field, pattern, negate):
+                return Like(field, pattern, not negate)
+        return Not(expr)
+    
+    def _sql(self, dialect: Dialect) -> str:
+        return f"NOT ({_render(self.expr, dialect)})"
+    
+    def _eval(self, table: Any) -> tuple[Any, Any]:
+        true, unknown = self.expr._eval(table)
+        return ~(true | unknown), unknown
+
+@dataclass(frozen=True)
+class _Junction(Expr):
+    exprs: tuple[Expr, ...]
+    
+    # Overridden by And/Or
+    _identity = TRUE
+    _absorbing = FALSE
+    _keyword = 'AND'
+    
+    def simplify(self) -> Expr:
+        cls = type(self)
+        exprs: list[Expr] = []
+        for expr in (expr.simplify() for expr in self.exprs):
+            if expr == self._absorbing:
+                return self._absorbing
+            if expr == self._identity:
+                continue
+            # Flatten nested junctions of the same kind
+            exprs.extend(expr.exprs if isinstance(expr, cls) else (expr,))
+        
+        exprs = [expr for expr in self._merge(exprs) if expr != self._identity]
+        if self._absorbing in exprs:
+            return self._absorbing
+        
+        # Drop duplicates, sort for a deterministic rendering
+        exprs = sorted(set(exprs), key=lambda expr: _render(expr, DIALECTS['fgdb']))
+        if not exprs:
+            return self._identity
+        if len(exprs) == 1:
+            return exprs[0]
+        return cls(tuple(exprs))
+    
+    def _merge(self, exprs: list[Expr]) -> list[Expr]:
+        return exprs
+    
+    def _sql(self, dialect: Dialect) -> str:
+        return f" {self._keyword} ".join(
+            f"({_render(expr, dialect)})" if isinstance(expr, _Junction) else _render(expr, dialect)
+            for expr in self.exprs
+        )
+
+class And(_Junction):
+    _identity = TRUE
+    _absorbing = FALSE
+    _keyword = 'AND'
+    
+    def _merge(self, exprs: list[Expr]) -> list[Expr]:
+        """Intersect positive INs on the same field, union NOT INs"""
+        merged: dict[tuple[str, bool], In] = {}
+        rest: list[Expr] = []
+        for expr in exprs:
+            if not isinstance(expr, In):
+                rest.append(expr)
+                continue
+            key = (expr.field, expr.negate)
+            if key in merged:
+                values = merged[key].values | expr.values if expr.negate else merged[key].values & expr.values
+                expr = In(expr.field, values, expr.negate)
+            merged[key] = expr
+        return rest + [expr.simplify() for expr in merged.values()]
+    
+    def _eval(self, table: Any) -> tuple[Any, Any]:
+        results = [expr._eval(table) for expr in self.exprs]
+        true = reduce(operator.and_, (t for t, _ in results))
+        possible = reduce(operator.and_, (t | u for t, u in results))
+        return true, possible & ~true
+
+class Or(_Junction):
+    _identity = FALSE
+    _absorbing = TRUE
+    _keyword = 'OR'
+    
+    def _merge(self, exprs: list[Expr]) -> list[Expr]:
+        """Union positive INs on the same field"""
+        merged: dict[str, In] = {}
+        rest: list[Expr] = []
+        for expr in exprs:
+            if not isinstance(expr, In) or expr.negate:
+                rest.append(expr)
+                continue
+            if expr.field in merged:
+                expr = In(expr.field, merged[expr.field].values | expr.values)
+            merged[expr.field] = expr
+        return rest + list(merged.values())
+    
+    def _eval(self, table: Any) -> tuple[Any, Any]:
+        results = [expr._eval(table) for expr in self.exprs]
+        true = reduce(operator.or_, (t for t, _ in results))
+        unknown = reduce(operator.or_, (u for _, u in results))
+        return true, unknown & ~true
+
+if __name__ == '__main__':
+    import numpy as np
+
+    # NumPy scalars and Decimals render as plain SQL numbers
+    values = [np.float64(1.5), np.int64(3), np.int32(4), Decimal('2.50'), np.str_("O'Brien")]
+    query = SQLQuery('value', values)
+    assert query.inclusive == "value IN (1.5,2.5,3,4,'O''Brien')", query.inclusive
+    assert all(type(value) is not np.int64 for value in query.comparisons)
+    assert list(SQLQuery('objectid', np.arange(1, 5)).batches()) == ['objectid BETWEEN 1 AND 4']
+    assert (query + 3).inclusive == query.inclusive and (query + Decimal('1.5')).inclusive == query.inclusive
+    assert Range('value', np.float64(0.25), Decimal('10')).render() == 'value BETWEEN 0.25 AND 10'
+    assert In('value', [np.float64(2.0), Decimal('0.1')]).render() == 'value IN (0.1,2)'
+
+    # Equal queries give equal strings whatever numeric type the values came in as
+    for a, b in (([1.0], [1]), ([Decimal('2.50')], [2.5]), ([Decimal('0.1')], [Decimal('0.100')]), ([2 ** -30], [Decimal(2 ** -30)])):
+        assert SQLQuery('v', a) == SQLQuery('v', b) and SQLQuery('v', a).inclusive == SQLQuery('v', b).inclusive, (a, b)
+    assert SQLQuery('v', [Decimal('0.1')]).inclusive == 'v = 0.1' and SQLQuery('v', [0.1]) != SQLQuery('v', [Decimal('0.1')])
+    for invalid in (np.float64('nan'), Decimal('Infinity'), np.bool_(True)):
+        try:
+            SQLQuery('value', [invalid])
+        except ValueError:
+            continue
+        raise AssertionError(f"{invalid!r} was accepted")
+
+    # Rendering is cached by expression, equal expressions render the same in any order
+    for first, second in ((In('v', [1.0]), In('v', [1])), (Range('v', Decimal('2.50')), Range('v', 2.5)), (Range('v', 1, 2.0), Range('v', 1.0, 2))):
+        assert first == second and first.render() == second.render(), (first.render(), second.render())
+    print("numeric literals render as SQL")
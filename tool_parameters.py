@@ -1,4 +1,163 @@
-from arcpy import Parameter
+"""Python toolbox template with cached, incremental validation
+
+`updateParameters` and `updateMessages` are called by the framework on every change
+in the tool dialog. Expensive lookups (Describe, field and domain lists) are memoised
+with `lru_cache` until the dataset changes, and validators only run when one of their
+input parameters changed since the last validation (`hasBeenValidated` is False).
+Message validators return their messages, which are cached by input values and
+re-applied on every call (internal validation clears them). arcpy is only imported
+where it is used.
+
+Usage:
+    class MyTool:
+        @validator('input_features')
+        def _populate_fields(self, params):
+            params['field'].filter.list = [name for name, *_ in list_fields(params['input_features'].valueAsText)]
+
+        def updateParameters(self, parameters):
+            run_validators(self, parameters)
+"""
+
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Literal
+
+if TYPE_CHECKING:
+    from arcpy import Parameter
+
+Phase = Literal['parameters', 'messages']
+# (parameter name, 'error' | 'warning', message)
+Message = tuple[str, Literal['error', 'warning'], str]
+
+# Lookups
+# Keyed by the dataset path and its modification stamp: changing a value and changing
+# it back is free, and a field or domain added to a file geodatabase or shapefile while
+# the dialog is open shows up on the next validation. Other sources (enterprise
+# geodatabases, services) can change without a local file changing, they aren't cached.
+
+@lru_cache(maxsize=64)
+def catalog_path(data: str) -> str:
+    """The dataset path of a parameter value (a layer name or a path)"""
+    from arcpy import Describe
+    return Describe(data).catalogPath
+
+def modified(path: str) -> float | None:
+    """Newest file time of the file geodatabase or shapefile at `path`, None for other sources"""
+    folder = path
+    while folder and not folder.lower().endswith('.gdb'):
+        parent = os.path.dirname(folder)
+        folder = parent if parent != folder else ''
+    prefix = ''
+    if not folder:
+        if not path.lower().endswith('.shp'):
+            return None
+        # The .shp, .dbf, .prj... of the shapefile
+        folder, prefix = os.path.dirname(path), os.path.basename(path)[:-3]
+    try:
+        with os.scandir(folder) as entries:
+            return max((entry.stat().st_mtime for entry in entries if entry.name.startswith(prefix)), default=0.0)
+    except OSError:
+        return None
+
+_stamps: dict[str, float] = {}
+
+def _lookup(cached: Callable, path: str) -> Any:
+    stamp = modified(path)
+    if stamp is not None and _stamps.setdefault(path, stamp) != stamp:
+        # Cached messages may be based on the old state of the dataset
+        _stamps[path] = stamp
+        _message_cache.clear()
+    return cached.__wrapped__(path, None) if stamp is None else cached(path, stamp)
+
+@lru_cache(maxsize=32)
+def _describe(path: str, stamp: float | None) -> dict[str, Any]:
+    from arcpy import Describe
+    desc = Describe(path)
+    return {
+        'dataType': desc.dataType,
+        'catalogPath': desc.catalogPath,
+        'workspace': desc.path,
+        'shapeType': getattr(desc, 'shapeType', None),
+    }
+
+@lru_cache(maxsize=32)
+def _list_fields(path: str, stamp: float | None) -> tuple[tuple[str, str, str], ...]:
+    from arcpy import ListFields
+    return tuple((field.name, field.type, field.domain) for field in ListFields(path))
+
+@lru_cache(maxsize=8)
+def _list_domains(workspace: str, stamp: float | None) -> dict[str, tuple[str, ...]]:
+    from arcpy.da import ListDomains
+    return {
+        domain.name: tuple(map(str, domain.codedValues or ()))
+        for domain in ListDomains(workspace)
+    }
+
+def describe(data: str) -> dict[str, Any]:
+    return _lookup(_describe, catalog_path(data))
+
+def list_fields(data: str) -> tuple[tuple[str, str, str], ...]:
+    """(name, type, domain) for every field"""
+    return _lookup(_list_fields, catalog_path(data))
+
+def list_domains(workspace: str) -> dict[str, tuple[str, ...]]:
+    """Coded values by domain name (range domains have no codes)"""
+    return _lookup(_list_domains, workspace)
+
+def clear_caches() -> None:
+    for lookup in (catalog_path, _describe, _list_fields, _list_domains):
+        lookup.cache_clear()
+    _stamps.clear()
+    _message_cache.clear()
+
+# Validators
+
+def validator(*inputs: str, phase: Phase = 'parameters') -> Callable[[Callable], Callable]:
+    """Register a tool method as a validator of its input parameters
+
+    A 'parameters' validator updates parameters in place, a 'messages' validator
+    returns a list of (parameter name, 'error' | 'warning', message).
+    """
+    def decorator(func: Callable) -> Callable:
+        func._validates = (inputs, phase)
+        return func
+    return decorator
+
+_message_cache: dict[tuple, list[Message]] = {}
+
+def run_validators(tool: object, parameters: list[Parameter], phase: Phase = 'parameters') -> list[str]:
+    """Run the validators of a tool whose inputs changed
+
+    Returns:
+        The names of the validators that ran (message validators with cached results don't count)
+    """
+    params = {param.name: param for param in parameters}
+    ran = []
+    for name in dir(type(tool)):
+        func = getattr(type(tool), name)
+        inputs, validator_phase = getattr(func, '_validates', ((), None))
+        if validator_phase != phase:
+            continue
+
+        if phase == 'parameters':
+            if all(params[i].hasBeenValidated for i in inputs):
+                continue
+            func(tool, params)
+            ran.append(name)
+            continue
+
+        key = (type(tool).__qualname__, name, tuple(params[i].valueAsText for i in inputs))
+        if key not in _message_cache:
+            _message_cache[key] = func(tool, params)
+            ran.append(name)
+        for param_name, level, message in _message_cache[key]:
+            if level == 'error':
+                params[param_name].setErrorMessage(message)
+            else:
+                params[param_name].setWarningMessage(message)
+    return ran
 
 class MyToolbox:
     def __init__(self):
@@ -11,31 +170,174 @@ class MyTool:
         self.category = "Tool Category"
         self.description = "Tool Description"
         self.label = "Tool Name"
-        
+
     def getParameterInfo(self) -> list[Parameter]:
+        from arcpy import Parameter
         p1 = Parameter(
             displayName="Input Features",
             name="input_features",
             datatype="GPFeatureLayer",
             parameterType="Required",
             direction="Input")
-        return [p1]
-    
+        p2 = Parameter(
+            displayName="Domain Field",
+            name="field",
+            datatype="GPString",
+            parameterType="Required",
+            direction="Input")
+        p2.filter.type = "ValueList"
+        p3 = Parameter(
+            displayName="Value",
+            name="value",
+            datatype="GPString",
+            parameterType="Required",
+            direction="Input")
+        p3.filter.type = "ValueList"
+        return [p1, p2, p3]
+
     def isLicensed(self) -> bool:
         return True
-    
+
+    @validator('input_features')
+    def _field_choices(self, params: dict[str, Parameter]) -> None:
+        """Only fields with a domain can be picked"""
+        features = params['input_features'].valueAsText
+        params['field'].filter.list = [name for name, _, domain in list_fields(features) if domain] if features else []
+
+    @validator('input_features', 'field')
+    def _value_choices(self, params: dict[str, Parameter]) -> None:
+        features, field = params['input_features'].valueAsText, params['field'].valueAsText
+        if not (features and field):
+            params['value'].filter.list = []
+            return
+        domain = {name: domain for name, _, domain in list_fields(features)}.get(field)
+        params['value'].filter.list = list(list_domains(describe(features)['workspace']).get(domain, ()))
+
+    @validator('input_features', 'field', phase='messages')
+    def _check_field(self, params: dict[str, Parameter]) -> list[Message]:
+        features, field = params['input_features'].valueAsText, params['field'].valueAsText
+        if not (features and field):
+            return []
+        domain = {name: domain for name, _, domain in list_fields(features)}.get(field)
+        if domain and not list_domains(describe(features)['workspace']).get(domain):
+            return [('field', 'warning', f"Domain {domain} has no coded values")]
+        return []
+
     def updateParameters(self, parameters: list[Parameter]) -> None:
         """Modify the values and properties of parameters before internal validation is performed"""
-        ...
-    
+        run_validators(self, parameters, 'parameters')
+
     def updateMessages(self, parameters) -> None:
         """Modify or update messages created by internal validation"""
-        ...
+        run_validators(self, parameters, 'messages')
 
     def execute(self, parameters: list[Parameter], messages: list) -> None:
         """The main tool script"""
+        # Import arcpy modules here, not when the toolbox is loaded or validated
         ...
-    
+
     def postExecute(self):
         """Runs after the script has finished executing"""
-        ...
\ No newline at end of file
+        ...
+
+if __name__ == '__main__':
+    # Validation harness, fake parameters and a fake arcpy stand in for the framework and
+    # arcpy. The lookups, their caches and the modification stamps are the real ones
+    import sys
+    import tempfile
+    from collections import Counter
+    from types import SimpleNamespace
+    from unittest.mock import patch
+
+    class FakeParameter:
+        def __init__(self, name: str, value: str | None = None) -> None:
+            self.name = name
+            self.value = value
+            self.altered = False
+            self.hasBeenValidated = False
+            self.filter = SimpleNamespace(type='ValueList', list=[])
+            self.messages: list[tuple[str, str]] = []
+
+        @property
+        def valueAsText(self) -> str | None:
+            return None if self.value is None else str(self.value)
+
+        def setErrorMessage(self, message: str) -> None:
+            self.messages.append(('error', message))
+
+        def setWarningMessage(self, message: str) -> None:
+            self.messages.append(('warning', message))
+
+    folder = tempfile.TemporaryDirectory()
+    gdb = os.path.join(folder.name, 'roads.gdb')
+    os.mkdir(gdb)
+    table_file = os.path.join(gdb, 'a00000009.gdbtable')
+    open(table_file, 'w').close()
+    os.utime(table_file, (1_700_000_000, 1_700_000_000))
+
+    lookups: Counter[str] = Counter()
+    fields = {f'{gdb}/roads': (('OBJECTID', 'OID', ''), ('CLASS', 'String', 'RoadClass'), ('SURFACE', 'String', 'Surface'))}
+    domains = {'RoadClass': ('Local', 'Collector', 'Arterial'), 'Surface': ()}
+
+    def fake_describe(data: str) -> SimpleNamespace:
+        lookups['Describe'] += 1
+        path = data if data.startswith(gdb) else f'{gdb}/{data}'
+        return SimpleNamespace(dataType='FeatureClass', catalogPath=path, path=gdb, shapeType='Polyline')
+
+    def fake_list_fields(data: str) -> list[SimpleNamespace]:
+        lookups['ListFields'] += 1
+        return [SimpleNamespace(name=name, type=kind, domain=domain) for name, kind, domain in fields[data]]
+
+    def fake_list_domains(workspace: str) -> list[SimpleNamespace]:
+        lookups['ListDomains'] += 1
+        return [SimpleNamespace(name=name, codedValues=dict.fromkeys(codes)) for name, codes in domains.items()]
+
+    fake_da = SimpleNamespace(ListDomains=fake_list_domains)
+    fake_arcpy = SimpleNamespace(Describe=fake_describe, ListFields=fake_list_fields, da=fake_da)
+    patch.dict(sys.modules, {'arcpy': fake_arcpy, 'arcpy.da': fake_da}).start()
+
+    tool = MyTool()
+    parameters = [FakeParameter('input_features'), FakeParameter('field'), FakeParameter('value')]
+    params = {param.name: param for param in parameters}
+    runs: Counter[str] = Counter()
+
+    def edit(name: str, value: str) -> None:
+        """Change a value like the dialog does, then run a validation pass"""
+        params[name].value = value
+        params[name].altered = True
+        params[name].hasBeenValidated = False
+        for param in parameters:
+            param.messages.clear()
+        runs.update(run_validators(tool, parameters, 'parameters'))
+        runs.update(run_validators(tool, parameters, 'messages'))
+        for param in parameters:
+            param.hasBeenValidated = True
+
+    edit('input_features', 'roads')
+    edit('field', 'CLASS')
+    for _ in range(50): # Typing in the value parameter
+        edit('value', 'Local')
+    edit('field', 'SURFACE')
+    edit('field', 'CLASS')
+
+    print(f"Validation passes: {50 + 4}")
+    print(f"Validator runs: {dict(runs)}")
+    print(f"Lookups: {dict(lookups)}")
+    print(f"Field choices: {params['field'].filter.list}, value choices: {params['value'].filter.list}")
+
+    expected = {'_field_choices': 1, '_value_choices': 4, '_check_field': 3}
+    assert dict(runs) == expected, runs
+    # One Describe resolves the layer to its path, one describes the path
+    assert dict(lookups) == {'Describe': 2, 'ListFields': 1, 'ListDomains': 1}, lookups
+    assert params['field'].messages == []
+
+    # A coded value is added to the Surface domain while the dialog is open
+    domains['Surface'] = ('Paved',)
+    os.utime(table_file, (1_700_000_100, 1_700_000_100))
+    edit('field', 'SURFACE')
+    assert params['value'].filter.list == ['Paved'], params['value'].filter.list
+    assert dict(lookups) == {'Describe': 3, 'ListFields': 2, 'ListDomains': 2}, lookups
+    # The warning cached for the empty domain is dropped
+    assert params['field'].messages == [], params['field'].messages
+    folder.cleanup()
+    print("Validator run counts match, lookups follow dataset changes")
@@ -1,9 +1,24 @@
-from typing import Literal, TypeAlias, Union
+from __future__ import annotations
 
-from arcpy.mp import ArcGISProject
-from arcpy._renderer import Base_renderer, UniqueValueRenderer, SimpleRenderer, Graduated_colors_renderer, Unclassed_colors_renderer, Graduated_symbols_renderer
-from arcpy._symbology import Symbology, ItemGroup, Item
-from arcpy._mp import Layer, Map
+import os
+from collections import OrderedDict
+from copy import deepcopy
+from fnmatch import fnmatch
+from typing import TYPE_CHECKING, Any, Iterable, Literal, TypeAlias, Union
+
+from cim_document import UniqueValue, unique_value_key
+from lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import arcpy
+    import numpy as np
+    from arcpy.mp import ArcGISProject
+    from arcpy._renderer import Base_renderer, UniqueValueRenderer, SimpleRenderer, Graduated_colors_renderer, Unclassed_colors_renderer, Graduated_symbols_renderer
+    from arcpy._symbology import Symbology, ItemGroup, Item
+    from arcpy._mp import Layer, Map
+else:
+    arcpy = lazy_import('arcpy')
+    np = lazy_import('numpy')
 
 RendererName: TypeAlias = Literal[
     'GraduatedColorsRenderer', 
@@ -13,12 +28,12 @@ RendererName: TypeAlias = Literal[
     'UniqueValueRenderer']
 
 RendererType: TypeAlias = Union[
-    Base_renderer, 
-    UniqueValueRenderer,
-    SimpleRenderer,
-    Graduated_colors_renderer,
-    Unclassed_colors_renderer,
-    Graduated_symbols_renderer]
+    'Base_renderer', 
+    'UniqueValueRenderer',
+    'SimpleRenderer',
+    'Graduated_colors_renderer',
+    'Unclassed_colors_renderer',
+    'Graduated_symbols_renderer']
 
 def get_symbology(layer: Layer) -> Symbology:
     return layer.symbology
@@ -44,20 +59,265 @@ def remove_all_values(renderer: UniqueValueRenderer):
 def add_values(renderer: UniqueValueRenderer, values: dict[str, list[str]]) -> dict[str, list[str]]:
     return renderer.addValues(values) or values
 
+# CIM renderer sync
+# Reading groups and items through the symbology proxies costs a round trip per item, 
+# the CIM definition has the same values and is read and written once per layer
+
+def _new_cim_object(class_name: str, template: Any | None = None) -> Any:
+    """Copy a template CIM object or create a new one with arcpy"""
+    if template is not None:
+        return deepcopy(template)
+    from arcpy.cim import CreateCIMObjectFromClassName
+    return CreateCIMObjectFromClassName(class_name, 'V3')
+
+def get_cim_renderer_values(cim_renderer: Any) -> dict[str, set[UniqueValue]]:
+    """Read the values of a CIMUniqueValueRenderer by group heading"""
+    return {
+        group.heading: {
+            tuple(unique_value.fieldValues)
+            for value_class in group.classes
+            for unique_value in value_class.values
+        }
+        for group in cim_renderer.groups or []
+    }
+
+def sync_cim_renderer(cim_renderer: Any, values: dict[str, Iterable[str | Iterable[str]]]) -> tuple[int, int]:
+    """Update a CIMUniqueValueRenderer in place so its groups hold exactly `values`
+    
+    New classes copy the symbol of an existing class (or the default symbol).
+    
+    Args:
+        cim_renderer: The renderer from a layer CIM definition
+        values: Values by group heading, a value is a string or one string per renderer field
+    
+    Returns:
+        The number of values added and removed
+    """
+    desired = {heading: set(map(unique_value_key, group_values)) for heading, group_values in values.items()}
+    groups = list(cim_renderer.groups or [])
+    template_class = next((c for group in groups for c in group.classes), None)
+    template_value = template_class.values[0] if template_class and template_class.values else None
+    added = removed = 0
+    
+    # Remove values that are no longer wanted, classes and groups that end up empty go too
+    for group in groups:
+        keep = desired.get(group.heading, set())
+        classes = []
+        for value_class in group.classes:
+            remaining = [v for v in value_class.values if tuple(v.fieldValues) in keep]
+            removed += len(value_class.values) - len(remaining)
+            if remaining:
+                value_class.values = remaining
+                classes.append(value_class)
+        group.classes = classes
+    
+    current = get_cim_renderer_values(cim_renderer)
+    groups_by_heading = {group.heading: group for group in groups}
+    for heading, wanted in desired.items():
+        missing = wanted - current.get(heading, set())
+        if not missing:
+            continue
+        
+        if (group := groups_by_heading.get(heading)) is None:
+            group = _new_cim_object('CIMUniqueValueGroup', groups[0] if groups else None)
+            group.heading, group.classes = heading, []
+            groups.append(group)
+            groups_by_heading[heading] = group
+        
+        for key in sorted(missing):
+            unique_value = _new_cim_object('CIMUniqueValue', template_value)
+            unique_value.fieldValues = list(key)
+            value_class = _new_cim_object('CIMUniqueValueClass', template_class)
+            value_class.values = [unique_value]
+            value_class.label = ', '.join(key)
+            if template_class is None:
+                value_class.symbol = deepcopy(cim_renderer.defaultSymbol)
+            group.classes.append(value_class)
+        added += len(missing)
+    
+    cim_renderer.groups = [group for group in groups if group.classes]
+    return added, removed
+
+def sync_layer_values(layer: Layer, values: dict[str, Iterable[str | Iterable[str]]]) -> tuple[int, int] | None:
+    """Sync a layer's unique values with one getDefinition and (if anything changed) one setDefinition
+    
+    Returns:
+        The number of values added and removed, None if the layer has no unique value renderer
+    """
+    cim_layer = layer.getDefinition('V3')
+    cim_renderer = getattr(cim_layer, 'renderer', None)
+    if type(cim_renderer).__name__ != 'CIMUniqueValueRenderer':
+        return None
+    
+    added, removed = sync_cim_renderer(cim_renderer, values)
+    if added or removed:
+        layer.setDefinition(cim_layer)
+    return added, removed
+
+def sync_project_values(
+    project: ArcGISProject, 
+    values: dict[str, Iterable[str | Iterable[str]]], 
+    layer_name: str = '*') -> dict[str, tuple[int, int]]:
+    """Sync every unique value layer matching `layer_name` (a wildcard) in every map
+    
+    Returns:
+        The number of values added and removed by 'map/layer' name (the layer long name,
+        so layers with the same name in different group layers are kept apart)
+    """
+    changes: dict[str, tuple[int, int]] = {}
+    for _map in project.listMaps():
+        for layer in _map.listLayers():
+            if not fnmatch(layer.name, layer_name):
+                continue
+            if (result := sync_layer_values(layer, values)) is not None:
+                changes[f"{_map.name}/{layer.longName}"] = result
+    return changes
+
+# Unique values from data
+# Scan only the renderer fields of the layer source and compute the unique combinations,
+# results are cached until the source workspace is modified
+
+NULL_LABEL = '<Null>'
+
+# (data source, fields, where, method, null value) -> (source state, values), least recently used first
+_unique_value_cache: OrderedDict[tuple, tuple[tuple[str, float], list[UniqueValue]]] = OrderedDict()
+UNIQUE_VALUE_CACHE_SIZE = 64
+
+def _is_null(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and value != value)
+
+def _format_value(value: Any) -> str:
+    return NULL_LABEL if _is_null(value) else str(value)
+
+def _row_key(row: tuple) -> tuple:
+    """Sort key of a typed row, numbers sort as numbers and nulls sort last"""
+    return tuple((True, 0) if _is_null(value) else (False, value) for value in row)
+
+def format_unique_rows(rows: Iterable[tuple]) -> list[UniqueValue]:
+    """Sort unique typed rows and format them, both scan methods give the same order"""
+    # NaN never equals itself, so several NaN rows can survive until they are formatted
+    return list(dict.fromkeys(tuple(map(_format_value, row)) for row in sorted(rows, key=_row_key)))
+
+def unique_field_values(table: np.ndarray, fields: list[str]) -> list[UniqueValue]:
+    """Vectorized unique over several fields of a structured array, sorted"""
+    from numpy.lib.recfunctions import repack_fields
+    columns = repack_fields(table[list(fields)])
+    return format_unique_rows(np.unique(columns).tolist())
+
+def _source_state(data_source: str) -> tuple[str, float] | None:
+    """Cache key for the modified state of a data source
+    
+    Only file geodatabases and shapefiles are stamped: any edit touches a file in their
+    folder. Enterprise geodatabases, services and other sources can change without a
+    local file changing, so they return None and are never cached.
+    """
+    try:
+        path = arcpy.Describe(data_source).catalogPath
+        if path.lower().endswith('.shp'):
+            workspace = os.path.dirname(path)
+        else:
+            # The .gdb folder above the feature class (and its feature dataset)
+            workspace = path
+            while workspace and not workspace.lower().endswith('.gdb'):
+                parent = os.path.dirname(workspace)
+                workspace = parent if parent != workspace else None
+        if not workspace or not os.path.isdir(workspace):
+            return None
+        with os.scandir(workspace) as entries:
+            return workspace, max((entry.stat().st_mtime for entry in entries), default=0.0)
+    except (OSError, RuntimeError):
+        return None
+
+def scan_unique_values(
+    data_source: str, 
+    fields: list[str], 
+    *, 
+    where: str | None = None,
+    method: Literal['cursor', 'numpy'] = 'cursor',
+    null_value: Any = None) -> list[UniqueValue]:
+    """Read the unique combinations of `fields` from a data source
+    
+    Args:
+        data_source: The table or feature class (e.g. `layer.dataSource`)
+        fields: The renderer fields
+        where: Optional where clause
+        method: Hash cursor rows ('cursor') or export to NumPy and sort ('numpy')
+        null_value: Passed to `TableToNumPyArray` for sources with nullable numeric fields
+    """
+    state = _source_state(data_source)
+    key = (data_source, tuple(fields), where, method, null_value)
+    cached = _unique_value_cache.get(key)
+    if state is not None and cached is not None and cached[0] == state:
+        _unique_value_cache.move_to_end(key)
+        return cached[1]
+    
+    if method == 'numpy':
+        table = arcpy.da.TableToNumPyArray(data_source, fields, where, skip_nulls=False, null_value=null_value)
+        values = unique_field_values(table, fields)
+    else:
+        with arcpy.da.SearchCursor(data_source, fields, where) as cursor:
+            rows = set(cursor)
+        values = format_unique_rows(rows)
+    
+    if state is not None:
+        # One entry per scan, values for an older state of the source are replaced
+        _unique_value_cache[key] = (state, values)
+        _unique_value_cache.move_to_end(key)
+        while len(_unique_value_cache) > UNIQUE_VALUE_CACHE_SIZE:
+            _unique_value_cache.popitem(last=False)
+    return values
+
+def layer_unique_values(
+    layer: Layer, 
+    fields: Iterable[str] | None = None, 
+    heading: str | None = None, 
+    **kwargs) -> dict[str, list[str | list[str]]]:
+    """Build `add_values` input for a unique value layer from its data source
+    
+    Args:
+        layer: The layer, its data source is scanned
+        fields: The renderer fields (default is the fields of the layer's saved renderer)
+        heading: The group heading (default is the first group heading or the fields)
+        **kwargs: Passed to `scan_unique_values`
+    """
+    if fields is None:
+        cim_renderer = layer.getDefinition('V3').renderer
+        fields = cim_renderer.fields
+        groups = cim_renderer.groups or []
+        heading = heading or (groups[0].heading if groups else None)
+    fields = list(fields)
+    heading = heading or ', '.join(fields)
+    
+    values = scan_unique_values(layer.dataSource, fields, **kwargs)
+    # Single field values are plain strings, multi field values are lists
+    return {heading: [value[0] if len(fields) == 1 else list(value) for value in values]}
+
 def main():
-    project = ArcGISProject(r"Path\To\Project")
+    project = arcpy.mp.ArcGISProject(r"Path\To\Project")
     _map: Map = project.listMaps()[0]
     layer: Layer = _map.listLayers()[0]
     
     symbology = get_symbology(layer)
     renderer: UniqueValueRenderer = set_renderer(symbology, 'UniqueValueRenderer')
+    # The layer definition still has the renderer from before set_renderer, read the new one
+    heading = renderer.groups[0].heading if renderer.groups else None
+    new_values = layer_unique_values(layer, renderer.fields, heading)
     remove_all_values(renderer)
-    new_values = {}
     
     add_values(renderer, new_values)
     
     project.save()
     return
 
+def main_sync():
+    project = arcpy.mp.ArcGISProject(r"Path\To\Project")
+    layer: Layer = project.listMaps()[0].listLayers()[0]
+    new_values = layer_unique_values(layer, method='numpy')
+    
+    for layer, (added, removed) in sync_project_values(project, new_values, layer.name).items():
+        print(f"{layer}: {added} values added, {removed} values removed")
+    
+    project.save()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,64 +1,179 @@
-from builtins import print as _print
-from typing import Literal
-from _typeshed import SupportsWrite
-
-from arcpy import AddMessage
-from arcpy.mp import ArcGISProject
-from arcpy._mp import Map, Layer
-from arcpy.cim import CIMFeatureLayer, CIMFeatureTable, CIMFieldDescription
-
-# Define a custom print function that also writes to the ArcGIS Pro messages
-def print(
-    *values: object,
-    sep: str | None = " ",
-    end: str | None = "\n",
-    file: SupportsWrite[str] | None = None,
-    flush: Literal[False] = False,
-) -> None:
-    _print(*values, sep=sep, end=end, file=file, flush=flush)
-    AddMessage(sep.join(map(str, values)) + end if end != '\n' else '')
+from __future__ import annotations
+
+from importlib import import_module
+from types import ModuleType
+from typing import Iterable, TYPE_CHECKING
+
+from message_sink import log
+
+if TYPE_CHECKING:
+    from arcpy._mp import Map, Layer
+    from arcpy.cim import CIMFeatureLayer, CIMFeatureTable, CIMFieldDescription
+
+def _get_mp(mp: ModuleType | str | None) -> ModuleType:
+    """Resolve the mp module, a module name is imported (used by worker processes)"""
+    if mp is None:
+        mp = 'arcpy.mp'
+    if isinstance(mp, str):
+        mp = import_module(mp)
+    return mp
 
 def update_field_visibility(
-    aprx_path: str, 
-    map_name: str, 
-    *, 
-    visible_fields: tuple[str]= (), 
+    aprx_path: str,
+    map_name: str,
+    *,
+    visible_fields: Iterable[str] = (),
     use_alias: bool = False,
-    verbose: bool = False):
-    
+    verbose: bool = False,
+    mp: ModuleType | str | None = None) -> dict[str, tuple[int, int]]:
+    """Show only `visible_fields` on every feature layer in a map
+
+    Args:
+        aprx_path: The project to update
+        map_name: The map in the project to update
+        visible_fields: Field names (or aliases) to show, all others are hidden
+        use_alias: Match `visible_fields` against field aliases
+        verbose: Include the changed field names in the layer summaries
+        mp: The module providing `ArcGISProject` (default is arcpy.mp)
+
+    Returns:
+        A mapping of layer long name (group layers included) to (hidden, shown) counts
+        for layers that changed
+    """
+    visible_fields = set(visible_fields)
+
     # Open the project and get the layers
-    aprx = ArcGISProject(aprx_path)
+    aprx = _get_mp(mp).ArcGISProject(aprx_path)
     map_doc: Map = aprx.listMaps(map_name)[0]
     layers: list[Layer] = [layer for layer in map_doc.listLayers() if layer.isFeatureLayer]
-    
+
     # Update the field visibility for each layer
+    changes: dict[str, tuple[int, int]] = {}
     for layer in layers:
         # Get CIM objects
         cim_lyr: CIMFeatureLayer = layer.getDefinition('V2')
         cim_feature_table: CIMFeatureTable = cim_lyr.featureTable
         cim_field_descriptions: list[CIMFieldDescription] = cim_feature_table.fieldDescriptions
-        
+
         # Update field visibility
+        hidden: list[str] = []
+        shown: list[str] = []
         for fd in cim_field_descriptions:
             name = (use_alias and fd.alias) or fd.fieldName
-            
-            if name not in visible_fields and fd.visible:
-                fd.visible = False
-                print(f"Field {name} for {layer.name} is now hidden")
-            
-            elif name in visible_fields and not fd.visible:
-                fd.visible = True
-                print(f"Field {name} for {layer.name} is now visible")
-        
-        # Set the definition
+            visible = name in visible_fields
+            if visible == fd.visible:
+                continue
+            fd.visible = visible
+            (shown if visible else hidden).append(name)
+
+        # Only write back layers that changed
+        if not (hidden or shown):
+            continue
         layer.setDefinition(cim_lyr)
-    
+        # Layers in different group layers can share a name
+        changes[layer.longName] = (len(hidden), len(shown))
+
+        summary = f"{layer.longName}: {len(hidden)} fields hidden, {len(shown)} fields visible"
+        if verbose and hidden:
+            summary += f"\n\tHidden: {', '.join(hidden)}"
+        if verbose and shown:
+            summary += f"\n\tVisible: {', '.join(shown)}"
+        log.info(summary)
+
     # Save the project
-    aprx.save()
-    
+    if changes:
+        aprx.save()
+    log.flush()
+    return changes
+
+def _update_project(args: tuple[str, str, dict]) -> tuple[str, dict[str, tuple[int, int]] | str]:
+    """Worker entry point, errors are returned so one bad project doesn't stop the batch"""
+    aprx_path, map_name, kwargs = args
+    try:
+        return aprx_path, update_field_visibility(aprx_path, map_name, **kwargs)
+    except Exception as e:
+        return aprx_path, f"{type(e).__name__}: {e}"
+
+def update_projects_field_visibility(
+    aprx_paths: Iterable[str],
+    map_name: str,
+    *,
+    visible_fields: Iterable[str] = (),
+    use_alias: bool = False,
+    verbose: bool = False,
+    workers: int | None = None,
+    mp: ModuleType | str | None = None) -> dict[str, dict[str, tuple[int, int]] | str]:
+    """Run `update_field_visibility` over many projects, one project per worker process
+
+    Args:
+        workers: Number of worker processes (default is os.cpu_count(), 0 runs in this process)
+        mp: Module or module name providing `ArcGISProject`, workers import modules by name
+
+    Returns:
+        A mapping of project path to its layer changes, or the error message if it failed
+    """
+    kwargs = dict(visible_fields=frozenset(visible_fields), use_alias=use_alias, verbose=verbose)
+    if workers == 0:
+        kwargs['mp'] = mp
+        jobs = ((path, map_name, kwargs) for path in aprx_paths)
+        return dict(map(_update_project, jobs))
+
+    # Modules can't be pickled, send the name and let the worker import it
+    kwargs['mp'] = mp.__name__ if isinstance(mp, ModuleType) else mp
+    jobs = ((path, map_name, kwargs) for path in aprx_paths)
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_update_project, jobs))
+
+def _check_batch(projects: int = 4, workers: int | None = 2) -> None:
+    """Run the batch over stand-in projects and check what was changed and saved"""
+    import tempfile
+    from pathlib import Path
+    from mp_stand_in import layer, read_project, write_project
+
+    fields = ['OBJECTID', 'NAME', 'TYPE', 'OWNER']
+    maps = {
+        'Map': [
+            # Same layer name in two group layers, the results must not overwrite each other
+            layer('Roads', fields, group='Existing'),
+            layer('Roads', fields, group='Proposed', visible=False),
+            layer('Parcels', ['OBJECTID', 'NAME']),
+            layer('Basemap', [], feature_layer=False),
+        ],
+        'Other': [layer('Roads', fields)],
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        paths = [str(Path(folder, f"project{i}.aprx.json")) for i in range(projects)]
+        for path in paths:
+            write_project(path, maps)
+        missing = str(Path(folder, 'missing.aprx.json'))
+
+        results = update_projects_field_visibility(
+            [*paths, missing], 'Map', visible_fields=['NAME', 'TYPE'], workers=workers, mp='mp_stand_in',
+        )
+        expected = {'Existing\\Roads': (2, 0), 'Proposed\\Roads': (0, 2), 'Parcels': (1, 0)}
+        assert all(results[path] == expected for path in paths), results
+        assert results[missing].startswith('FileNotFoundError'), results[missing]
+
+        saved = read_project(paths[0])
+        for saved_layer in saved['Map'][:3]:
+            visible = {f['fieldName'] for f in saved_layer['fields'] if f['visible']}
+            assert visible == {'NAME', 'TYPE'} & {f['fieldName'] for f in saved_layer['fields']}, saved_layer
+        assert saved['Other'] == maps['Other'], "other maps aren't touched"
+
+        # A second run has nothing left to change
+        assert update_field_visibility(paths[0], 'Map', visible_fields=['NAME', 'TYPE'], mp='mp_stand_in') == {}
+    print(f"{projects} stand-in projects updated and checked ({workers} workers)")
+
 if __name__ == "__main__":
-    aprx = r"Path\To\APRX"
-    map_name = "Map"
-    visible_fields = ("Field1", "Field2", "Field3")
-    
-    update_field_visibility(aprx, map_name, visible_fields=visible_fields)
\ No newline at end of file
+    _check_batch()
+    _check_batch(workers=0)
+
+    # aprx = r"Path\To\APRX"
+    # map_name = "Map"
+    # visible_fields = ("Field1", "Field2", "Field3")
+    # update_field_visibility(aprx, map_name, visible_fields=visible_fields)
+
+    # Batch mode
+    # from glob import glob
+    # update_projects_field_visibility(glob(r"Path\To\Projects\*.aprx"), map_name, visible_fields=visible_fields)
@@ -0,0 +1,254 @@
+"""Validate and fix table names without a round trip into arcpy
+
+`arcpy.ValidateTableName` is called once per name and each call goes through the
+geoprocessing runtime. `validate_table_names` applies the same rules in pure Python to
+any number of names in one call: invalid characters become underscores, names that
+don't start with a letter get a 'T' prefix, reserved words get a trailing underscore
+and names are cut to the workspace length limit. Names that collide after cleaning
+(or with `existing` names) get a numbered suffix. Rules are looked up once per workspace.
+
+Usage:
+    >>> validate_table_name('2024 Parcels (final)', r'C:\\data\\city.gdb')
+    'T2024_Parcels__final_'
+    >>> validate_table_names(['Roads', 'roads', 'Roads!'], r'C:\\data\\city.gdb')
+    ['Roads', 'roads_1', 'Roads_']
+
+    Record the behaviour of ValidateTableName on an ArcGIS machine, then compare:
+
+    >>> record_fixtures(names, [r'C:\\data\\city.gdb', r'C:\\data\\shapes'], 'table_names.json')
+    >>> compare_fixtures(load_fixtures('table_names.json'))
+    []
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Literal
+
+WorkspaceKind = Literal['fgdb', 'enterprise', 'shapefile', 'memory']
+DBMS = Literal['sqlserver', 'oracle', 'postgresql']
+
+# Keywords the file geodatabase SQL parser won't accept as a table name
+SQL_RESERVED = frozenset({
+    'ADD', 'ALTER', 'AND', 'BETWEEN', 'BY', 'COLUMN', 'CREATE', 'DELETE', 'DROP',
+    'EXISTS', 'FOR', 'FROM', 'GROUP', 'IN', 'INSERT', 'INTO', 'IS', 'LIKE', 'NOT',
+    'NULL', 'OR', 'ORDER', 'SELECT', 'SET', 'TABLE', 'UPDATE', 'VALUES', 'WHERE',
+})
+
+DBMS_RESERVED = {
+    'sqlserver': frozenset({
+        'BACKUP', 'CHECK', 'DATABASE', 'DEFAULT', 'FILE', 'INDEX', 'KEY', 'PRIMARY',
+        'PROCEDURE', 'PUBLIC', 'SCHEMA', 'TRANSACTION', 'TRIGGER', 'USER', 'VIEW',
+    }),
+    'oracle': frozenset({
+        'ACCESS', 'CHECK', 'COMMENT', 'DATE', 'FILE', 'INDEX', 'LEVEL', 'MODE',
+        'NUMBER', 'PUBLIC', 'RAW', 'ROWID', 'ROWNUM', 'SESSION', 'SIZE', 'USER', 'VIEW',
+    }),
+    'postgresql': frozenset({
+        'ANALYSE', 'ANALYZE', 'ARRAY', 'CHECK', 'DEFAULT', 'LIMIT', 'OFFSET',
+        'PRIMARY', 'USER', 'VIEW',
+    }),
+}
+
+DBMS_MAX_LENGTH = {'sqlserver': 128, 'oracle': 128, 'postgresql': 63}
+
+@dataclass(frozen=True)
+class NamingRules:
+    kind: WorkspaceKind
+    max_length: int | None
+    reserved: frozenset[str] = frozenset()
+    case_sensitive: bool = False
+    prefix: str = 'T'
+
+    _invalid = re.compile(r'[^A-Za-z0-9_]')
+
+    def fix(self, name: str) -> str:
+        """The valid form of a single name (not deduplicated)"""
+        name = self._invalid.sub('_', name)
+        if not name[:1].isalpha():
+            name = self.prefix + name
+        if self.max_length:
+            name = name[:self.max_length]
+        if name.upper() in self.reserved:
+            name = name + '_' if not self.max_length or len(name) < self.max_length else name[:-1] + '_'
+        return name
+
+    def key(self, name: str) -> str:
+        """The comparison key for collisions"""
+        return name if self.case_sensitive else name.upper()
+
+def workspace_kind(workspace: str | Path | None) -> WorkspaceKind:
+    """Workspace type from the path (a folder holds shapefiles)
+
+    Feature datasets are inside their geodatabase, so the innermost .gdb or .sde part of
+    the path decides (C:/data/city.gdb/Transport is a file geodatabase).
+    """
+    parts = [part for part in re.split(r'[\\/]', str(workspace or '').lower()) if part]
+    if parts[:1] in (['memory'], ['in_memory']):
+        return 'memory'
+    for part in reversed(parts):
+        if part.endswith('.gdb'):
+            return 'fgdb'
+        if part.endswith('.sde'):
+            return 'enterprise'
+    return 'shapefile'
+
+@lru_cache(maxsize=64)
+def workspace_rules(workspace: str | Path | None, dbms: DBMS = 'sqlserver') -> NamingRules:
+    """Naming rules for a workspace, cached per workspace
+
+    Args:
+        workspace: A .gdb, .sde connection file, folder or 'memory'
+        dbms: The database behind an enterprise connection
+    """
+    match workspace_kind(workspace):
+        case 'fgdb':
+            return NamingRules('fgdb', 160, SQL_RESERVED)
+        case 'memory':
+            return NamingRules('memory', 160, SQL_RESERVED)
+        case 'enterprise':
+            return NamingRules('enterprise', DBMS_MAX_LENGTH[dbms], SQL_RESERVED | DBMS_RESERVED[dbms])
+        case _:
+            # Shapefile names are file names, case only matters on case sensitive file systems
+            return NamingRules('shapefile', None)
+
+def validate_table_name(name: str, workspace: str | Path | None = None, dbms: DBMS = 'sqlserver') -> str:
+    """Pure Python `arcpy.ValidateTableName`"""
+    return workspace_rules(workspace, dbms).fix(name)
+
+def _with_suffix(name: str, number: int, max_length: int | None) -> str:
+    suffix = f"_{number}"
+    if max_length and len(name) + len(suffix) > max_length:
+        name = name[:max_length - len(suffix)]
+    return name + suffix
+
+def validate_table_names(
+    names: Iterable[str],
+    workspace: str | Path | None = None,
+    *,
+    dbms: DBMS = 'sqlserver',
+    unique: bool = True,
+    existing: Iterable[str] = ()) -> list[str]:
+    """Fix many names at once
+
+    Args:
+        names: The names to validate
+        workspace: The output workspace (default rules are for a folder)
+        dbms: The database behind an enterprise connection
+        unique: Number names that collide after cleaning (the first one keeps its name)
+        existing: Names already in the workspace, new names won't collide with them
+
+    Returns:
+        The valid names in input order
+    """
+    rules = workspace_rules(workspace, dbms)
+    fixed: dict[str, str] = {}
+    cleaned = []
+    for name in names:
+        if name not in fixed:
+            fixed[name] = rules.fix(name)
+        cleaned.append(fixed[name])
+    if not unique:
+        return cleaned
+
+    taken = {rules.key(name) for name in existing}
+    counters: dict[str, int] = {}
+    result = []
+    for name in cleaned:
+        key, candidate = rules.key(name), name
+        while rules.key(candidate) in taken:
+            counters[key] = counters.get(key, 0) + 1
+            candidate = _with_suffix(name, counters[key], rules.max_length)
+        taken.add(rules.key(candidate))
+        result.append(candidate)
+    return result
+
+def changed_names(names: Iterable[str], workspace: str | Path | None = None, **kwargs) -> dict[str, str]:
+    """The names that `validate_table_names` changes, original -> fixed"""
+    names = list(names)
+    return {
+        original: new
+        for original, new in zip(names, validate_table_names(names, workspace, **kwargs))
+        if original != new
+    }
+
+# Fixtures
+# (workspace, name, expected) triples. EXAMPLES were written from the rules above, not
+# recorded from arcpy, so they only check the module agrees with itself. Parity with
+# ValidateTableName needs a corpus from `record_fixtures` on a machine with ArcGIS
+
+Fixture = tuple[str, str, str]
+
+EXAMPLES: list[Fixture] = [
+    ('C:/data/city.gdb', 'Parcels', 'Parcels'),
+    ('C:/data/city.gdb', 'Parcels 2024', 'Parcels_2024'),
+    ('C:/data/city.gdb', '2024_Parcels', 'T2024_Parcels'),
+    ('C:/data/city.gdb', '_private', 'T_private'),
+    ('C:/data/city.gdb', 'roads-and-rails', 'roads_and_rails'),
+    ('C:/data/city.gdb', 'Table', 'Table_'),
+    ('C:/data/city.gdb', 'select', 'select_'),
+    ('C:/data/city.gdb', 'a' * 170, 'a' * 160),
+    ('C:/data/city.gdb', 'Roads.shp', 'Roads_shp'),
+    ('C:/data/shapes', 'Parcels 2024', 'Parcels_2024'),
+    ('C:/data/shapes', '2024', 'T2024'),
+    ('C:/data/shapes', 'Table', 'Table'),
+    ('C:/data/city.gdb/Transport', 'Roads 2024', 'Roads_2024'),
+    ('C:/data/city.gdb/Transport', 'Table', 'Table_'),
+    ('C:/data/city.gdb/Transport/', 'c' * 170, 'c' * 160),
+    ('C:\\data\\city.gdb\\Transport', 'select', 'select_'),
+    ('C:/data/city.sde', 'user', 'user_'),
+    ('C:/data/city.sde', 'b' * 140, 'b' * 128),
+    ('C:/data/city.sde/city.DBO.Transport', 'user', 'user_'),
+    ('C:/data/city.sde/city.DBO.Transport', 'b' * 140, 'b' * 128),
+    ('C:/data/gdb_exports', 'Table', 'Table'),
+    ('memory', 'tmp result', 'tmp_result'),
+]
+
+def record_fixtures(names: Iterable[str], workspaces: Iterable[str], path: str | Path | None = None) -> list[Fixture]:
+    """Run arcpy.ValidateTableName on every name and workspace, optionally writing the corpus as JSON"""
+    from arcpy import ValidateTableName
+    names = list(names)
+    fixtures = [(workspace, name, ValidateTableName(name, workspace)) for workspace in workspaces for name in names]
+    if path:
+        Path(path).write_text(json.dumps(fixtures, indent=1, ensure_ascii=False), encoding='utf-8')
+    return fixtures
+
+def load_fixtures(path: str | Path) -> list[Fixture]:
+    return [tuple(fixture) for fixture in json.loads(Path(path).read_text(encoding='utf-8'))]
+
+def compare_fixtures(fixtures: Iterable[Fixture] = EXAMPLES, dbms: DBMS = 'sqlserver') -> list[tuple[str, str, str, str]]:
+    """The fixtures this module disagrees with, as (workspace, name, expected, got)"""
+    return [
+        (workspace, name, expected, got)
+        for workspace, name, expected in fixtures
+        if (got := validate_table_name(name, workspace, dbms)) != expected
+    ]
+
+if __name__ == '__main__':
+    from random import Random
+    from time import perf_counter
+
+    import sys
+
+    # A recorded corpus checks parity with arcpy, the built in examples only check the rules
+    if len(sys.argv) > 1:
+        fixtures, label = load_fixtures(sys.argv[1]), f"recorded fixtures in {sys.argv[1]} match"
+    else:
+        fixtures, label = EXAMPLES, "rule examples pass (self-consistency only, pass a recorded corpus to check parity)"
+    mismatches = compare_fixtures(fixtures)
+    for mismatch in mismatches:
+        print("Mismatch: {} {!r} expected {!r} got {!r}".format(*mismatch))
+    print(f"{len(fixtures) - len(mismatches)}/{len(fixtures)} {label}")
+
+    rng = Random(42)
+    alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789 _-.'
+    names = [''.join(rng.choices(alphabet, k=rng.randint(1, 12))) for _ in range(100_000)]
+    start = perf_counter()
+    valid = validate_table_names(names, 'C:/data/city.gdb')
+    elapsed = perf_counter() - start
+    print(f"{len(names):,} names validated in {elapsed:.3f} seconds, {len(changed_names(names, 'C:/data/city.gdb')):,} changed")
+    assert len({name.upper() for name in valid}) == len(valid)
@@ -6,19 +6,17 @@ from typing import (
     Generator, 
     Literal,
     Callable,
+    TYPE_CHECKING,
 )
 from pathlib import Path
 from contextlib import contextmanager
 
-from arcpy import (
-    EnvManager,
-    ListDatasets,
-    ListRasters,
-    ListTables,
-    ListWorkspaces,
-    ListFeatureClasses,
-    ListFiles,
-)
+from lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import arcpy
+else:
+    arcpy = lazy_import('arcpy')
 
 class PathList(UserList[Path]):
     """A list of features that can be accessed by index or name"""
@@ -69,7 +67,7 @@ class WorkspaceManager:
     def __init__(self, path: Path):
         self.path = Path(path)
         self.name = self.path.name
-        self.manager = EnvManager(workspace=str(self.path))
+        self.manager = arcpy.EnvManager(workspace=str(self.path))
         
         for cache in self.__caches__:
             setattr(self, cache, None)
@@ -88,19 +86,19 @@ class WorkspaceManager:
     
     @property
     def datasets(self) -> PathList:
-        return self._retrieve(ListDatasets, '_datasets')
+        return self._retrieve(arcpy.ListDatasets, '_datasets')
     
     @property
     def rasters(self) -> PathList:
-        return self._retrieve(ListRasters, '_rasters')
+        return self._retrieve(arcpy.ListRasters, '_rasters')
     
     @property
     def tables(self) -> PathList:
-        return self._retrieve(ListTables, '_tables')
+        return self._retrieve(arcpy.ListTables, '_tables')
     
     @property
     def workspaces(self) -> PathList:
-        return self._retrieve(ListWorkspaces, '_workspaces')
+        return self._retrieve(arcpy.ListWorkspaces, '_workspaces')
     
     @property
     def feature_classes(self) -> PathList:
@@ -109,15 +107,15 @@ class WorkspaceManager:
 
         self._feature_classes = PathList()            
         for wsp in self.datasets + [self.path]:
-            with EnvManager(workspace=str(wsp)):
+            with arcpy.EnvManager(workspace=str(wsp)):
                 self._feature_classes.extend(
-                    self.path / item for item in ListFeatureClasses()
+                    self.path / item for item in arcpy.ListFeatureClasses()
                 )
         return self._feature_classes
     
     @property
     def files(self) -> PathList:
-        return self._retrieve(ListFiles, '_files')
+        return self._retrieve(arcpy.ListFiles, '_files')
         
     def reload(self, caches: list[str]=None):
         """Reloads the caches for the workspace